@@ -15,6 +15,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Importar módulos
 from modules.auth import show_login_screen, check_authentication, logout
 from modules.database import init_db
+from modules.scheduler import iniciar_scheduler
 
 # ==================== CONFIGURACIÓN INICIAL ====================
 
@@ -22,6 +23,9 @@ from modules.database import init_db
 if not os.path.exists('data/database.db'):
     init_db()
 
+# Programador de respaldos en segundo plano (uno por proceso)
+iniciar_scheduler()
+
 # ==================== CONFIGURACIÓN DE PÁGINA ====================
 
 st.set_page_config(
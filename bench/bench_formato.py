@@ -0,0 +1,62 @@
+"""
+BENCHMARK - FORMATO DE MONEDA Y PORCENTAJES
+Compara el formato escalar (.apply) con las versiones vectorizadas de modules.utils.
+
+Uso (desde la raíz del repositorio):
+    python bench/bench_formato.py --filas 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.utils import format_currency, format_currency_series, format_percentage_series
+
+def benchmark_formato(filas=100_000, semilla=0):
+    """
+    Compara .apply(format_currency) con format_currency_series sobre `filas`
+    montos con la distribución de la cartera (enteros, millones y miles de millones)
+    """
+    rng = np.random.default_rng(semilla)
+    montos = pd.Series(np.concatenate([
+        rng.integers(0, 1_000_000, filas // 2),
+        rng.integers(1_000_000, 1_000_000_000, filas // 3),
+        rng.integers(1_000_000_000, 50_000_000_000, filas - filas // 2 - filas // 3),
+    ]))
+    porcentajes = pd.Series(rng.uniform(0, 150, filas))
+    
+    inicio = time.perf_counter()
+    escalar = montos.apply(format_currency)
+    porcentaje_escalar = porcentajes.apply(lambda x: f"{x:.1f}%")
+    segundos_escalar = time.perf_counter() - inicio
+    
+    inicio = time.perf_counter()
+    vectorizado = format_currency_series(montos)
+    porcentaje_vectorizado = format_percentage_series(porcentajes)
+    segundos_vectorizado = time.perf_counter() - inicio
+    
+    return {
+        'filas': filas,
+        'segundos_apply': segundos_escalar,
+        'segundos_vectorizado': segundos_vectorizado,
+        'aceleracion': segundos_escalar / segundos_vectorizado if segundos_vectorizado else 0.0,
+        'diferencias': int((escalar != vectorizado).sum() + (porcentaje_escalar != porcentaje_vectorizado).sum())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, default=100_000)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+    
+    for clave, valor in benchmark_formato(args.filas, args.semilla).items():
+        print(f"{clave:>22}: {valor:,.3f}" if isinstance(valor, float) else f"{clave:>22}: {valor:,}")
+
+if __name__ == "__main__":
+    main()
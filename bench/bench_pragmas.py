@@ -0,0 +1,163 @@
+"""
+BENCHMARK - PERFILES DE PRAGMAs
+Lectores y escritores concurrentes (procesos) sobre una base temporal con cada
+perfil de DB_PRAGMA_PROFILES, más el modo WAL sin el resto de ajustes.
+
+Uso (desde la raíz del repositorio):
+    python bench/bench_pragmas.py --lectores 4 --escritores 1 --segundos 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DB_PRAGMA_PROFILES
+from modules import database
+
+# Perfiles comparados: los de config.py y WAL con los valores por defecto de SQLite
+PERFILES = {
+    **DB_PRAGMA_PROFILES,
+    'wal_solo': {'busy_timeout': 5000, 'journal_mode': 'WAL'},
+}
+
+CONSULTA_LECTOR = database.OCS_SELECT + " WHERE o.cliente_nit = ? AND o.estado = 'PENDIENTE' ORDER BY o.fecha DESC"
+
+def _conectar(ruta, perfil):
+    conn = sqlite3.connect(ruta, isolation_level=None)
+    for pragma, valor in PERFILES[perfil].items():
+        conn.execute(f"PRAGMA {pragma} = {valor}")
+    return conn
+
+def preparar_base(ruta, perfil, clientes=200, ocs=20_000):
+    """Crea el esquema completo con init_db y lo llena con datos sintéticos"""
+    database.DB_PATH = ruta
+    database.init_db()
+    
+    conn = _conectar(ruta, perfil)
+    # init_db deja la base en WAL: el perfil de journal clásico debe volver a DELETE
+    modo = PERFILES[perfil].get('journal_mode', 'DELETE')
+    conn.execute(f"PRAGMA journal_mode = {modo}")
+    
+    rng = np.random.default_rng(0)
+    nits = [f"8{i:08d}" for i in range(clientes)]
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO clientes (nit, nombre, cupo_sugerido) VALUES (?, ?, ?)",
+        [(nit, f"Cliente {nit}", 10**12) for nit in nits]
+    )
+    conn.executemany(
+        "INSERT INTO ocs (numero, cliente_nit, valor_total, fecha, estado) VALUES (?, ?, ?, ?, 'PENDIENTE')",
+        [
+            (f"BENCH-{i}", nits[i % clientes], int(valor), f"2026-{1 + i % 12:02d}-{1 + i % 28:02d}")
+            for i, valor in enumerate(rng.integers(1_000_000, 100_000_000, ocs))
+        ]
+    )
+    conn.execute("COMMIT")
+    conn.close()
+    return nits
+
+def _lector(ruta, perfil, nits, segundos, resultados):
+    conn = _conectar(ruta, perfil)
+    latencias = []
+    errores = 0
+    fin = time.perf_counter() + segundos
+    i = 0
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        try:
+            conn.execute(CONSULTA_LECTOR, (nits[i % len(nits)],)).fetchall()
+            latencias.append(time.perf_counter() - inicio)
+        except sqlite3.OperationalError:
+            errores += 1
+        i += 1
+    conn.close()
+    resultados.put(('lector', latencias, errores))
+
+def _escritor(ruta, perfil, nits, segundos, resultados, semilla):
+    conn = _conectar(ruta, perfil)
+    latencias = []
+    errores = 0
+    fin = time.perf_counter() + segundos
+    i = 0
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        try:
+            # Misma forma que crear_oc: una transacción corta por OC (dispara los triggers)
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO ocs (numero, cliente_nit, valor_total, fecha) VALUES (?, ?, ?, '2026-06-01')",
+                (f"W{semilla}-{i}", nits[i % len(nits)], 5_000_000)
+            )
+            conn.execute("COMMIT")
+            latencias.append(time.perf_counter() - inicio)
+        except sqlite3.OperationalError:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            errores += 1
+        i += 1
+    conn.close()
+    resultados.put(('escritor', latencias, errores))
+
+def _resumen(latencias, segundos):
+    if not latencias:
+        return {'ops_s': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    ms = np.array(latencias) * 1000
+    return {
+        'ops_s': len(ms) / segundos,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'max_ms': float(ms.max()),
+    }
+
+def medir_perfil(perfil, lectores=4, escritores=1, segundos=10):
+    """Ejecuta lectores y escritores concurrentes sobre una base nueva con `perfil`"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'bench.db')
+        nits = preparar_base(ruta, perfil)
+        
+        contexto = multiprocessing.get_context('spawn')
+        resultados = contexto.Queue()
+        procesos = [
+            contexto.Process(target=_lector, args=(ruta, perfil, nits, segundos, resultados))
+            for _ in range(lectores)
+        ] + [
+            contexto.Process(target=_escritor, args=(ruta, perfil, nits, segundos, resultados, n))
+            for n in range(escritores)
+        ]
+        for proceso in procesos:
+            proceso.start()
+        recibidos = [resultados.get() for _ in procesos]
+        for proceso in procesos:
+            proceso.join()
+    
+    fila = {'perfil': perfil}
+    for rol in ('lector', 'escritor'):
+        latencias = [x for r, lat, _ in recibidos if r == rol for x in lat]
+        errores = sum(e for r, _, e in recibidos if r == rol)
+        fila.update({f"{rol}_{k}": v for k, v in _resumen(latencias, segundos).items()})
+        fila[f"{rol}_errores"] = errores
+    return fila
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lectores', type=int, default=4)
+    parser.add_argument('--escritores', type=int, default=1)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--perfiles', nargs='+', default=list(PERFILES), choices=list(PERFILES))
+    args = parser.parse_args()
+    
+    import pandas as pd
+    filas = [medir_perfil(p, args.lectores, args.escritores, args.segundos) for p in args.perfiles]
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.2f}'.format):
+        print(pd.DataFrame(filas).set_index('perfil').T)
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,50 @@ APP_AUTHOR = "Equipo de Automatización"
 DATABASE_PATH = "data/database.db"
 BACKUP_PATH = "data/backups"
 
+# Pool de conexiones compartido entre sesiones
+DB_POOL_SIZE = 5  # Conexiones máximas abiertas por proceso
+DB_POOL_TIMEOUT = 10  # Segundos máximos de espera por una conexión libre
+
+# Perfil de PRAGMAs aplicado a cada conexión nueva ("wal" o "default")
+DB_PERFORMANCE_PROFILE = "wal"
+DB_PRAGMA_PROFILES = {
+    # Journal clásico: los escritores bloquean a los lectores
+    "default": {
+        "busy_timeout": 5000,
+    },
+    # WAL: lectores y escritor concurrentes, fsync solo en checkpoints
+    "wal": {
+        "busy_timeout": 5000,  # Milisegundos de espera ante bloqueos
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,  # 256 MB mapeados en memoria
+        "cache_size": -65536,  # 64 MB de caché de páginas (negativo = KiB)
+        "temp_store": "MEMORY",
+    },
+}
+
+# Escrituras transaccionales (BEGIN IMMEDIATE) ante bloqueos de otros escritores
+DB_WRITE_RETRIES = 5  # Reintentos cuando la base sigue bloqueada tras busy_timeout
+DB_WRITE_BACKOFF_SECONDS = 0.05  # Espera base; se duplica en cada reintento (con variación aleatoria)
+
+# Caché de resultados de consultas (se invalida con cada escritura)
+QUERY_CACHE_MAX_MB = 64  # Tope de memoria; al superarlo se descartan las entradas menos usadas
+QUERY_CACHE_POLL_SECONDS = 1.0  # Intervalo mínimo entre consultas de PRAGMA data_version (cambios de otros procesos)
+DASHBOARD_REFRESH_SECONDS = 5  # Frecuencia con que el dashboard revisa si hubo cambios (auto-actualización)
+
+# Respaldos en línea con la API de backup de SQLite
+BACKUP_PAGES_PER_STEP = 256  # Páginas copiadas por paso
+BACKUP_STEP_SLEEP = 0.005  # Segundos de pausa entre pasos para no bloquear a otras sesiones
+BACKUP_MAX_RESTARTS = 3  # Reinicios por escrituras concurrentes antes de copiar en un solo paso
+BACKUP_COMPRESSION = "gzip"  # gzip, zstd, none
+
+# Programador de respaldos (hilo en segundo plano)
+SCHEDULER_TICK_SECONDS = 30  # Intervalo de revisión de tareas pendientes
+SCHEDULER_LOCK_FILE = "data/scheduler.lock"  # Solo el proceso que lo bloquea ejecuta el programa diario
+BACKUP_LOCK_FILE = "data/backup.lock"  # Serializa respaldos y restauraciones entre procesos
+BACKUP_DEFAULT_HOUR = "02:00"  # Hora del backup completo diario
+BACKUP_INCREMENTAL_MINUTES = 60  # Minutos entre backups incrementales (0 = desactivado)
+
 # ==================== CONFIGURACIÓN DE SEGURIDAD ====================
 
 SESSION_TIMEOUT = 3600  # 1 hora en segundos
@@ -40,10 +84,21 @@ UMBRAL_CRITICO = 90  # Porcentaje para estado CRÍTICO
 OC_MIN_VALUE = 1000000  # Valor mínimo para una OC (1 millón)
 OC_MAX_VALUE = 10000000000  # Valor máximo para una OC (10 mil millones)
 
+# ==================== CONFIGURACIÓN DE IMPORTACIÓN ====================
+
+IMPORT_CHUNK_SIZE = 50000  # Filas por bloque (y por transacción) al importar cartera
+IMPORT_MAX_RECHAZOS = 1000  # Filas rechazadas que se conservan para mostrar
+IMPORT_OCS_CHUNK_SIZE = 5000  # OCs por transacción al importar (cada fila dispara los triggers de exposición y journal)
+
 # ==================== CONFIGURACIÓN DE REPORTES ====================
 
 REPORT_RETENTION_DAYS = 30
 EXPORT_FORMAT = "excel"  # excel, csv, pdf
+EXPORT_CHUNK_SIZE = 50000  # Filas leídas del cursor y escritas por bloque al exportar
+EXPORT_PATH = "data/exports"  # Archivos generados por la cola de exportaciones
+EXPORT_WORKERS = 2  # Procesos que generan exportaciones en paralelo
+EXPORT_MAX_JOBS_POR_USUARIO = 2  # Exportaciones en cola o en proceso por usuario
+EXPORT_REFRESH_SECONDS = 2  # Frecuencia de actualización del progreso en pantalla
 
 # ==================== CONFIGURACIÓN DE LOGS ====================
 
@@ -84,12 +139,29 @@ def validate_config():
     if OC_MAX_VALUE <= OC_MIN_VALUE:
         errors.append("OC_MAX_VALUE debe ser mayor que OC_MIN_VALUE")
     
+    # Validar perfil de base de datos
+    if DB_PERFORMANCE_PROFILE not in DB_PRAGMA_PROFILES:
+        errors.append(f"DB_PERFORMANCE_PROFILE debe ser uno de: {', '.join(DB_PRAGMA_PROFILES)}")
+    
+    if DB_POOL_SIZE < 1:
+        errors.append("DB_POOL_SIZE debe ser mayor que 0")
+    
+    if BACKUP_COMPRESSION not in ("gzip", "zstd", "none"):
+        errors.append("BACKUP_COMPRESSION debe ser gzip, zstd o none")
+    
+    if EXPORT_WORKERS < 1:
+        errors.append("EXPORT_WORKERS debe ser mayor que 0")
+    
+    if EXPORT_MAX_JOBS_POR_USUARIO < 1:
+        errors.append("EXPORT_MAX_JOBS_POR_USUARIO debe ser mayor que 0")
+    
     return errors
 
 # ==================== INICIALIZACIÓN ====================
 
 # Crear directorios necesarios
 os.makedirs("data/backups", exist_ok=True)
+os.makedirs(EXPORT_PATH, exist_ok=True)
 os.makedirs("logs", exist_ok=True)
 
 # Validar configuración
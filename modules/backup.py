@@ -0,0 +1,652 @@
+"""
+Respaldos en línea de la base de datos
+Snapshot con la API de backup de SQLite, compresión, checksum y restauración validada
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from config import (
+    REPORT_RETENTION_DAYS, BACKUP_PATH, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP,
+    BACKUP_MAX_RESTARTS, BACKUP_COMPRESSION
+)
+from modules.database import (
+    get_db_connection, pooled_connection, run_migrations,
+    aplicar_cambios_journal, reconstruir_exposicion, reconstruir_secuencias_oc, invalidar_cache,
+    nueva_epoca_datos
+)
+
+BACKUP_PREFIX = "finanzas_backup_"
+INCREMENTAL_PREFIX = "finanzas_incremental_"
+CHECKSUM_SUFFIX = ".sha256"
+MANIFEST_FILE = "manifest.json"
+_BLOQUE_IO = 1024 * 1024
+_FILAS_POR_LECTURA = 5000
+
+# Serializa backups y restauraciones dentro del proceso (el manifiesto es compartido)
+_backup_lock = threading.RLock()
+
+# ==================== COMPRESIÓN ====================
+
+def _zstd_disponible():
+    """Indica si el paquete opcional zstandard está instalado"""
+    try:
+        import zstandard  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _formato_efectivo(compresion):
+    """zstd es opcional: sin el paquete instalado se respalda con gzip"""
+    if compresion == "zstd" and not _zstd_disponible():
+        return "gzip"
+    return compresion
+
+def _extension(compresion):
+    return {"gzip": ".gz", "zstd": ".zst", "none": ""}[compresion]
+
+def _compresion_de(ruta):
+    """Deduce el formato de compresión por la extensión del respaldo"""
+    if ruta.endswith(".gz"):
+        return "gzip"
+    if ruta.endswith(".zst"):
+        return "zstd"
+    return "none"
+
+def _abrir_comprimido(ruta, modo, compresion=None):
+    """Abre un archivo de respaldo con el formato indicado o el de su extensión"""
+    compresion = compresion or _compresion_de(ruta)
+    if compresion == "gzip":
+        return gzip.open(ruta, modo, compresslevel=6) if "w" in modo else gzip.open(ruta, modo)
+    if compresion == "zstd":
+        import zstandard
+        if "r" in modo:
+            # El lector de zstandard no es iterable por líneas
+            return io.BufferedReader(zstandard.open(ruta, modo))
+        return zstandard.open(ruta, modo)
+    return open(ruta, modo)
+
+def _timestamp():
+    return datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+def _sha256(ruta):
+    """Checksum SHA-256 de un archivo leyendo por bloques"""
+    digest = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(_BLOQUE_IO), b""):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+def _leer_checksum(ruta_respaldo):
+    """Lee el checksum esperado del archivo .sha256 que acompaña al respaldo"""
+    ruta_checksum = ruta_respaldo + CHECKSUM_SUFFIX
+    if not os.path.exists(ruta_checksum):
+        return None
+    with open(ruta_checksum, encoding="utf-8") as archivo:
+        return archivo.read().split()[0].strip()
+
+# ==================== SNAPSHOT ====================
+
+def _posicion_journal(conn):
+    """Último id asignado en cambios_journal y fecha del último cambio presente"""
+    try:
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cambios_journal'").fetchone()
+        fecha = conn.execute("SELECT MAX(fecha) FROM cambios_journal").fetchone()[0]
+    except sqlite3.OperationalError:
+        # Base anterior a la migración del journal
+        return 0, None
+    return (seq[0] if seq else 0), fecha
+
+class _CopiaReiniciada(Exception):
+    """La copia por pasos se reinició demasiadas veces por escrituras concurrentes"""
+
+def _copiar_en_linea(origen, destino, pages, sleep, max_reinicios):
+    """
+    Copia la base con la API de backup: `pages` páginas por paso y una pausa
+    entre pasos para que lectores y escritores no queden bloqueados.
+    Cada escritura de otra conexión reinicia la copia; si se reinicia más de
+    `max_reinicios` veces se termina en un solo paso (en WAL la lectura no
+    bloquea a los escritores).
+    """
+    estadisticas = {'pasos': 0, 'paginas': 0, 'reinicios': 0, 'un_paso': False}
+    pendiente_anterior = None
+    
+    def progreso(status, remaining, total):
+        nonlocal pendiente_anterior
+        estadisticas['pasos'] += 1
+        estadisticas['paginas'] = total
+        if pendiente_anterior is not None and remaining > pendiente_anterior:
+            estadisticas['reinicios'] += 1
+            if estadisticas['reinicios'] > max_reinicios:
+                raise _CopiaReiniciada()
+        pendiente_anterior = remaining
+        if remaining and sleep:
+            time.sleep(sleep)
+    
+    try:
+        origen.backup(destino, pages=pages, progress=progreso)
+    except _CopiaReiniciada:
+        origen.backup(destino, pages=-1)
+        estadisticas['un_paso'] = True
+    return estadisticas
+
+def crear_snapshot(destino_dir=BACKUP_PATH, compresion=BACKUP_COMPRESSION,
+                   pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP,
+                   max_reinicios=BACKUP_MAX_RESTARTS):
+    """
+    Crea un respaldo consistente de la base mientras la aplicación sigue en uso.
+    El archivo final se escribe comprimido junto a un .sha256 del contenido
+    sin comprimir. Retorna un diccionario con la ruta y las métricas del respaldo.
+    """
+    os.makedirs(destino_dir, exist_ok=True)
+    compresion = _formato_efectivo(compresion)
+    inicio = time.perf_counter()
+    
+    nombre = f"{BACKUP_PREFIX}{_timestamp()}.db"
+    ruta_final = os.path.join(destino_dir, nombre + _extension(compresion))
+    ruta_temporal = os.path.join(destino_dir, f".{nombre}.tmp")
+    
+    # Conexión dedicada: el backup no debe ocupar un lugar del pool
+    origen = get_db_connection()
+    destino = sqlite3.connect(ruta_temporal)
+    try:
+        estadisticas = _copiar_en_linea(origen, destino, pages, sleep, max_reinicios)
+        estadisticas['journal_id'], estadisticas['journal_fecha'] = _posicion_journal(destino)
+        # El snapshot queda como un único archivo autocontenido (sin -wal/-shm)
+        destino.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        destino.close()
+        origen.close()
+    
+    try:
+        checksum = _sha256(ruta_temporal)
+        tamano_db = os.path.getsize(ruta_temporal)
+        
+        # Escritura atómica: el respaldo solo aparece con su nombre final cuando está completo
+        ruta_parcial = ruta_final + ".part"
+        with open(ruta_temporal, "rb") as entrada, _abrir_comprimido(ruta_parcial, "wb", compresion) as salida:
+            shutil.copyfileobj(entrada, salida, _BLOQUE_IO)
+        os.replace(ruta_parcial, ruta_final)
+        
+        with open(ruta_final + CHECKSUM_SUFFIX, "w", encoding="utf-8") as archivo:
+            archivo.write(f"{checksum}  {nombre}\n")
+    finally:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+    
+    estadisticas.update({
+        'archivo': ruta_final,
+        'compresion': compresion,
+        'sha256': checksum,
+        'tamano_db': tamano_db,
+        'tamano_archivo': os.path.getsize(ruta_final),
+        'segundos': time.perf_counter() - inicio
+    })
+    return estadisticas
+
+# ==================== VALIDACIÓN Y RESTAURACIÓN ====================
+
+def _descomprimir(ruta_respaldo, ruta_destino):
+    with _abrir_comprimido(ruta_respaldo, "rb") as entrada, open(ruta_destino, "wb") as salida:
+        shutil.copyfileobj(entrada, salida, _BLOQUE_IO)
+
+def _integridad(ruta_db):
+    """Ejecuta PRAGMA integrity_check sobre un archivo de base de datos"""
+    conn = sqlite3.connect(f"file:{ruta_db}?mode=ro", uri=True)
+    try:
+        resultado = conn.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        conn.close()
+    return [fila[0] for fila in resultado]
+
+def verificar_snapshot(ruta_respaldo, ruta_destino=None):
+    """
+    Descomprime el respaldo y valida checksum e integridad.
+    Retorna la ruta del archivo .db descomprimido; lanza ValueError si el
+    respaldo no es válido. Si no se indica `ruta_destino` el archivo se
+    elimina al terminar y se retorna None.
+    """
+    if not os.path.exists(ruta_respaldo):
+        raise ValueError(f"No existe el respaldo {ruta_respaldo}")
+    
+    conservar = ruta_destino is not None
+    if ruta_destino is None:
+        ruta_destino = os.path.join(
+            os.path.dirname(ruta_respaldo) or ".",
+            f".verificacion_{os.getpid()}_{time.time_ns()}.db"
+        )
+    
+    try:
+        try:
+            _descomprimir(ruta_respaldo, ruta_destino)
+        except (OSError, EOFError) as e:
+            raise ValueError(f"No se pudo descomprimir el respaldo: {e}") from e
+        
+        esperado = _leer_checksum(ruta_respaldo)
+        if esperado is None:
+            raise ValueError("El respaldo no tiene archivo de checksum")
+        if _sha256(ruta_destino) != esperado:
+            raise ValueError("El checksum del respaldo no coincide")
+        
+        try:
+            resultado = _integridad(ruta_destino)
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"El respaldo no es una base de datos válida: {e}") from e
+        if resultado != ["ok"]:
+            raise ValueError(f"Integridad del respaldo comprometida: {'; '.join(resultado[:5])}")
+    except Exception:
+        if os.path.exists(ruta_destino):
+            os.remove(ruta_destino)
+        raise
+    
+    if not conservar:
+        os.remove(ruta_destino)
+        return None
+    return ruta_destino
+
+def _copiar_sobre_base(ruta_db):
+    """
+    Copia una base validada sobre la base en uso.
+    La copia se hace con la API de backup en un solo paso, dentro de una
+    transacción de escritura: las demás conexiones ven la base anterior o la
+    restaurada, nunca un estado intermedio.
+    """
+    snapshot = sqlite3.connect(ruta_db)
+    destino = get_db_connection()
+    try:
+        snapshot.backup(destino, pages=-1)
+        # Un respaldo antiguo puede tener un esquema anterior
+        run_migrations(destino)
+        # La secuencia del journal retrocede: las versiones anteriores no deben repetirse
+        nueva_epoca_datos(destino)
+        destino.commit()
+    finally:
+        destino.close()
+        snapshot.close()
+    # La copia no pasa por el pool: los resultados cacheados quedaron obsoletos
+    invalidar_cache()
+
+def restaurar_snapshot(ruta_respaldo):
+    """
+    Valida el respaldo y lo copia sobre la base en uso.
+    Después toma un backup completo: la restauración inicia una nueva cadena
+    de incrementales.
+    """
+    with _backup_lock:
+        ruta_validada = os.path.join(
+            os.path.dirname(ruta_respaldo) or ".",
+            f".restauracion_{os.getpid()}_{time.time_ns()}.db"
+        )
+        verificar_snapshot(ruta_respaldo, ruta_validada)
+        
+        try:
+            _copiar_sobre_base(ruta_validada)
+        finally:
+            os.remove(ruta_validada)
+        
+        destino_dir = os.path.dirname(ruta_respaldo) or "."
+        entrada = next(
+            (e for e in _leer_manifest(destino_dir) if e['archivo'] == os.path.basename(ruta_respaldo)),
+            None
+        )
+        crear_backup_completo(destino_dir, hasta_fecha=entrada['hasta_fecha'] if entrada else None)
+    
+    return True
+
+def listar_snapshots(destino_dir=BACKUP_PATH):
+    """Lista los respaldos disponibles, del más reciente al más antiguo"""
+    if not os.path.isdir(destino_dir):
+        return []
+    
+    respaldos = []
+    for nombre in os.listdir(destino_dir):
+        if not nombre.startswith(BACKUP_PREFIX) or nombre.endswith((CHECKSUM_SUFFIX, ".part")):
+            continue
+        ruta = os.path.join(destino_dir, nombre)
+        respaldos.append({
+            'archivo': ruta,
+            'nombre': nombre,
+            'tamano': os.path.getsize(ruta),
+            'fecha': datetime.fromtimestamp(os.path.getmtime(ruta)),
+            'con_checksum': os.path.exists(ruta + CHECKSUM_SUFFIX)
+        })
+    
+    return sorted(respaldos, key=lambda r: r['nombre'], reverse=True)
+
+# ==================== BACKUP INCREMENTAL ====================
+# Un backup completo inicia una cadena; cada incremental exporta los cambios
+# del journal posteriores al último archivo de la cadena y los elimina de la
+# base en uso. El manifiesto registra la cadena en orden.
+
+def _leer_manifest(destino_dir):
+    ruta = os.path.join(destino_dir, MANIFEST_FILE)
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta, encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+def _guardar_manifest(destino_dir, entradas):
+    """Escribe el manifiesto de forma atómica"""
+    ruta = os.path.join(destino_dir, MANIFEST_FILE)
+    with open(ruta + ".part", "w", encoding="utf-8") as archivo:
+        json.dump(entradas, archivo, ensure_ascii=False, indent=1)
+    os.replace(ruta + ".part", ruta)
+
+def _podar_journal(hasta_id):
+    """
+    Elimina del journal en uso los cambios que ya quedaron respaldados.
+    No cambia datos de negocio ni version_datos: no invalida la caché.
+    """
+    with pooled_connection(invalidar=False) as conn:
+        conn.execute("DELETE FROM cambios_journal WHERE id <= ?", (hasta_id,))
+        conn.commit()
+
+def crear_backup_completo(destino_dir=BACKUP_PATH, hasta_fecha=None):
+    """
+    Toma un snapshot completo y lo registra como base de una nueva cadena.
+    `hasta_fecha` indica la fecha del último cambio contenido cuando el
+    journal del snapshot está vacío (p. ej. después de una restauración).
+    """
+    with _backup_lock:
+        stats = crear_snapshot(destino_dir)
+        entradas = _leer_manifest(destino_dir)
+        
+        if stats['journal_fecha'] is None and hasta_fecha is None and entradas:
+            # Sin cambios desde el último archivo: el estado es el mismo
+            hasta_fecha = entradas[-1]['hasta_fecha']
+        
+        nombre = os.path.basename(stats['archivo'])
+        entrada = {
+            'tipo': 'completo',
+            'archivo': nombre,
+            'base': nombre,
+            'fecha': datetime.now().isoformat(sep=' ', timespec='seconds'),
+            'desde_id': 0,
+            'hasta_id': stats['journal_id'],
+            'hasta_fecha': stats['journal_fecha'] or hasta_fecha,
+            'cambios': None,
+            'tamano': stats['tamano_archivo'],
+            'segundos': round(stats['segundos'], 3),
+            'sha256': stats['sha256'],
+        }
+        entradas.append(entrada)
+        _guardar_manifest(destino_dir, entradas)
+        _podar_journal(stats['journal_id'])
+    
+    return entrada
+
+def crear_backup_incremental(destino_dir=BACKUP_PATH, compresion=BACKUP_COMPRESSION):
+    """
+    Exporta los cambios del journal desde el último archivo de la cadena.
+    El costo depende de la cantidad de cambios, no del tamaño de la base.
+    Sin backup completo previo toma uno; sin cambios retorna None.
+    """
+    with _backup_lock:
+        entradas = _leer_manifest(destino_dir)
+        completos = [e for e in entradas if e['tipo'] == 'completo']
+        if not completos:
+            return crear_backup_completo(destino_dir)
+        
+        base = completos[-1]['archivo']
+        desde_id = max(e['hasta_id'] for e in entradas if e['base'] == base)
+        
+        compresion = _formato_efectivo(compresion)
+        inicio = time.perf_counter()
+        nombre = f"{INCREMENTAL_PREFIX}{_timestamp()}.jsonl"
+        ruta_final = os.path.join(destino_dir, nombre + _extension(compresion))
+        ruta_parcial = ruta_final + ".part"
+        
+        digest = hashlib.sha256()
+        cambios, hasta_id, desde_fecha, hasta_fecha = 0, desde_id, None, None
+        with pooled_connection() as conn:
+            cursor = conn.execute(
+                "SELECT id, tabla, operacion, fila_id, datos, fecha FROM cambios_journal "
+                "WHERE id > ? ORDER BY id",
+                (desde_id,)
+            )
+            with _abrir_comprimido(ruta_parcial, "wb", compresion) as salida:
+                while True:
+                    filas = cursor.fetchmany(_FILAS_POR_LECTURA)
+                    if not filas:
+                        break
+                    lineas = "".join(
+                        json.dumps(tuple(fila), ensure_ascii=False) + "\n" for fila in filas
+                    ).encode("utf-8")
+                    digest.update(lineas)
+                    salida.write(lineas)
+                    
+                    cambios += len(filas)
+                    hasta_id = filas[-1]['id']
+                    hasta_fecha = filas[-1]['fecha']
+                    desde_fecha = desde_fecha or filas[0]['fecha']
+        
+        if cambios == 0:
+            os.remove(ruta_parcial)
+            return None
+        
+        os.replace(ruta_parcial, ruta_final)
+        with open(ruta_final + CHECKSUM_SUFFIX, "w", encoding="utf-8") as archivo:
+            archivo.write(f"{digest.hexdigest()}  {nombre}\n")
+        
+        entrada = {
+            'tipo': 'incremental',
+            'archivo': os.path.basename(ruta_final),
+            'base': base,
+            'fecha': datetime.now().isoformat(sep=' ', timespec='seconds'),
+            'desde_id': desde_id,
+            'hasta_id': hasta_id,
+            'desde_fecha': desde_fecha,
+            'hasta_fecha': hasta_fecha,
+            'cambios': cambios,
+            'tamano': os.path.getsize(ruta_final),
+            'segundos': round(time.perf_counter() - inicio, 3),
+            'sha256': digest.hexdigest(),
+        }
+        entradas.append(entrada)
+        _guardar_manifest(destino_dir, entradas)
+        _podar_journal(hasta_id)
+    
+    return entrada
+
+def _leer_incremental(ruta):
+    """Lee y valida un archivo incremental; retorna sus cambios en orden"""
+    esperado = _leer_checksum(ruta)
+    digest = hashlib.sha256()
+    cambios = []
+    try:
+        with _abrir_comprimido(ruta, "rb") as entrada:
+            for linea in entrada:
+                digest.update(linea)
+                cambios.append(json.loads(linea))
+    except (OSError, EOFError, ValueError) as e:
+        raise ValueError(f"Incremental ilegible {os.path.basename(ruta)}: {e}") from e
+    
+    if esperado is None or digest.hexdigest() != esperado:
+        raise ValueError(f"El checksum del incremental {os.path.basename(ruta)} no coincide")
+    return cambios
+
+def _formato_objetivo(fecha_objetivo):
+    """Normaliza la fecha objetivo al formato del journal (hora local, milisegundos)"""
+    if isinstance(fecha_objetivo, datetime):
+        if fecha_objetivo.microsecond == 0:
+            # Una hora sin fracción incluye todo ese segundo
+            return fecha_objetivo.strftime('%Y-%m-%d %H:%M:%S') + '.999'
+        return fecha_objetivo.isoformat(sep=' ', timespec='milliseconds')
+    return str(fecha_objetivo)
+
+def restaurar_a_fecha(fecha_objetivo, destino_dir=BACKUP_PATH):
+    """
+    Restaura la base al estado que tenía en `fecha_objetivo`: toma el backup
+    completo más reciente anterior a esa fecha y reaplica sobre una copia los
+    cambios de sus incrementales hasta la fecha. La copia resultante se
+    valida y se copia sobre la base en uso; luego inicia una nueva cadena.
+    """
+    objetivo = _formato_objetivo(fecha_objetivo)
+    
+    with _backup_lock:
+        # Los cambios aún no exportados también forman parte de la historia
+        crear_backup_incremental(destino_dir)
+        entradas = _leer_manifest(destino_dir)
+        
+        indice_base = next(
+            (i for i in range(len(entradas) - 1, -1, -1)
+             if entradas[i]['tipo'] == 'completo' and (entradas[i]['hasta_fecha'] or '') <= objetivo),
+            None
+        )
+        if indice_base is None:
+            raise ValueError(f"No hay un backup completo anterior a {objetivo}")
+        
+        base = entradas[indice_base]
+        incrementales = [
+            e for e in entradas[indice_base + 1:]
+            if e['tipo'] == 'incremental' and e['base'] == base['archivo']
+            and (e['desde_fecha'] or '') <= objetivo
+        ]
+        
+        ruta_trabajo = os.path.join(destino_dir, f".pitr_{os.getpid()}_{time.time_ns()}.db")
+        verificar_snapshot(os.path.join(destino_dir, base['archivo']), ruta_trabajo)
+        
+        try:
+            conn = sqlite3.connect(ruta_trabajo)
+            try:
+                run_migrations(conn)
+                aplicados, ultima_fecha = _reaplicar(conn, incrementales, objetivo, destino_dir)
+            finally:
+                conn.close()
+            
+            if _integridad(ruta_trabajo) != ["ok"]:
+                raise ValueError("La base reconstruida no pasó la verificación de integridad")
+            _copiar_sobre_base(ruta_trabajo)
+        finally:
+            if os.path.exists(ruta_trabajo):
+                os.remove(ruta_trabajo)
+        
+        nuevo = crear_backup_completo(destino_dir, hasta_fecha=ultima_fecha or base['hasta_fecha'])
+    
+    return {
+        'objetivo': objetivo,
+        'base': base['archivo'],
+        'incrementales': len(incrementales),
+        'cambios_aplicados': aplicados,
+        'nuevo_backup': nuevo['archivo'],
+    }
+
+def _reaplicar(conn, incrementales, objetivo, destino_dir):
+    """Reaplica los cambios hasta `objetivo` con los triggers desactivados"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = conn.cursor()
+        # Las filas del journal son imágenes completas: los triggers se recrean al final
+        triggers = cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+        ).fetchall()
+        for nombre, _ in triggers:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+        
+        aplicados, ultima_fecha = 0, None
+        for entrada in incrementales:
+            cambios = _leer_incremental(os.path.join(destino_dir, entrada['archivo']))
+            vigentes = [c for c in cambios if c[5] <= objetivo]
+            aplicados += aplicar_cambios_journal(cursor, [c[1:5] for c in vigentes])
+            if vigentes:
+                ultima_fecha = vigentes[-1][5]
+            if len(vigentes) < len(cambios):
+                break
+        
+        reconstruir_exposicion(cursor)
+        # La secuencia no está en el journal: se recalcula desde las OCs reaplicadas
+        reconstruir_secuencias_oc(cursor)
+        for _, sql in triggers:
+            cursor.execute(sql)
+        cursor.execute("DELETE FROM cambios_journal")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    return aplicados, ultima_fecha
+
+def get_historial_backups(destino_dir=BACKUP_PATH):
+    """Historial de backups completos e incrementales, del más reciente al más antiguo"""
+    columnas = ['fecha', 'tipo', 'archivo', 'cambios', 'tamano', 'segundos', 'hasta_fecha']
+    entradas = _leer_manifest(destino_dir)
+    if not entradas:
+        return pd.DataFrame(columns=columnas)
+    return pd.DataFrame(entradas)[columnas].iloc[::-1].reset_index(drop=True)
+
+# ==================== RETENCIÓN ====================
+
+def _eliminar(ruta):
+    """Elimina un archivo y su checksum; retorna los bytes liberados"""
+    liberado = 0
+    for candidato in (ruta, ruta + CHECKSUM_SUFFIX):
+        if os.path.exists(candidato):
+            liberado += os.path.getsize(candidato)
+            os.remove(candidato)
+    return liberado
+
+def podar_backups(retencion_dias, destino_dir=BACKUP_PATH, retencion_reportes=REPORT_RETENTION_DAYS):
+    """
+    Elimina respaldos y exportaciones vencidas.
+    Las cadenas (completo + incrementales) se eliminan completas cuando su
+    archivo más reciente supera `retencion_dias`; la cadena vigente nunca se
+    elimina. Con retencion_dias = 0 los respaldos se conservan indefinidamente.
+    Los reportes exportados vencen con `retencion_reportes`.
+    """
+    resultado = {'archivos': 0, 'bytes': 0}
+    if not os.path.isdir(destino_dir):
+        return resultado
+    
+    ahora = datetime.now()
+    
+    with _backup_lock:
+        entradas = _leer_manifest(destino_dir)
+        registrados = {e['archivo'] for e in entradas}
+        
+        if retencion_dias:
+            limite = (ahora - timedelta(days=retencion_dias)).isoformat(sep=' ', timespec='seconds')
+            cadenas = {}
+            for entrada in entradas:
+                cadenas.setdefault(entrada['base'], []).append(entrada)
+            vigente = next((e['base'] for e in reversed(entradas) if e['tipo'] == 'completo'), None)
+            
+            vencidas = {
+                base for base, cadena in cadenas.items()
+                if base != vigente and max(e['fecha'] for e in cadena) < limite
+            }
+            for entrada in entradas:
+                if entrada['base'] in vencidas:
+                    resultado['bytes'] += _eliminar(os.path.join(destino_dir, entrada['archivo']))
+                    resultado['archivos'] += 1
+            if vencidas:
+                _guardar_manifest(destino_dir, [e for e in entradas if e['base'] not in vencidas])
+        
+        for nombre in os.listdir(destino_dir):
+            ruta = os.path.join(destino_dir, nombre)
+            if nombre in registrados or nombre.endswith(CHECKSUM_SUFFIX) or not os.path.isfile(ruta):
+                continue
+            
+            antiguedad = ahora - datetime.fromtimestamp(os.path.getmtime(ruta))
+            if nombre.startswith((BACKUP_PREFIX, INCREMENTAL_PREFIX)):
+                # Respaldos fuera del manifiesto (anteriores a los incrementales)
+                vencido = retencion_dias and antiguedad > timedelta(days=retencion_dias)
+            elif nombre.endswith(('.xlsx', '.csv')):
+                vencido = antiguedad > timedelta(days=retencion_reportes)
+            else:
+                vencido = False
+            
+            if vencido:
+                resultado['bytes'] += _eliminar(ruta)
+                resultado['archivos'] += 1
+    
+    return resultado
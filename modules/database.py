@@ -1,30 +1,465 @@
 import sqlite3
+import base64
+import json
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import streamlit as st
 
+from config import (
+    BACKUP_PATH, BACKUP_DEFAULT_HOUR, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+    DB_PERFORMANCE_PROFILE, DB_PRAGMA_PROFILES, REPORT_RETENTION_DAYS,
+    QUERY_CACHE_MAX_MB, QUERY_CACHE_POLL_SECONDS, DB_WRITE_RETRIES, DB_WRITE_BACKOFF_SECONDS,
+    IMPORT_OCS_CHUNK_SIZE, EXPORT_CHUNK_SIZE
+)
+
 # Configuración de la base de datos
 DB_PATH = "data/finanzas.db"
 
 def get_db_connection():
     """Establece conexión con la base de datos"""
-    conn = sqlite3.connect(DB_PATH)
+    # check_same_thread=False: las conexiones del pool pasan entre hilos de sesión
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    apply_pragmas(conn)
     return conn
 
-def execute_query(query, params=()):
-    """Ejecuta una consulta SQL"""
-    conn = get_db_connection()
+def apply_pragmas(conn, profile=DB_PERFORMANCE_PROFILE):
+    """Aplica el perfil de PRAGMAs configurado a una conexión"""
+    for pragma, value in DB_PRAGMA_PROFILES[profile].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+# ==================== POOL DE CONEXIONES ====================
+
+class ConnectionPool:
+    """Pool acotado de conexiones SQLite reutilizables, seguro entre hilos"""
+    
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._stats = {
+            'checkouts': 0,
+            'espera_total': 0.0,
+            'espera_max': 0.0,
+            'timeouts': 0,
+            'conexiones_creadas': 0,
+            'conexiones_descartadas': 0
+        }
+    
+    def _connect(self):
+        """Crea una conexión nueva respetando el tamaño máximo"""
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            conn = get_db_connection()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._stats['conexiones_creadas'] += 1
+        return conn
+    
+    def _discard(self, conn):
+        """Cierra una conexión defectuosa y libera su cupo en el pool"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._stats['conexiones_descartadas'] += 1
+    
+    @staticmethod
+    def _is_healthy(conn):
+        """Verifica que la conexión siga respondiendo"""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def acquire(self):
+        """Obtiene una conexión del pool, esperando hasta `timeout` segundos"""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+                if conn is None:
+                    remaining = deadline - time.perf_counter()
+                    try:
+                        conn = self._idle.get(timeout=max(remaining, 0))
+                    except queue.Empty:
+                        with self._lock:
+                            self._stats['timeouts'] += 1
+                        raise TimeoutError(
+                            f"No hay conexiones disponibles tras {self.timeout}s de espera"
+                        )
+            
+            if self._is_healthy(conn):
+                break
+            self._discard(conn)
+        
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['espera_total'] += wait
+            self._stats['espera_max'] = max(self._stats['espera_max'], wait)
+        return conn
+    
+    def release(self, conn):
+        """Devuelve una conexión al pool descartando transacciones abiertas"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (sqlite3.Error, queue.Full):
+            self._discard(conn)
+    
+    def stats(self):
+        """Contadores de uso y tiempos de espera del pool"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['conexiones_abiertas'] = self._created
+        stats['conexiones_libres'] = self._idle.qsize()
+        stats['conexiones_en_uso'] = stats['conexiones_abiertas'] - stats['conexiones_libres']
+        stats['espera_promedio'] = (
+            stats['espera_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        )
+        return stats
+
+@st.cache_resource
+def get_pool():
+    """Pool de conexiones compartido por todas las sesiones del proceso"""
+    # Crea el esquema o lo actualiza en sitio una sola vez por proceso
+    init_db()
+    return ConnectionPool()
+
+@contextmanager
+def pooled_connection(invalidar=True):
+    """
+    Presta una conexión del pool durante el bloque `with`.
+    invalidar=False es para escrituras que no cambian datos de negocio
+    (registro de tareas, poda del journal): no descartan la caché.
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    cambios = conn.total_changes
     try:
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
-        return cursor.lastrowid
-    except Exception as e:
-        conn.rollback()
-        raise e
+        yield conn
     finally:
-        conn.close()
+        # Cualquier escritura hecha con la conexión invalida la caché de consultas
+        if invalidar and conn.total_changes != cambios:
+            # El commit propio ya invalida aquí: el watcher no debe contarlo otra vez
+            _data_watcher.sincronizar()
+            invalidar_cache()
+        pool.release(conn)
+
+def get_pool_stats():
+    """Obtiene las estadísticas del pool de conexiones"""
+    return get_pool().stats()
+
+def execute_query(query, params=()):
+    """Ejecuta una consulta SQL"""
+    with pooled_connection() as conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            conn.commit()
+            return cursor.lastrowid
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+# ==================== CONCURRENCIA DE ESCRITURAS ====================
+
+class ConflictoConcurrencia(ValueError):
+    """La fila cambió en otra sesión desde que el usuario la leyó"""
+
+def _es_bloqueo(error):
+    """SQLITE_BUSY / SQLITE_LOCKED: otro escritor retuvo la base más que busy_timeout"""
+    mensaje = str(error).lower()
+    return 'locked' in mensaje or 'busy' in mensaje
+
+def reintentar_si_ocupada(func):
+    """
+    Reintenta una escritura transaccional con backoff exponencial cuando la
+    base sigue bloqueada. La función debe ser idempotente ante el rollback.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for intento in range(DB_WRITE_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not _es_bloqueo(e) or intento == DB_WRITE_RETRIES:
+                    raise
+                # La variación aleatoria evita que los escritores reintenten a la vez
+                time.sleep(DB_WRITE_BACKOFF_SECONDS * 2 ** intento * (1 + random.random()))
+    return wrapper
+
+# ==================== CACHÉ DE CONSULTAS ====================
+
+class QueryCache:
+    """
+    Caché LRU de resultados con tope de memoria.
+    Las claves incluyen la generación de datos vigente al consultar: una
+    escritura incrementa la generación y las entradas anteriores dejan de servirse.
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.generacion = 0
+        self.actualizado = datetime.now()
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidaciones': 0}
+    
+    def get(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self._stats['misses'] += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self._stats['hits'] += 1
+            return entrada[0]
+    
+    def put(self, clave, valor, generacion):
+        tamano = _tamano_resultado(valor)
+        with self._lock:
+            # Un resultado leído antes de la última escritura ya no es válido
+            if generacion != self.generacion or tamano > self.max_bytes:
+                return
+            if clave in self._entradas:
+                self._bytes -= self._entradas.pop(clave)[1]
+            self._entradas[clave] = (valor, tamano)
+            self._bytes += tamano
+            while self._bytes > self.max_bytes:
+                _, (_, liberado) = self._entradas.popitem(last=False)
+                self._bytes -= liberado
+                self._stats['evictions'] += 1
+    
+    def invalidar(self):
+        """Nueva generación de datos: descarta todas las entradas"""
+        with self._lock:
+            self.generacion += 1
+            self.actualizado = datetime.now()
+            self._entradas.clear()
+            self._bytes = 0
+            self._stats['invalidaciones'] += 1
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entradas'] = len(self._entradas)
+            stats['bytes'] = self._bytes
+            stats['max_bytes'] = self.max_bytes
+            stats['generacion'] = self.generacion
+        consultas = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / consultas if consultas else 0.0
+        return stats
+
+class DataVersionWatcher:
+    """
+    Detecta commits hechos sobre el mismo archivo por otras conexiones,
+    incluidas las de otros procesos. PRAGMA data_version cambia en una conexión
+    cuando otra conexión confirma cambios; una conexión dedicada lo consulta
+    a lo sumo cada `intervalo` segundos. Solo cuenta como cambio si además
+    cambió version_datos: los commits de tablas auxiliares (registro de
+    respaldos, poda del journal) no descartan la caché.
+    """
+    
+    def __init__(self, intervalo=QUERY_CACHE_POLL_SECONDS):
+        self.intervalo = intervalo
+        self.cambios_detectados = 0
+        self._conn = None
+        self._version = None
+        self._datos = None
+        self._ultima_consulta = 0.0
+        self._lock = threading.Lock()
+    
+    def hubo_cambios(self):
+        """True si la base cambió desde la consulta anterior"""
+        if time.monotonic() - self._ultima_consulta < self.intervalo:
+            return False
+        
+        with self._lock:
+            ahora = time.monotonic()
+            if ahora - self._ultima_consulta < self.intervalo:
+                return False
+            self._ultima_consulta = ahora
+            
+            try:
+                if self._conn is None:
+                    self._conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+                version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                if version == self._version:
+                    return False
+                datos = version_datos(self._conn)
+            except sqlite3.Error:
+                # Sin una lectura confiable no se puede asegurar que la caché siga vigente
+                self._cerrar()
+                return True
+            
+            # La primera lectura solo toma la referencia
+            primera = self._version is None
+            self._version = version
+            anteriores, self._datos = self._datos, datos
+            if primera or datos == anteriores:
+                return False
+            self.cambios_detectados += 1
+            return True
+    
+    def sincronizar(self):
+        """
+        Toma la versión actual como vista, tras un commit de este proceso que
+        ya invalidó la caché. Llamar antes de invalidar: un commit externo
+        posterior se detecta en la siguiente consulta.
+        """
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                self._datos = version_datos(self._conn)
+            except sqlite3.Error:
+                self._cerrar()
+    
+    def _cerrar(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+        self._conn = None
+        self._version = None
+        self._datos = None
+
+def _tamano_resultado(valor):
+    """Tamaño aproximado en bytes de un resultado cacheado"""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if hasattr(valor, 'to_plotly_json'):
+        # Figuras de Plotly: el JSON es lo que ocupa sus arreglos de datos
+        return len(valor.to_json())
+    if isinstance(valor, (tuple, list)):
+        return sys.getsizeof(valor) + sum(_tamano_resultado(v) for v in valor)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(sys.getsizeof(v) for v in valor.values())
+    return sys.getsizeof(valor)
+
+def _copiar_resultado(valor):
+    """Copia para que quien llama pueda modificar el resultado sin alterar la caché"""
+    if isinstance(valor, pd.DataFrame):
+        return valor.copy()
+    if isinstance(valor, tuple):
+        return tuple(_copiar_resultado(v) for v in valor)
+    if isinstance(valor, (dict, list)):
+        return valor.copy()
+    return valor
+
+_query_cache = QueryCache(QUERY_CACHE_MAX_MB * 1024 * 1024)
+_data_watcher = DataVersionWatcher()
+
+def cached_query(func):
+    """
+    Sirve desde memoria los resultados de una lectura mientras los datos no cambien.
+    También aplica a funciones que construyen figuras a partir de consultas cacheadas.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        generacion = get_generacion_datos()
+        clave = (func.__name__, args, tuple(sorted(kwargs.items())), generacion)
+        try:
+            hash(clave)
+        except TypeError:
+            # Argumentos no hasheables: se consulta sin caché
+            return func(*args, **kwargs)
+        
+        resultado = _query_cache.get(clave)
+        if resultado is None:
+            resultado = func(*args, **kwargs)
+            _query_cache.put(clave, resultado, generacion)
+        return _copiar_resultado(resultado)
+    
+    return wrapper
+
+def invalidar_cache():
+    """Incrementa la generación de datos (llamar después de cada escritura)"""
+    _query_cache.invalidar()
+
+def get_generacion_datos():
+    """
+    Generación vigente de los datos, incluyendo los commits de otros procesos.
+    Las escrituras locales la incrementan al instante (pooled_connection); las
+    de otros procesos, en la siguiente consulta de data_version.
+    """
+    if _data_watcher.hubo_cambios():
+        invalidar_cache()
+    return _query_cache.generacion
+
+def version_datos(conn):
+    """
+    Versión de los datos comparable entre procesos (data_version solo compara
+    lecturas de una misma conexión): (época, último id asignado en cambios_journal).
+    La época cambia con los cambios que no pasan por el journal, como las
+    restauraciones, que además hacen retroceder la secuencia.
+    Dentro de una transacción de lectura es la versión de su snapshot.
+    """
+    epoca = conn.execute("SELECT valor FROM configuracion WHERE clave = 'epoca_datos'").fetchone()
+    fila = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cambios_journal'").fetchone()
+    return (epoca[0] if epoca else '', fila[0] if fila else 0)
+
+def get_version_datos():
+    """
+    version_datos leída con una conexión del pool: solo cambia con los datos
+    de clientes, OCs y autorizaciones parciales (y con las restauraciones)
+    """
+    with pooled_connection() as conn:
+        return version_datos(conn)
+
+def nueva_epoca_datos(conn):
+    """
+    Registra una época nueva de los datos dentro de la transacción de quien
+    llama: version_datos deja de coincidir con cualquier versión anterior
+    """
+    conn.execute("""
+    INSERT INTO configuracion (clave, valor) VALUES ('epoca_datos', ?)
+    ON CONFLICT(clave) DO UPDATE SET
+        valor = excluded.valor,
+        fecha_actualizacion = CURRENT_TIMESTAMP
+    """, (uuid.uuid4().hex,))
+
+def get_ultima_actualizacion():
+    """Fecha y hora del último cambio de datos detectado por este proceso"""
+    get_generacion_datos()
+    return _query_cache.actualizado
+
+def get_cache_stats():
+    """Estadísticas de aciertos, fallos y descartes de la caché de consultas"""
+    stats = _query_cache.stats()
+    stats['cambios_detectados'] = _data_watcher.cambios_detectados
+    return stats
 
 def init_db():
     """Inicializa la base de datos con tablas y datos iniciales"""
@@ -106,50 +541,794 @@ def init_db():
         ''', sample_ocs)
     
     conn.commit()
+    
+    # Actualizar en sitio el esquema de bases de datos existentes
+    run_migrations(conn)
     conn.close()
     
     # Crear carpeta de respaldo si no existe
     import os
-    os.makedirs("backup", exist_ok=True)
+    os.makedirs(BACKUP_PATH, exist_ok=True)
 
-def backup_database():
-    """Crea un respaldo de la base de datos"""
-    import shutil
-    from datetime import datetime
+# ==================== VALORES MONETARIOS ====================
+
+# Los montos se guardan como INTEGER en pesos (unidad mínima usada en COP)
+MONEY_COLUMNS = {
+    'valor_total', 'valor_autorizado', 'valor_pendiente',
+    'total_cartera', 'cupo_sugerido', 'saldo_actual',
+    'total_pendiente', 'total_autorizado', 'disponible',
+    'total_cupo', 'total_en_uso', 'total_disponible', 'total_ocs_pendientes',
+    'cupo_total', 'cartera_total', 'disponible_total',
+    'valor_total_ocs'
+}
+
+def money_to_int(values):
+    """Convierte montos (escalar, lista o Series) a enteros int64 redondeados"""
+    array = np.rint(np.asarray(values, dtype=np.float64)).astype(np.int64)
+    return int(array) if array.ndim == 0 else array
+
+def decode_money(df):
+    """Convierte las columnas monetarias de un DataFrame a int64 exactos"""
+    for columna in MONEY_COLUMNS.intersection(df.columns):
+        if df[columna].dtype != np.int64:
+            df[columna] = money_to_int(df[columna].fillna(0).to_numpy())
+    return df
+
+def read_money_sql(query, conn, params=()):
+    """Ejecuta una consulta y entrega los montos como int64"""
+    return decode_money(pd.read_sql(query, conn, params=params))
+
+# ==================== EXPOSICIÓN POR CLIENTE ====================
+
+# Columnas derivadas: lo autorizado consume cupo hasta reflejarse en cartera
+EXPOSICION_DERIVADOS = """
+    disponible = cupo_sugerido - saldo_actual - total_autorizado,
+    porcentaje_uso = CASE WHEN cupo_sugerido > 0
+        THEN ROUND((saldo_actual + total_autorizado) * 100.0 / cupo_sugerido, 1)
+        ELSE 0 END
+"""
+
+# Aporte de una OC a la exposición de su cliente (OLD/NEW según el evento)
+_OC_PENDIENTE = "CASE WHEN {r}.estado IN ('PENDIENTE', 'PARCIAL') THEN {r}.valor_total - {r}.valor_autorizado ELSE 0 END"
+_OC_ABIERTA = "CASE WHEN {r}.estado IN ('PENDIENTE', 'PARCIAL') THEN 1 ELSE 0 END"
+
+def _aporte_oc(row, signo):
+    """SET que suma (+) o resta (-) el aporte de una OC a su cliente"""
+    return f"""
+    UPDATE cliente_exposicion SET
+        total_pendiente = total_pendiente {signo} ({_OC_PENDIENTE.format(r=row)}),
+        ocs_pendientes = ocs_pendientes {signo} ({_OC_ABIERTA.format(r=row)}),
+        total_autorizado = total_autorizado {signo} {row}.valor_autorizado
+    WHERE nit = {row}.cliente_nit;
+    """
+
+EXPOSICION_TRIGGERS = [
+    # Recalcular disponible y % de uso cuando cambian sus componentes
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_exposicion_derivados
+    AFTER UPDATE OF cupo_sugerido, saldo_actual, total_autorizado ON cliente_exposicion
+    BEGIN
+        UPDATE cliente_exposicion SET {EXPOSICION_DERIVADOS} WHERE nit = NEW.nit;
+    END
+    """,
+    # Clientes
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_clientes_exposicion_ai
+    AFTER INSERT ON clientes
+    BEGIN
+        INSERT INTO cliente_exposicion (nit, nombre, cupo_sugerido, saldo_actual, excluir_calculo)
+        VALUES (NEW.nit, NEW.nombre, NEW.cupo_sugerido, NEW.total_cartera, NEW.excluir_calculo);
+        UPDATE cliente_exposicion SET
+            total_pendiente = COALESCE((SELECT SUM({_OC_PENDIENTE.format(r='o')}) FROM ocs o WHERE o.cliente_nit = NEW.nit), 0),
+            ocs_pendientes = COALESCE((SELECT SUM({_OC_ABIERTA.format(r='o')}) FROM ocs o WHERE o.cliente_nit = NEW.nit), 0),
+            total_autorizado = COALESCE((SELECT SUM(o.valor_autorizado) FROM ocs o WHERE o.cliente_nit = NEW.nit), 0)
+        WHERE nit = NEW.nit;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_clientes_exposicion_au
+    AFTER UPDATE OF nit, nombre, cupo_sugerido, total_cartera, excluir_calculo ON clientes
+    BEGIN
+        UPDATE cliente_exposicion SET
+            nit = NEW.nit,
+            nombre = NEW.nombre,
+            cupo_sugerido = NEW.cupo_sugerido,
+            saldo_actual = NEW.total_cartera,
+            excluir_calculo = NEW.excluir_calculo
+        WHERE nit = OLD.nit;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_clientes_exposicion_ad
+    AFTER DELETE ON clientes
+    BEGIN
+        DELETE FROM cliente_exposicion WHERE nit = OLD.nit;
+    END
+    """,
+    # OCs
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ocs_exposicion_ai
+    AFTER INSERT ON ocs
+    BEGIN
+        {_aporte_oc('NEW', '+')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ocs_exposicion_au
+    AFTER UPDATE OF cliente_nit, valor_total, valor_autorizado, estado ON ocs
+    BEGIN
+        {_aporte_oc('OLD', '-')}
+        {_aporte_oc('NEW', '+')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ocs_exposicion_ad
+    AFTER DELETE ON ocs
+    BEGIN
+        {_aporte_oc('OLD', '-')}
+    END
+    """,
+    # Autorizaciones: acumulan en ocs.valor_autorizado, que a su vez dispara la exposición
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_autorizaciones_ocs_ai
+    AFTER INSERT ON autorizaciones_parciales
+    BEGIN
+        UPDATE ocs SET valor_autorizado = valor_autorizado + NEW.valor_autorizado
+        WHERE numero = NEW.oc_numero;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_autorizaciones_ocs_au
+    AFTER UPDATE OF oc_numero, valor_autorizado ON autorizaciones_parciales
+    BEGIN
+        UPDATE ocs SET valor_autorizado = valor_autorizado - OLD.valor_autorizado
+        WHERE numero = OLD.oc_numero;
+        UPDATE ocs SET valor_autorizado = valor_autorizado + NEW.valor_autorizado
+        WHERE numero = NEW.oc_numero;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_autorizaciones_ocs_ad
+    AFTER DELETE ON autorizaciones_parciales
+    BEGIN
+        UPDATE ocs SET valor_autorizado = valor_autorizado - OLD.valor_autorizado
+        WHERE numero = OLD.oc_numero;
+    END
+    """,
+]
+
+# Agregados calculados desde las tablas base (fuente de verdad de la exposición)
+EXPOSICION_VIVA_QUERY = f"""
+SELECT
+    nit, nombre, cupo_sugerido, saldo_actual, excluir_calculo,
+    total_pendiente, ocs_pendientes, total_autorizado,
+    cupo_sugerido - saldo_actual - total_autorizado as disponible,
+    CASE WHEN cupo_sugerido > 0
+        THEN ROUND((saldo_actual + total_autorizado) * 100.0 / cupo_sugerido, 1)
+        ELSE 0 END as porcentaje_uso
+FROM (
+    SELECT
+        c.nit,
+        c.nombre,
+        c.cupo_sugerido,
+        c.total_cartera as saldo_actual,
+        c.excluir_calculo,
+        COALESCE(SUM({_OC_PENDIENTE.format(r='o')}), 0) as total_pendiente,
+        COALESCE(SUM({_OC_ABIERTA.format(r='o')}), 0) as ocs_pendientes,
+        COALESCE(SUM(o.valor_autorizado), 0) as total_autorizado
+    FROM clientes c
+    LEFT JOIN (
+        SELECT
+            oc.cliente_nit,
+            oc.estado,
+            oc.valor_total,
+            COALESCE(a.autorizado, 0) as valor_autorizado
+        FROM ocs oc
+        LEFT JOIN (
+            SELECT oc_numero, SUM(valor_autorizado) as autorizado
+            FROM autorizaciones_parciales
+            GROUP BY oc_numero
+        ) a ON a.oc_numero = oc.numero
+    ) o ON o.cliente_nit = c.nit
+    GROUP BY c.nit
+)
+"""
+
+EXPOSICION_COLUMNS = [
+    'nit', 'nombre', 'cupo_sugerido', 'saldo_actual', 'excluir_calculo',
+    'total_pendiente', 'ocs_pendientes', 'total_autorizado', 'disponible', 'porcentaje_uso'
+]
+
+def crear_triggers_exposicion(cursor):
+    """Crea los triggers que mantienen cliente_exposicion"""
+    for trigger in EXPOSICION_TRIGGERS:
+        cursor.execute(trigger)
+
+def reconstruir_exposicion(cursor):
+    """Recalcula ocs.valor_autorizado y cliente_exposicion desde las tablas base"""
+    cursor.execute("""
+    UPDATE ocs SET valor_autorizado = COALESCE((
+        SELECT SUM(valor_autorizado) FROM autorizaciones_parciales
+        WHERE oc_numero = ocs.numero
+    ), 0)
+    """)
+    cursor.execute("DELETE FROM cliente_exposicion")
+    cursor.execute(f"""
+    INSERT INTO cliente_exposicion ({', '.join(EXPOSICION_COLUMNS)})
+    {EXPOSICION_VIVA_QUERY}
+    """)
+
+def _crear_exposicion(cursor):
+    """Migración 2: tabla cliente_exposicion mantenida por triggers"""
+    cursor.execute("ALTER TABLE ocs ADD COLUMN valor_autorizado REAL NOT NULL DEFAULT 0")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS cliente_exposicion (
+        nit TEXT PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        cupo_sugerido REAL NOT NULL DEFAULT 0,
+        saldo_actual REAL NOT NULL DEFAULT 0,
+        excluir_calculo INTEGER NOT NULL DEFAULT 0,
+        total_pendiente REAL NOT NULL DEFAULT 0,
+        ocs_pendientes INTEGER NOT NULL DEFAULT 0,
+        total_autorizado REAL NOT NULL DEFAULT 0,
+        disponible REAL NOT NULL DEFAULT 0,
+        porcentaje_uso REAL NOT NULL DEFAULT 0
+    )
+    """)
+    reconstruir_exposicion(cursor)
+    crear_triggers_exposicion(cursor)
+
+def verificar_exposicion(reparar=False, tolerancia=0):
+    """
+    Compara cliente_exposicion con los agregados vivos de las tablas base.
+    Retorna las diferencias encontradas; con reparar=True reconstruye la tabla.
+    """
+    with pooled_connection() as conn:
+        vivo = read_money_sql(EXPOSICION_VIVA_QUERY, conn)
+        tabla = read_money_sql(f"SELECT {', '.join(EXPOSICION_COLUMNS)} FROM cliente_exposicion", conn)
+        
+        comparado = vivo.merge(tabla, on='nit', how='outer', suffixes=('_vivo', '_tabla'), indicator=True)
+        diferencias = []
+        
+        for columna in EXPOSICION_COLUMNS[1:]:
+            vivo_col = comparado[f'{columna}_vivo']
+            tabla_col = comparado[f'{columna}_tabla']
+            if pd.api.types.is_numeric_dtype(vivo_col) and pd.api.types.is_numeric_dtype(tabla_col):
+                distinto = (vivo_col - tabla_col).abs() > tolerancia
+            else:
+                distinto = vivo_col != tabla_col
+            distinto |= comparado['_merge'] != 'both'
+            
+            for _, fila in comparado[distinto].iterrows():
+                diferencias.append({
+                    'nit': fila['nit'],
+                    'columna': columna,
+                    'valor_vivo': fila[f'{columna}_vivo'],
+                    'valor_tabla': fila[f'{columna}_tabla']
+                })
+        
+        if reparar and diferencias:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                reconstruir_exposicion(conn.cursor())
+                # La reparación cambia filas sin pasar por el journal
+                nueva_epoca_datos(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    return pd.DataFrame(diferencias, columns=['nit', 'columna', 'valor_vivo', 'valor_tabla'])
+
+# Esquema con montos INTEGER (migración 3)
+MONEY_SCHEMA = {
+    'clientes': """
+    CREATE TABLE {tabla} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nit TEXT UNIQUE NOT NULL,
+        nombre TEXT NOT NULL,
+        total_cartera INTEGER NOT NULL DEFAULT 0,
+        cupo_sugerido INTEGER NOT NULL DEFAULT 0,
+        excluir_calculo INTEGER DEFAULT 0,
+        observaciones TEXT,
+        fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    'ocs': """
+    CREATE TABLE {tabla} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero TEXT UNIQUE NOT NULL,
+        cliente_nit TEXT NOT NULL,
+        valor_total INTEGER NOT NULL,
+        fecha DATE NOT NULL,
+        descripcion TEXT,
+        estado TEXT DEFAULT 'PENDIENTE',
+        fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        valor_autorizado INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (cliente_nit) REFERENCES clientes (nit)
+    )
+    """,
+    'autorizaciones_parciales': """
+    CREATE TABLE {tabla} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        oc_numero TEXT NOT NULL,
+        valor_autorizado INTEGER NOT NULL,
+        valor_pendiente INTEGER NOT NULL,
+        comentario TEXT,
+        fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (oc_numero) REFERENCES ocs (numero)
+    )
+    """,
+    'cliente_exposicion': """
+    CREATE TABLE {tabla} (
+        nit TEXT PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        cupo_sugerido INTEGER NOT NULL DEFAULT 0,
+        saldo_actual INTEGER NOT NULL DEFAULT 0,
+        excluir_calculo INTEGER NOT NULL DEFAULT 0,
+        total_pendiente INTEGER NOT NULL DEFAULT 0,
+        ocs_pendientes INTEGER NOT NULL DEFAULT 0,
+        total_autorizado INTEGER NOT NULL DEFAULT 0,
+        disponible INTEGER NOT NULL DEFAULT 0,
+        porcentaje_uso REAL NOT NULL DEFAULT 0
+    )
+    """,
+}
+
+def _montos_a_enteros(cursor):
+    """Migración 3: reconstruye las tablas con montos INTEGER exactos"""
+    # Los triggers se recrean al final sobre las tablas nuevas
+    triggers = cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall()
+    for (nombre,) in triggers:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+    
+    for tabla, create_sql in MONEY_SCHEMA.items():
+        columnas = [fila[1] for fila in cursor.execute(f"PRAGMA table_info({tabla})").fetchall()]
+        select = ", ".join(
+            f"CAST(ROUND(COALESCE({c}, 0)) AS INTEGER)" if c in MONEY_COLUMNS else c
+            for c in columnas
+        )
+        
+        cursor.execute(create_sql.format(tabla=f"{tabla}_nueva"))
+        cursor.execute(f"INSERT INTO {tabla}_nueva ({', '.join(columnas)}) SELECT {select} FROM {tabla}")
+        cursor.execute(f"DROP TABLE {tabla}")
+        cursor.execute(f"ALTER TABLE {tabla}_nueva RENAME TO {tabla}")
+    
+    # Los índices se eliminaron junto con las tablas originales
+    for paso in MIGRATIONS[0][2]:
+        cursor.execute(paso)
+    
+    reconstruir_exposicion(cursor)
+    crear_triggers_exposicion(cursor)
+
+# ==================== JOURNAL DE CAMBIOS ====================
+
+# Tablas base cuyos cambios se registran para backups incrementales
+JOURNAL_TABLES = ('clientes', 'ocs', 'autorizaciones_parciales')
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cambios_journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabla TEXT NOT NULL,
+    operacion TEXT NOT NULL CHECK (operacion IN ('I', 'U', 'D')),
+    fila_id INTEGER NOT NULL,
+    datos TEXT,
+    fecha TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+)
+"""
+
+def crear_triggers_journal(cursor):
+    """
+    (Re)crea los triggers del journal con las columnas actuales de cada tabla.
+    Las migraciones que agreguen columnas a JOURNAL_TABLES deben llamarla de nuevo.
+    """
+    for tabla in JOURNAL_TABLES:
+        columnas = [fila[1] for fila in cursor.execute(f"PRAGMA table_info({tabla})").fetchall()]
+        nueva = "json_object(" + ", ".join(f"'{c}', NEW.{c}" for c in columnas) + ")"
+        anterior = "json_object(" + ", ".join(f"'{c}', OLD.{c}" for c in columnas) + ")"
+        
+        eventos = [
+            ('ai', 'INSERT', '', 'I', 'NEW.id', nueva),
+            # Las actualizaciones sin cambios reales (p. ej. reimportar la misma cartera) no se registran
+            ('au', 'UPDATE', f"WHEN {anterior} IS NOT {nueva}", 'U', 'NEW.id', nueva),
+            ('ad', 'DELETE', '', 'D', 'OLD.id', 'NULL'),
+        ]
+        for sufijo, evento, condicion, operacion, fila_id, datos in eventos:
+            nombre = f"trg_journal_{tabla}_{sufijo}"
+            cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+            cursor.execute(f"""
+            CREATE TRIGGER {nombre}
+            AFTER {evento} ON {tabla} {condicion}
+            BEGIN
+                INSERT INTO cambios_journal (tabla, operacion, fila_id, datos)
+                VALUES ('{tabla}', '{operacion}', {fila_id}, {datos});
+            END
+            """)
+
+def _crear_journal(cursor):
+    """Migración 4: journal append-only de cambios por fila"""
+    cursor.execute(JOURNAL_SCHEMA)
+    crear_triggers_journal(cursor)
+
+def aplicar_cambios_journal(cursor, cambios):
+    """
+    Reaplica cambios del journal (tabla, operacion, fila_id, datos JSON) en orden.
+    Las filas se escriben completas, por lo que el resultado no depende de los
+    triggers: quien llama debe desactivarlos y reconstruir la exposición al final.
+    Retorna la cantidad de cambios aplicados.
+    """
+    columnas_tabla = {
+        tabla: {fila[1] for fila in cursor.execute(f"PRAGMA table_info({tabla})").fetchall()}
+        for tabla in JOURNAL_TABLES
+    }
+    
+    aplicados = 0
+    for tabla, operacion, fila_id, datos in cambios:
+        if operacion == 'D':
+            cursor.execute(f"DELETE FROM {tabla} WHERE id = ?", (fila_id,))
+        else:
+            fila = {c: v for c, v in json.loads(datos).items() if c in columnas_tabla[tabla]}
+            columnas = list(fila)
+            actualizar = ", ".join(f"{c} = excluded.{c}" for c in columnas if c != 'id')
+            cursor.execute(
+                f"INSERT INTO {tabla} ({', '.join(columnas)}) "
+                f"VALUES ({', '.join('?' for _ in columnas)}) "
+                f"ON CONFLICT(id) DO UPDATE SET {actualizar}",
+                list(fila.values())
+            )
+        aplicados += 1
+    
+    return aplicados
+
+# ==================== PARÁMETROS Y TAREAS ====================
+
+# Parámetros editables desde la página de configuración (valores por defecto)
+PARAMETROS_DEFAULT = {
+    'backup_auto': '1',
+    'hora_backup': BACKUP_DEFAULT_HOUR,
+    'retencion_backups_dias': str(REPORT_RETENTION_DAYS),
+}
+
+def _crear_parametros_y_tareas(cursor):
+    """Migración 5: parámetros del sistema y registro de tareas de respaldo"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS configuracion (
+        clave TEXT PRIMARY KEY,
+        valor TEXT,
+        fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.executemany(
+        "INSERT OR IGNORE INTO configuracion (clave, valor) VALUES (?, ?)",
+        PARAMETROS_DEFAULT.items()
+    )
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS backup_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL,
+        origen TEXT NOT NULL,
+        inicio TEXT NOT NULL,
+        segundos REAL,
+        tamano INTEGER,
+        archivo TEXT,
+        estado TEXT NOT NULL,
+        detalle TEXT
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_backup_jobs_tipo_inicio ON backup_jobs (tipo, estado, inicio)")
+
+def get_parametro(clave, default=None):
+    """Obtiene un parámetro del sistema"""
+    with pooled_connection() as conn:
+        row = conn.execute("SELECT valor FROM configuracion WHERE clave = ?", (clave,)).fetchone()
+    if row is None:
+        return PARAMETROS_DEFAULT.get(clave, default)
+    return row['valor']
+
+def set_parametro(clave, valor):
+    """Guarda un parámetro del sistema"""
+    with pooled_connection() as conn:
+        conn.execute("""
+        INSERT INTO configuracion (clave, valor) VALUES (?, ?)
+        ON CONFLICT(clave) DO UPDATE SET
+            valor = excluded.valor,
+            fecha_actualizacion = CURRENT_TIMESTAMP
+        """, (clave, str(valor)))
+        conn.commit()
+
+def registrar_backup_job(tipo, origen, inicio, segundos, estado, tamano=None, archivo=None, detalle=None):
+    """Registra la ejecución de una tarea de respaldo (no invalida la caché)"""
+    with pooled_connection(invalidar=False) as conn:
+        conn.execute("""
+        INSERT INTO backup_jobs (tipo, origen, inicio, segundos, tamano, archivo, estado, detalle)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (tipo, origen, inicio, segundos, tamano, archivo, estado, detalle))
+        conn.commit()
+
+def get_ultimo_backup_job(tipo, origen=None):
+    """Fecha de inicio de la última ejecución exitosa de una tarea"""
+    query = "SELECT MAX(inicio) FROM backup_jobs WHERE tipo = ? AND estado = 'OK'"
+    params = [tipo]
+    if origen:
+        query += " AND origen = ?"
+        params.append(origen)
     
-    backup_file = f"backup/finanzas_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-    shutil.copy2(DB_PATH, backup_file)
-    return backup_file
+    with pooled_connection() as conn:
+        return conn.execute(query, params).fetchone()[0]
+
+def get_backup_jobs(limite=20):
+    """Últimas tareas de respaldo ejecutadas"""
+    query = """
+    SELECT inicio, tipo, origen, estado, segundos, tamano, archivo, detalle
+    FROM backup_jobs
+    ORDER BY id DESC
+    LIMIT ?
+    """
+    with pooled_connection() as conn:
+        return pd.read_sql_query(query, conn, params=(limite,))
+
+def _columnas_registro_oc(cursor):
+    """Migración 7: tipo, cupo de referencia y usuario de OCs y autorizaciones"""
+    cursor.execute("ALTER TABLE ocs ADD COLUMN tipo TEXT DEFAULT 'SUELTA'")
+    cursor.execute("ALTER TABLE ocs ADD COLUMN cupo_referencia TEXT")
+    cursor.execute("ALTER TABLE ocs ADD COLUMN usuario TEXT")
+    cursor.execute("ALTER TABLE autorizaciones_parciales ADD COLUMN usuario TEXT")
+    # El journal registra las filas completas: sus triggers deben incluir las columnas nuevas
+    crear_triggers_journal(cursor)
+
+def _columna_version_oc(cursor):
+    """Migración 9: versión de cada OC para el control optimista de concurrencia"""
+    cursor.execute("ALTER TABLE ocs ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    crear_triggers_journal(cursor)
+
+# ==================== SECUENCIAS DE OCs ====================
+
+# Los números se asignan como OC-AAAA-NNN con un consecutivo por año
+OC_NUMERO_FORMATO = "OC-{anio}-{secuencia:03d}"
+
+OC_SECUENCIAS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS oc_secuencias (
+    anio INTEGER PRIMARY KEY,
+    ultimo INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+def _numero_en_secuencia(numero_oc):
+    """(año, consecutivo) de un número con el formato de la secuencia, o None"""
+    partes = str(numero_oc).split('-')
+    if len(partes) != 3 or partes[0] != 'OC' or not (partes[1].isdigit() and partes[2].isdigit()):
+        return None
+    return int(partes[1]), int(partes[2])
+
+def reconstruir_secuencias_oc(cursor):
+    """
+    Lleva cada secuencia al mayor consecutivo numérico presente en ocs.
+    Nunca retrocede: los números ya entregados no se vuelven a asignar.
+    """
+    cursor.execute(OC_SECUENCIAS_SCHEMA)
+    # Comparación numérica del consecutivo: OC-2024-1000 va después de OC-2024-999
+    cursor.execute("""
+    INSERT INTO oc_secuencias (anio, ultimo)
+    SELECT CAST(substr(numero, 4, 4) AS INTEGER), MAX(CAST(substr(numero, 9) AS INTEGER))
+    FROM ocs
+    WHERE numero GLOB 'OC-[0-9][0-9][0-9][0-9]-[0-9]*' AND substr(numero, 9) NOT GLOB '*[^0-9]*'
+    GROUP BY 1
+    ON CONFLICT(anio) DO UPDATE SET ultimo = MAX(ultimo, excluded.ultimo)
+    """)
+
+def _reservar_secuencia(conn, cantidad, anio):
+    """
+    Reserva `cantidad` consecutivos del año dentro de la transacción en curso.
+    Quien llama debe haber abierto la transacción con BEGIN IMMEDIATE.
+    """
+    ultimo = conn.execute("""
+    INSERT INTO oc_secuencias (anio, ultimo) VALUES (?, ?)
+    ON CONFLICT(anio) DO UPDATE SET ultimo = ultimo + excluded.ultimo
+    RETURNING ultimo
+    """, (anio, cantidad)).fetchone()[0]
+    return [
+        OC_NUMERO_FORMATO.format(anio=anio, secuencia=secuencia)
+        for secuencia in range(ultimo - cantidad + 1, ultimo + 1)
+    ]
+
+def _avanzar_secuencia(conn, numero_oc):
+    """Evita que la secuencia entregue después un número registrado a mano"""
+    partes = _numero_en_secuencia(numero_oc)
+    if partes is None:
+        return
+    conn.execute("""
+    INSERT INTO oc_secuencias (anio, ultimo) VALUES (?, ?)
+    ON CONFLICT(anio) DO UPDATE SET ultimo = MAX(ultimo, excluded.ultimo)
+    """, partes)
+
+@reintentar_si_ocupada
+def reservar_numeros_oc(cantidad=1, anio=None):
+    """
+    Reserva `cantidad` números de OC consecutivos del año (por defecto el actual).
+    La reserva es atómica entre sesiones y procesos; los números no usados
+    quedan como huecos y no se vuelven a entregar.
+    """
+    if cantidad < 1:
+        raise ValueError("La cantidad a reservar debe ser mayor a 0")
+    anio = anio or datetime.now().year
+    
+    with pooled_connection() as conn:
+        # BEGIN IMMEDIATE toma el bloqueo de escritura antes de leer la secuencia
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            numeros = _reservar_secuencia(conn, cantidad, anio)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    return numeros
+
+# ==================== MIGRACIONES ====================
+
+# Estados de las OCs que aún se pueden autorizar; la condición SQL es la del
+# índice parcial idx_ocs_abiertas_fecha (el planificador exige la misma expresión)
+ESTADOS_OC_ABIERTOS = ('PENDIENTE', 'PARCIAL')
+CONDICION_OC_ABIERTA = "estado IN ('PENDIENTE', 'PARCIAL')"
+
+# Migraciones versionadas con PRAGMA user_version: (versión, descripción, pasos).
+# Cada paso es una sentencia SQL o una función que recibe el cursor.
+MIGRATIONS = [
+    (1, "Índices secundarios de ocs y autorizaciones_parciales", [
+        "CREATE INDEX IF NOT EXISTS idx_ocs_cliente_estado ON ocs (cliente_nit, estado)",
+        "CREATE INDEX IF NOT EXISTS idx_ocs_estado_fecha ON ocs (estado, fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_autorizaciones_oc_fecha ON autorizaciones_parciales (oc_numero, fecha)",
+    ]),
+    (2, "Exposición por cliente mantenida por triggers", [
+        _crear_exposicion,
+    ]),
+    (3, "Montos monetarios como INTEGER", [
+        _montos_a_enteros,
+    ]),
+    (4, "Journal de cambios para backups incrementales", [
+        _crear_journal,
+    ]),
+    (5, "Parámetros del sistema y registro de tareas de respaldo", [
+        _crear_parametros_y_tareas,
+    ]),
+    (6, "Índices de las claves de paginación por cursor", [
+        "CREATE INDEX IF NOT EXISTS idx_exposicion_nombre ON cliente_exposicion (nombre, nit)",
+        "CREATE INDEX IF NOT EXISTS idx_exposicion_uso ON cliente_exposicion (porcentaje_uso, nit)",
+        "CREATE INDEX IF NOT EXISTS idx_exposicion_cupo ON cliente_exposicion (cupo_sugerido, nit)",
+        # El rowid va implícito en el índice: cubre la clave (fecha, id)
+        "CREATE INDEX IF NOT EXISTS idx_ocs_fecha ON ocs (fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_ocs_cliente_fecha ON ocs (cliente_nit, fecha)",
+    ]),
+    (7, "Tipo, cupo de referencia y usuario en OCs y autorizaciones", [
+        _columnas_registro_oc,
+    ]),
+    (8, "Secuencias de números de OC por año", [
+        reconstruir_secuencias_oc,
+    ]),
+    (9, "Versión de OCs para autorizaciones concurrentes", [
+        _columna_version_oc,
+    ]),
+    (10, "Índice parcial de las OCs abiertas por fecha", [
+        f"CREATE INDEX IF NOT EXISTS idx_ocs_abiertas_fecha ON ocs (fecha) WHERE {CONDICION_OC_ABIERTA}",
+    ]),
+]
+
+def get_schema_version(conn):
+    """Obtiene la versión de esquema registrada en la base de datos"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def run_migrations(conn):
+    """Aplica en orden las migraciones pendientes, cada una en su transacción"""
+    aplicadas = []
+    
+    for version, descripcion, pasos in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+        
+        # BEGIN IMMEDIATE serializa procesos que migran a la vez
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            
+            cursor = conn.cursor()
+            for paso in pasos:
+                if callable(paso):
+                    paso(cursor)
+                else:
+                    cursor.execute(paso)
+            
+            cursor.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            aplicadas.append((version, descripcion))
+        except Exception as e:
+            conn.rollback()
+            raise RuntimeError(f"Error en migración {version} ({descripcion}): {e}") from e
+    
+    if aplicadas:
+        invalidar_cache()
+    return aplicadas
+
+def explain_query_plan(query, params=()):
+    """Devuelve el plan de ejecución de una consulta (diagnóstico de índices)"""
+    with pooled_connection() as conn:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    return [row['detail'] for row in rows]
+
+def backup_database():
+    """Crea un respaldo completo en línea de la base de datos (ver modules.backup)"""
+    import os
+    from modules.backup import crear_backup_completo
+    return os.path.join(BACKUP_PATH, crear_backup_completo(BACKUP_PATH)['archivo'])
 
 def restore_database(backup_file):
-    """Restaura la base de datos desde un respaldo"""
-    import shutil
-    shutil.copy2(backup_file, DB_PATH)
-    return True
+    """Restaura la base de datos desde un respaldo validado (ver modules.backup)"""
+    from modules.backup import restaurar_snapshot
+    return restaurar_snapshot(backup_file)
+
+# ==================== PAGINACIÓN POR CURSOR ====================
+
+def _escapar_like(texto):
+    """Escapa los comodines de LIKE en un texto de búsqueda"""
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def codificar_cursor(datos):
+    """Token opaco (base64 de JSON) con la clave de la última fila entregada"""
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(',', ':')).encode()).decode()
+
+def decodificar_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError as e:
+        raise ValueError("Cursor de paginación inválido") from e
 
+def _condicion_cursor(cursor, orden, descendente, columnas):
+    """
+    Condición keyset con row values: (orden, desempate) > (?, ?).
+    SQLite la resuelve con el índice de la clave sin recorrer las filas anteriores.
+    """
+    datos = decodificar_cursor(cursor)
+    if datos.get('o') != orden or datos.get('d') != descendente:
+        raise ValueError("El cursor no corresponde al orden solicitado")
+    
+    operador = "<" if descendente else ">"
+    marcadores = ", ".join("?" for _ in columnas)
+    return f"({', '.join(columnas)}) {operador} ({marcadores})", list(datos['k'])
+
+def _cortar_pagina(pagina, limite, orden, descendente, columnas):
+    """Descarta la fila extra leída y arma el cursor de la página siguiente"""
+    if len(pagina) <= limite:
+        return pagina, None
+    
+    pagina = pagina.iloc[:limite]
+    ultima = pagina.iloc[-1]
+    # Los escalares numpy no son serializables a JSON
+    clave = [ultima[c].item() if isinstance(ultima[c], np.generic) else ultima[c] for c in columnas]
+    return pagina, codificar_cursor({'o': orden, 'd': descendente, 'k': clave})
+
+@cached_query
 def get_client_summary():
     """Obtiene resumen de clientes para dashboard"""
-    conn = get_db_connection()
-    
     query = """
     SELECT 
         COUNT(*) as total_clientes,
         SUM(CASE WHEN excluir_calculo = 0 THEN 1 ELSE 0 END) as clientes_incluidos,
         SUM(CASE WHEN excluir_calculo = 1 THEN 1 ELSE 0 END) as clientes_excluidos,
         SUM(cupo_sugerido) as cupo_total,
-        SUM(total_cartera) as cartera_total,
-        SUM(CASE WHEN excluir_calculo = 0 THEN cupo_sugerido - total_cartera ELSE 0 END) as disponible_total
-    FROM clientes
+        SUM(saldo_actual) as cartera_total,
+        SUM(CASE WHEN excluir_calculo = 0 THEN disponible ELSE 0 END) as disponible_total
+    FROM cliente_exposicion
     """
     
-    result = pd.read_sql(query, conn)
-    conn.close()
-    return result.iloc[0].to_dict()
+    with pooled_connection() as conn:
+        result = read_money_sql(query, conn)
+    return result.to_dict('records')[0]
 
+@cached_query
 def get_ocs_summary():
     """Obtiene resumen de OCs para dashboard"""
-    conn = get_db_connection()
-    
     query = """
     SELECT 
         COUNT(*) as total_ocs,
@@ -161,6 +1340,640 @@ def get_ocs_summary():
     FROM ocs
     """
     
-    result = pd.read_sql(query, conn)
-    conn.close()
-    return result.iloc[0].to_dict()
+    with pooled_connection() as conn:
+        result = read_money_sql(query, conn)
+    return result.to_dict('records')[0]
+
+OCS_SELECT = """
+SELECT 
+    o.id,
+    o.numero as numero_oc,
+    o.cliente_nit,
+    c.nombre as cliente_nombre,
+    o.valor_total,
+    o.valor_autorizado,
+    o.valor_total - o.valor_autorizado as valor_pendiente,
+    o.estado,
+    o.fecha,
+    o.descripcion,
+    o.fecha_creacion as fecha_registro,
+    o.version
+FROM ocs o
+LEFT JOIN clientes c ON c.nit = o.cliente_nit
+"""
+
+def _filtros_ocs(cliente_nit=None, estado=None, busqueda=None):
+    """
+    Condiciones WHERE de los listados de OCs (cliente_nit y estado indexados).
+    `estado` puede ser un estado o ESTADOS_OC_ABIERTOS.
+    """
+    conditions = []
+    params = []
+    if cliente_nit:
+        conditions.append("o.cliente_nit = ?")
+        params.append(cliente_nit)
+    if estado == ESTADOS_OC_ABIERTOS:
+        conditions.append(f"o.{CONDICION_OC_ABIERTA}")
+    elif estado:
+        conditions.append("o.estado = ?")
+        params.append(estado)
+    if busqueda:
+        conditions.append("o.numero LIKE ? ESCAPE '\\'")
+        params.append(f"%{_escapar_like(busqueda)}%")
+    return conditions, params
+
+def consulta_ocs(cliente_nit=None, estado=None, busqueda=None):
+    """SQL y parámetros del listado completo de OCs (get_ocs / iterar_ocs)"""
+    conditions, params = _filtros_ocs(cliente_nit, estado, busqueda)
+    
+    query = OCS_SELECT
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY o.fecha DESC"
+    return query, params
+
+@cached_query
+def get_ocs(cliente_nit=None, estado=None, busqueda=None):
+    """Obtiene las OCs con su valor autorizado y pendiente"""
+    query, params = consulta_ocs(cliente_nit, estado, busqueda)
+    
+    with pooled_connection() as conn:
+        return read_money_sql(query, conn, params=params)
+
+def get_ocs_abiertas(cliente_nit=None):
+    """OCs pendientes o parciales (las que se pueden autorizar), leídas por su índice parcial"""
+    return get_ocs(cliente_nit=cliente_nit, estado=ESTADOS_OC_ABIERTOS)
+
+def iterar_ocs(cliente_nit=None, estado=None, busqueda=None, chunk_size=EXPORT_CHUNK_SIZE, conn=None):
+    """
+    Recorre las OCs de get_ocs en bloques de `chunk_size` filas leídos del
+    cursor, sin materializar el resultado completo (exportaciones grandes).
+    Con `conn` lee dentro de la transacción de lectura de quien llama.
+    """
+    if conn is None:
+        with pooled_connection() as conn:
+            yield from iterar_ocs(cliente_nit, estado, busqueda, chunk_size, conn)
+        return
+    
+    query, params = consulta_ocs(cliente_nit, estado, busqueda)
+    for bloque in pd.read_sql_query(query, conn, params=params, chunksize=chunk_size):
+        yield decode_money(bloque)
+
+@cached_query
+def get_ocs_page(cliente_nit=None, estado=None, busqueda=None, limite=50, cursor=None, descendente=True):
+    """
+    Una página de OCs ordenadas por (fecha, id) con paginación por cursor.
+    Retorna (DataFrame, cursor de la página siguiente o None)
+    """
+    conditions, params = _filtros_ocs(cliente_nit, estado, busqueda)
+    if cursor:
+        condicion, valores = _condicion_cursor(cursor, 'fecha', descendente, ('o.fecha', 'o.id'))
+        conditions.append(condicion)
+        params.extend(valores)
+    
+    direccion = "DESC" if descendente else "ASC"
+    query = OCS_SELECT
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY o.fecha {direccion}, o.id {direccion} LIMIT ?"
+    
+    with pooled_connection() as conn:
+        pagina = read_money_sql(query, conn, params=params + [limite + 1])
+    return _cortar_pagina(pagina, limite, 'fecha', descendente, ('fecha', 'id'))
+
+@cached_query
+def get_ocs_resumen(cliente_nit=None, estado=None, busqueda=None):
+    """Totales de las OCs que cumplen los filtros (sin traer las filas)"""
+    conditions, params = _filtros_ocs(cliente_nit, estado, busqueda)
+    query = """
+    SELECT 
+        COUNT(*) as total_ocs,
+        COALESCE(SUM(o.valor_total), 0) as valor_total,
+        COALESCE(SUM(o.valor_autorizado), 0) as valor_autorizado,
+        COALESCE(SUM(o.valor_total - o.valor_autorizado), 0) as valor_pendiente
+    FROM ocs o
+    """
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    
+    with pooled_connection() as conn:
+        return read_money_sql(query, conn, params=params).to_dict('records')[0]
+
+@cached_query
+def get_autorizaciones_oc(oc_numero):
+    """Obtiene el historial de autorizaciones de una OC"""
+    query = """
+    SELECT id, oc_numero, valor_autorizado, valor_pendiente, comentario, fecha
+    FROM autorizaciones_parciales
+    WHERE oc_numero = ?
+    ORDER BY fecha
+    """
+    
+    with pooled_connection() as conn:
+        return read_money_sql(query, conn, params=(oc_numero,))
+
+# Estado del cliente según su porcentaje de uso
+ESTADO_CLIENTE_SQL = """
+CASE
+    WHEN porcentaje_uso >= 100 THEN 'SOBREPASADO'
+    WHEN porcentaje_uso >= 90 THEN 'ALERTA'
+    ELSE 'NORMAL'
+END
+"""
+
+# Rangos de porcentaje_uso de cada estado (consistentes con ESTADO_CLIENTE_SQL)
+RANGOS_ESTADO_CLIENTE = {
+    'NORMAL': (None, 90),
+    'ALERTA': (90, 100),
+    'SOBREPASADO': (100, None),
+}
+
+# Columnas por las que se puede paginar clientes; el NIT desempata
+ORDEN_CLIENTES = ('nombre', 'porcentaje_uso', 'cupo_sugerido')
+
+def _filtros_clientes(busqueda=None, estado=None):
+    """Condiciones WHERE de los listados de clientes"""
+    conditions = []
+    params = []
+    if busqueda:
+        conditions.append("(nombre LIKE ? ESCAPE '\\' OR nit LIKE ? ESCAPE '\\')")
+        patron = f"%{_escapar_like(busqueda)}%"
+        params.extend([patron, patron])
+    if estado:
+        minimo, maximo = RANGOS_ESTADO_CLIENTE[estado]
+        if minimo is not None:
+            conditions.append("porcentaje_uso >= ?")
+            params.append(minimo)
+        if maximo is not None:
+            conditions.append("porcentaje_uso < ?")
+            params.append(maximo)
+    return conditions, params
+
+def consulta_clientes(busqueda=None, estado=None):
+    """SQL y parámetros del listado completo de clientes (get_clientes)"""
+    conditions, params = _filtros_clientes(busqueda, estado)
+    query = f"""
+    SELECT 
+        {', '.join(EXPOSICION_COLUMNS)},
+        {ESTADO_CLIENTE_SQL} as estado
+    FROM cliente_exposicion
+    """
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY nombre"
+    return query, params
+
+@cached_query
+def get_clientes(busqueda=None, estado=None):
+    """Obtiene los clientes con su cupo, uso y disponible"""
+    query, params = consulta_clientes(busqueda, estado)
+    
+    with pooled_connection() as conn:
+        return read_money_sql(query, conn, params=params)
+
+def consulta_clientes_page(orden='nombre', descendente=False, limite=25, cursor=None, busqueda=None, estado=None):
+    """SQL y parámetros de una página de clientes (get_clientes_page)"""
+    if orden not in ORDEN_CLIENTES:
+        raise ValueError(f"Orden no soportado: {orden}")
+    
+    conditions, params = _filtros_clientes(busqueda, estado)
+    if cursor:
+        condicion, valores = _condicion_cursor(cursor, orden, descendente, (orden, 'nit'))
+        conditions.append(condicion)
+        params.extend(valores)
+    
+    direccion = "DESC" if descendente else "ASC"
+    query = f"""
+    SELECT 
+        {', '.join(EXPOSICION_COLUMNS)},
+        {ESTADO_CLIENTE_SQL} as estado
+    FROM cliente_exposicion
+    """
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {orden} {direccion}, nit {direccion} LIMIT ?"
+    return query, params + [limite + 1]
+
+@cached_query
+def get_clientes_page(orden='nombre', descendente=False, limite=25, cursor=None, busqueda=None, estado=None):
+    """
+    Una página de clientes ordenada por `orden` con paginación por cursor.
+    Solo se leen las filas visibles a partir de la clave de la página anterior.
+    Retorna (DataFrame, cursor de la página siguiente o None)
+    """
+    query, params = consulta_clientes_page(orden, descendente, limite, cursor, busqueda, estado)
+    
+    with pooled_connection() as conn:
+        pagina = read_money_sql(query, conn, params=params)
+    return _cortar_pagina(pagina, limite, orden, descendente, (orden, 'nit'))
+
+@cached_query
+def get_clientes_resumen(busqueda=None, estado=None):
+    """Totales de los clientes que cumplen los filtros (sin traer las filas)"""
+    conditions, params = _filtros_clientes(busqueda, estado)
+    query = """
+    SELECT 
+        COUNT(*) as total_clientes,
+        COALESCE(SUM(cupo_sugerido), 0) as cupo_total,
+        COALESCE(SUM(saldo_actual), 0) as saldo_actual,
+        COALESCE(SUM(disponible), 0) as disponible_total,
+        COALESCE(AVG(porcentaje_uso), 0) as porcentaje_promedio
+    FROM cliente_exposicion
+    """
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    
+    with pooled_connection() as conn:
+        return read_money_sql(query, conn, params=params).to_dict('records')[0]
+
+@cached_query
+def get_cliente_exposicion(nit):
+    """
+    Exposición de un solo cliente por su NIT (lectura por clave primaria).
+    Incluye el total de OCs pendientes y el disponible que queda al descontarlas.
+    Retorna un diccionario o None si el cliente no existe.
+    """
+    query = f"""
+    SELECT 
+        {', '.join(EXPOSICION_COLUMNS)},
+        {ESTADO_CLIENTE_SQL} as estado
+    FROM cliente_exposicion
+    WHERE nit = ?
+    """
+    with pooled_connection() as conn:
+        fila = conn.execute(query, (nit,)).fetchone()
+    
+    if fila is None:
+        return None
+    
+    cliente = {
+        columna: money_to_int(fila[columna] or 0) if columna in MONEY_COLUMNS else fila[columna]
+        for columna in fila.keys()
+    }
+    # Lo pendiente de autorizar ya está comprometido aunque no consuma cupo todavía
+    cliente['disponible_comprometido'] = cliente['disponible'] - cliente['total_pendiente']
+    return cliente
+
+@cached_query
+def get_clientes_opciones():
+    """NIT y nombre de todos los clientes, para selectores (sin agregados)"""
+    with pooled_connection() as conn:
+        return pd.read_sql("SELECT nit, nombre FROM cliente_exposicion ORDER BY nombre", conn)
+
+@cached_query
+def get_disponibles_con_ocs_abiertas():
+    """
+    Disponible y exclusión del cálculo de los clientes con OCs abiertas
+    (optimizador de autorizaciones); las OCs se ubican por su índice parcial
+    """
+    query = f"""
+    SELECT nit, disponible, excluir_calculo
+    FROM cliente_exposicion
+    WHERE nit IN (SELECT cliente_nit FROM ocs WHERE {CONDICION_OC_ABIERTA})
+    """
+    with pooled_connection() as conn:
+        return read_money_sql(query, conn)
+
+@cached_query
+def get_estadisticas_por_cliente():
+    """Obtiene los indicadores de exposición de cada cliente"""
+    # cliente_exposicion ya mantiene los agregados: una fila por cliente
+    return get_clientes()
+
+ESTADISTICAS_GENERALES_QUERY = f"""
+SELECT 
+    COUNT(*) as total_clientes,
+    COALESCE(SUM(CASE WHEN excluir_calculo = 0 THEN cupo_sugerido ELSE 0 END), 0) as total_cupo,
+    COALESCE(SUM(CASE WHEN excluir_calculo = 0 THEN saldo_actual + total_autorizado ELSE 0 END), 0) as total_en_uso,
+    COALESCE(SUM(CASE WHEN excluir_calculo = 0 THEN disponible ELSE 0 END), 0) as total_disponible,
+    COALESCE(SUM(ocs_pendientes), 0) as cantidad_ocs_pendientes,
+    COALESCE(SUM(total_pendiente), 0) as total_ocs_pendientes,
+    COALESCE(AVG(porcentaje_uso), 0) as porcentaje_promedio,
+    COALESCE(SUM(CASE WHEN estado = 'NORMAL' THEN 1 ELSE 0 END), 0) as clientes_normal,
+    COALESCE(SUM(CASE WHEN estado = 'ALERTA' THEN 1 ELSE 0 END), 0) as clientes_alerta,
+    COALESCE(SUM(CASE WHEN estado = 'SOBREPASADO' THEN 1 ELSE 0 END), 0) as clientes_sobrepasados
+FROM (
+    SELECT *, {ESTADO_CLIENTE_SQL} as estado
+    FROM cliente_exposicion
+)
+"""
+
+@cached_query
+def get_estadisticas_generales():
+    """Obtiene los totales del sistema para dashboard y reportes"""
+    with pooled_connection() as conn:
+        result = read_money_sql(ESTADISTICAS_GENERALES_QUERY, conn)
+    return result.to_dict('records')[0]
+
+# ==================== ESCRITURAS ====================
+# Las escrituras pasan por pooled_connection, que invalida la caché de
+# consultas al devolver una conexión con cambios.
+
+# Reporte por OC de autorizar_ocs_batch
+AUTORIZACION_LOTE_COLUMNS = [
+    'oc_id', 'oc_numero', 'cliente_nit', 'valor_autorizado', 'valor_pendiente', 'resultado', 'detalle'
+]
+
+@reintentar_si_ocupada
+def crear_oc(cliente_nit, numero_oc, valor_total, tipo='SUELTA', cupo_referencia=None,
+             comentarios=None, usuario=None, fecha=None):
+    """
+    Registra una OC pendiente para un cliente y retorna (id, número).
+    Sin `numero_oc` se asigna el siguiente de la secuencia del año de la OC.
+    """
+    valor_total = money_to_int(valor_total)
+    if valor_total <= 0:
+        raise ValueError("El valor total debe ser mayor a 0")
+    
+    with pooled_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM clientes WHERE nit = ?", (cliente_nit,)).fetchone() is None:
+                raise ValueError(f"No existe el cliente con NIT {cliente_nit}")
+            
+            fecha = fecha or datetime.now().strftime('%Y-%m-%d')
+            if numero_oc:
+                _avanzar_secuencia(conn, numero_oc)
+            else:
+                numero_oc = _reservar_secuencia(conn, 1, int(str(fecha)[:4]))[0]
+            
+            cursor = conn.execute("""
+            INSERT INTO ocs (numero, cliente_nit, valor_total, fecha, descripcion, estado,
+                             tipo, cupo_referencia, usuario)
+            VALUES (?, ?, ?, ?, ?, 'PENDIENTE', ?, ?, ?)
+            """, (
+                numero_oc, cliente_nit, valor_total, fecha,
+                comentarios or None, tipo, cupo_referencia or None, usuario
+            ))
+            conn.commit()
+            return cursor.lastrowid, numero_oc
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            raise ValueError(f"Ya existe una OC con el número {numero_oc}") from e
+        except Exception:
+            conn.rollback()
+            raise
+
+@reintentar_si_ocupada
+def _crear_bloque_ocs(bloque, usuario=None):
+    """
+    Inserta un bloque de OCs en su propia transacción: los números faltantes se
+    reservan y los explícitos avanzan la secuencia dentro de ella, así un
+    reintento completo no deja huecos ni duplicados.
+    Retorna las OCs insertadas (las de número ya existente se omiten).
+    """
+    numeros = bloque['numero'].fillna('').astype(str).to_numpy(dtype=object)
+    anios = bloque['fecha'].astype(str).str[:4].astype(int).to_numpy()
+    sin_numero = numeros == ''
+    
+    with pooled_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Un solo avance por año con el mayor consecutivo explícito, antes de
+            # reservar: los números automáticos no chocan con los del bloque
+            maximos = {}
+            for numero in numeros[~sin_numero]:
+                partes = _numero_en_secuencia(numero)
+                if partes is not None and partes[1] > maximos.get(partes[0], 0):
+                    maximos[partes[0]] = partes[1]
+            for anio, secuencia in maximos.items():
+                _avanzar_secuencia(conn, OC_NUMERO_FORMATO.format(anio=anio, secuencia=secuencia))
+            
+            for anio in np.unique(anios[sin_numero]).tolist():
+                posiciones = np.flatnonzero(sin_numero & (anios == anio))
+                numeros[posiciones] = _reservar_secuencia(conn, len(posiciones), anio)
+            
+            cursor = conn.executemany("""
+            INSERT INTO ocs (numero, cliente_nit, valor_total, fecha, descripcion, estado,
+                             tipo, cupo_referencia, usuario)
+            VALUES (?, ?, ?, ?, ?, 'PENDIENTE', ?, ?, ?)
+            ON CONFLICT(numero) DO NOTHING
+            """, zip(
+                numeros.tolist(),
+                bloque['cliente_nit'].tolist(),
+                bloque['valor_total'].astype('int64').tolist(),
+                bloque['fecha'].tolist(),
+                [d or None for d in bloque['descripcion'].fillna('').tolist()],
+                bloque['tipo'].tolist(),
+                [c or None for c in bloque['cupo_referencia'].fillna('').tolist()],
+                [usuario] * len(bloque),
+            ))
+            insertadas = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    return insertadas
+
+def crear_ocs_lote(ocs, usuario=None, chunk_size=IMPORT_OCS_CHUNK_SIZE, progreso=None):
+    """
+    Registra muchas OCs pendientes ya validadas (columnas cliente_nit, numero,
+    valor_total, fecha, tipo, cupo_referencia y descripcion; numero vacío =
+    siguiente de la secuencia) en transacciones de `chunk_size` filas.
+    El lock de escritura se libera entre bloques.
+    Retorna (insertadas, omitidas por número ya existente).
+    """
+    insertadas = 0
+    for inicio in range(0, len(ocs), chunk_size):
+        insertadas += _crear_bloque_ocs(ocs.iloc[inicio:inicio + chunk_size], usuario)
+        if progreso:
+            progreso(min(inicio + chunk_size, len(ocs)))
+    
+    return insertadas, len(ocs) - insertadas
+
+def _validar_autorizacion(oc, valor, pendiente, disponible, version_esperada=None, permitir_sobrecupo=False):
+    """
+    Reglas de una autorización sobre los valores leídos en la transacción.
+    `disponible` es None cuando el cliente no tiene tope de cupo.
+    """
+    if version_esperada is not None and oc['version'] != version_esperada:
+        raise ConflictoConcurrencia(
+            f"La OC {oc['numero']} fue modificada por otra sesión. Recargue los datos e intente de nuevo"
+        )
+    if oc['estado'] not in ('PENDIENTE', 'PARCIAL'):
+        raise ValueError(f"La OC {oc['numero']} está {oc['estado']} y no admite autorizaciones")
+    if valor <= 0:
+        raise ValueError("El valor a autorizar debe ser mayor a 0")
+    if valor > pendiente:
+        raise ValueError(f"El valor a autorizar supera el pendiente de la OC {oc['numero']}")
+    if not permitir_sobrecupo and disponible is not None and valor > disponible:
+        raise ValueError(
+            f"El valor a autorizar supera el cupo disponible del cliente de la OC {oc['numero']} "
+            f"({max(disponible, 0):,})"
+        )
+
+def _disponible_clientes(conn, nits):
+    """Disponible por NIT de los clientes con tope de cupo (los excluidos del cálculo no tienen)"""
+    filas = conn.execute("""
+    SELECT nit, disponible FROM cliente_exposicion
+    WHERE nit IN (SELECT value FROM json_each(?)) AND NOT excluir_calculo
+    """, (json.dumps(list(nits)),)).fetchall()
+    return {fila['nit']: fila['disponible'] for fila in filas}
+
+def _autorizar_en_transaccion(conn, oc_id, valor, comentario=None, usuario=None,
+                              version_esperada=None, permitir_sobrecupo=False):
+    """
+    Valida y registra una autorización dentro de la transacción en curso.
+    Quien llama debe haber abierto la transacción con BEGIN IMMEDIATE: el
+    pendiente y el cupo leídos aquí no cambian hasta el commit.
+    """
+    oc = conn.execute(
+        "SELECT numero, cliente_nit, valor_total, valor_autorizado, estado, version FROM ocs WHERE id = ?",
+        (oc_id,)
+    ).fetchone()
+    if oc is None:
+        raise ValueError(f"No existe la OC {oc_id}")
+    
+    pendiente = oc['valor_total'] - oc['valor_autorizado']
+    disponible = _disponible_clientes(conn, [oc['cliente_nit']]).get(oc['cliente_nit'])
+    _validar_autorizacion(oc, valor, pendiente, disponible, version_esperada, permitir_sobrecupo)
+    
+    restante = pendiente - valor
+    conn.execute("""
+    INSERT INTO autorizaciones_parciales (oc_numero, valor_autorizado, valor_pendiente, comentario, usuario)
+    VALUES (?, ?, ?, ?, ?)
+    """, (oc['numero'], valor, restante, comentario or None, usuario))
+    cursor = conn.execute(
+        "UPDATE ocs SET estado = ?, version = version + 1 WHERE id = ? AND version = ?",
+        ('AUTORIZADA' if restante == 0 else 'PARCIAL', oc_id, oc['version'])
+    )
+    if cursor.rowcount == 0:
+        raise ConflictoConcurrencia(f"La OC {oc['numero']} fue modificada durante la autorización")
+    
+    return {
+        'oc_numero': oc['numero'],
+        'valor_autorizado': valor,
+        'valor_pendiente': restante,
+        'version': oc['version'] + 1,
+    }
+
+@reintentar_si_ocupada
+def autorizar_oc(oc_id, valor_autorizado, comentario=None, usuario=None,
+                 version_esperada=None, permitir_sobrecupo=False):
+    """
+    Autoriza total o parcialmente el valor pendiente de una OC.
+    Valida pendiente, cupo disponible del cliente y versión de la OC (si se
+    indica la leída por el usuario) en la misma transacción que la escritura.
+    Retorna el número de la OC, los valores autorizado y pendiente y la nueva versión.
+    """
+    valor = money_to_int(valor_autorizado)
+    if valor <= 0:
+        raise ValueError("El valor a autorizar debe ser mayor a 0")
+    
+    with pooled_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = _autorizar_en_transaccion(
+                conn, oc_id, valor, comentario, usuario, version_esperada, permitir_sobrecupo
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    return resultado
+
+@reintentar_si_ocupada
+def autorizar_ocs_batch(autorizaciones, comentario=None, usuario=None, permitir_sobrecupo=False):
+    """
+    Autoriza varias OCs en una sola transacción.
+    `autorizaciones` es una lista de (oc_id, valor) o (oc_id, valor, version_esperada);
+    valor None autoriza todo el pendiente. Las OCs se evalúan en el orden dado
+    descontando lo ya aprobado del cupo de cada cliente: las que no cumplen se
+    rechazan sin afectar a las demás.
+    Retorna un DataFrame con el resultado por OC.
+    """
+    solicitudes = [tuple(a) + (None,) * (3 - len(a)) for a in autorizaciones]
+    if not solicitudes:
+        return pd.DataFrame(columns=AUTORIZACION_LOTE_COLUMNS)
+    
+    with pooled_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ocs = {
+                fila['id']: dict(fila) for fila in conn.execute("""
+                SELECT id, numero, cliente_nit, valor_total, valor_autorizado, estado, version
+                FROM ocs WHERE id IN (SELECT value FROM json_each(?))
+                """, (json.dumps([int(oc_id) for oc_id, _, _ in solicitudes]),))
+            }
+            # Saldos de la pasada: pendiente por OC y disponible por cliente
+            pendientes = {oc_id: oc['valor_total'] - oc['valor_autorizado'] for oc_id, oc in ocs.items()}
+            disponibles = _disponible_clientes(conn, {oc['cliente_nit'] for oc in ocs.values()})
+            
+            reporte, inserciones, actualizaciones = [], [], []
+            for oc_id, valor, version_esperada in solicitudes:
+                oc = ocs.get(int(oc_id))
+                resultado = {
+                    'oc_id': oc_id, 'oc_numero': oc['numero'] if oc else None,
+                    'cliente_nit': oc['cliente_nit'] if oc else None,
+                    'valor_autorizado': 0, 'valor_pendiente': pendientes.get(int(oc_id)),
+                    'resultado': 'RECHAZADA', 'detalle': None,
+                }
+                reporte.append(resultado)
+                if oc is None:
+                    resultado['detalle'] = f"No existe la OC {oc_id}"
+                    continue
+                
+                pendiente = pendientes[oc['id']]
+                valor = pendiente if valor is None else money_to_int(valor)
+                disponible = disponibles.get(oc['cliente_nit'])
+                try:
+                    _validar_autorizacion(oc, valor, pendiente, disponible, version_esperada, permitir_sobrecupo)
+                except ValueError as e:
+                    resultado['detalle'] = str(e)
+                    continue
+                
+                restante = pendiente - valor
+                estado = 'AUTORIZADA' if restante == 0 else 'PARCIAL'
+                inserciones.append((oc['numero'], valor, restante, comentario or None, usuario))
+                actualizaciones.append((estado, oc['id'], oc['version']))
+                
+                pendientes[oc['id']] = restante
+                oc['estado'] = estado
+                oc['version'] += 1
+                if disponible is not None:
+                    disponibles[oc['cliente_nit']] = disponible - valor
+                resultado.update(valor_autorizado=valor, valor_pendiente=restante, resultado=estado)
+            
+            conn.executemany("""
+            INSERT INTO autorizaciones_parciales (oc_numero, valor_autorizado, valor_pendiente, comentario, usuario)
+            VALUES (?, ?, ?, ?, ?)
+            """, inserciones)
+            cursor = conn.executemany(
+                "UPDATE ocs SET estado = ?, version = version + 1 WHERE id = ? AND version = ?",
+                actualizaciones
+            )
+            if cursor.rowcount != len(actualizaciones):
+                raise ConflictoConcurrencia("Las OCs del lote fueron modificadas durante la autorización")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    # Las OCs inexistentes no tienen pendiente: entero con nulos en lugar de float
+    return pd.DataFrame(reporte, columns=AUTORIZACION_LOTE_COLUMNS).astype({'valor_pendiente': 'Int64'})
+
+def actualizar_cupo_cliente(nit, cupo_sugerido, observaciones=None):
+    """Actualiza el cupo sugerido de un cliente (y sus observaciones si se indican)"""
+    cupo = money_to_int(cupo_sugerido)
+    if cupo < 0:
+        raise ValueError("El cupo no puede ser negativo")
+    
+    with pooled_connection() as conn:
+        try:
+            cursor = conn.execute("""
+            UPDATE clientes SET
+                cupo_sugerido = ?,
+                observaciones = COALESCE(?, observaciones),
+                fecha_actualizacion = CURRENT_TIMESTAMP
+            WHERE nit = ?
+            """, (cupo, observaciones, nit))
+            if cursor.rowcount == 0:
+                raise ValueError(f"No existe el cliente con NIT {nit}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    return True
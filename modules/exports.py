@@ -0,0 +1,397 @@
+"""
+Cola de exportaciones a Excel en segundo plano
+Un pool de procesos genera los archivos; la sesión solo consulta el progreso y descarga
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+
+from config import (
+    EXPORT_PATH, EXPORT_WORKERS, EXPORT_MAX_JOBS_POR_USUARIO, REPORT_RETENTION_DAYS
+)
+from modules.database import (
+    pooled_connection, version_datos, read_money_sql, consulta_clientes, iterar_ocs,
+    ESTADISTICAS_GENERALES_QUERY
+)
+from modules.utils import export_to_excel, format_currency_series, format_percentage_series
+
+# Exportaciones disponibles: clave -> nombre para la interfaz
+TIPOS_EXPORTACION = {
+    'reporte_completo': "Reporte completo",
+    'clientes': "Datos de clientes",
+    'ocs': "Datos de OCs",
+}
+
+ESTADOS_ACTIVOS = ('EN_COLA', 'EN_PROCESO')
+
+# ==================== HOJAS DE LOS REPORTES ====================
+
+def create_availability_report(clientes_df):
+    """Crea reporte de disponibilidad por cliente"""
+    
+    reporte = clientes_df.copy()
+    reporte = reporte[['nombre', 'nit', 'cupo_sugerido', 'saldo_actual', 'disponible', 'porcentaje_uso', 'estado']]
+    
+    # Ordenar por disponibilidad (ascendente)
+    reporte = reporte.sort_values('disponible')
+    
+    # Agregar columna de riesgo
+    def get_risk_level(porcentaje):
+        if porcentaje >= 100:
+            return "🔴 CRÍTICO"
+        elif porcentaje >= 90:
+            return "🟠 ALTO"
+        elif porcentaje >= 80:
+            return "🟡 MEDIO"
+        else:
+            return "🟢 BAJO"
+    
+    reporte['Nivel de Riesgo'] = reporte['porcentaje_uso'].apply(get_risk_level)
+    
+    # Formatear valores
+    for columna in ['cupo_sugerido', 'saldo_actual', 'disponible']:
+        reporte[columna] = format_currency_series(reporte[columna])
+    reporte['porcentaje_uso'] = format_percentage_series(reporte['porcentaje_uso'])
+    
+    return reporte.rename(columns={
+        'nombre': 'Cliente',
+        'nit': 'NIT',
+        'cupo_sugerido': 'Cupo Asignado',
+        'saldo_actual': 'En Uso',
+        'disponible': 'Disponible',
+        'porcentaje_uso': '% Uso',
+        'estado': 'Estado'
+    })
+
+def _agregar_ocs(ocs_df):
+    """Totales por cliente de un bloque de OCs (sumables entre bloques)"""
+    return ocs_df.groupby('cliente_nombre').agg({
+        'valor_total': 'sum',
+        'valor_autorizado': 'sum',
+        'valor_pendiente': 'sum',
+        'id': 'count'
+    })
+
+def _reporte_analisis_ocs(agregado):
+    """Formatea los totales por cliente como reporte de análisis de OCs"""
+    reporte = agregado.reset_index()
+    
+    # Calcular porcentajes
+    total = reporte['valor_total'].where(reporte['valor_total'] > 0)
+    reporte['% Autorizado'] = (reporte['valor_autorizado'] / total * 100).fillna(0)
+    reporte['% Pendiente'] = (reporte['valor_pendiente'] / total * 100).fillna(0)
+    
+    # Ordenar por valor pendiente descendente
+    reporte = reporte.sort_values('valor_pendiente', ascending=False)
+    
+    # Formatear valores
+    for columna in ['valor_total', 'valor_autorizado', 'valor_pendiente']:
+        reporte[columna] = format_currency_series(reporte[columna])
+    for columna in ['% Autorizado', '% Pendiente']:
+        reporte[columna] = format_percentage_series(reporte[columna])
+    
+    return reporte.rename(columns={
+        'cliente_nombre': 'Cliente',
+        'valor_total': 'Total OCs',
+        'valor_autorizado': 'Autorizado',
+        'valor_pendiente': 'Pendiente',
+        'id': 'Cantidad OCs'
+    })
+
+def create_ocs_analysis_report(ocs_df):
+    """Crea reporte de análisis de OCs"""
+    
+    if ocs_df.empty:
+        return pd.DataFrame()
+    
+    return _reporte_analisis_ocs(_agregar_ocs(ocs_df))
+
+def _ocs_con_analisis(conn):
+    """
+    Hoja de OCs leída del cursor de `conn` por bloques y hoja de análisis calculada
+    con los totales acumulados de esos mismos bloques (se genera al terminar la primera).
+    """
+    parciales = []
+    
+    def ocs():
+        for bloque in iterar_ocs(conn=conn):
+            parciales.append(_agregar_ocs(bloque))
+            yield bloque
+    
+    def analisis():
+        if parciales:
+            yield _reporte_analisis_ocs(pd.concat(parciales).groupby(level=0).sum())
+    
+    return ocs(), analisis()
+
+def _hojas_exportacion(tipo, conn):
+    """
+    Hojas, nombres y total aproximado de filas de una exportación. Todas se leen
+    con `conn` (sin la caché de consultas) para que compartan su snapshot.
+    """
+    # Filas de la hoja de OCs y de su análisis (una por cliente)
+    total_ocs, clientes_con_ocs = conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT cliente_nit) FROM ocs"
+    ).fetchone()
+    
+    query, params = consulta_clientes()
+    clientes_df = read_money_sql(query, conn, params=params)
+    estadisticas = read_money_sql(ESTADISTICAS_GENERALES_QUERY, conn)
+    disponibilidad = create_availability_report(clientes_df)
+    
+    if tipo == 'clientes':
+        hojas = [clientes_df, disponibilidad, estadisticas]
+        nombres = ['Datos Completos', 'Disponibilidad', 'Estadísticas']
+    elif tipo == 'ocs':
+        hojas = list(_ocs_con_analisis(conn))
+        nombres = ['OCs Completas', 'Análisis']
+    elif tipo == 'reporte_completo':
+        hojas = [estadisticas, clientes_df, disponibilidad, *_ocs_con_analisis(conn)]
+        nombres = ['Estadísticas', 'Clientes', 'Disponibilidad', 'OCs', 'Análisis OCs']
+    else:
+        raise ValueError(f"Tipo de exportación desconocido: {tipo}")
+    
+    total = sum(len(h) for h in hojas if isinstance(h, pd.DataFrame))
+    if tipo != 'clientes':
+        total += total_ocs + clientes_con_ocs
+    return hojas, nombres, total
+
+# ==================== PROCESO DE TRABAJO ====================
+
+def _escribir_progreso(ruta, filas, total):
+    """Publica el avance del trabajo (reemplazo atómico: el lector nunca ve un JSON a medias)"""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w') as f:
+        json.dump({'filas': filas, 'total': total}, f)
+    os.replace(temporal, ruta)
+
+def _generar_exportacion(tipo, ruta, temporal, ruta_progreso):
+    """
+    Se ejecuta en un proceso del pool: genera el Excel en `temporal`, lo publica
+    como `ruta` al terminar y reporta el avance en `ruta_progreso`.
+    Retorna las filas escritas, el tamaño del archivo y la versión de los datos.
+    """
+    filas = 0
+    def progreso(escritas):
+        nonlocal filas
+        filas = escritas
+        _escribir_progreso(ruta_progreso, escritas, total)
+    
+    with pooled_connection() as conn:
+        # Una sola transacción de lectura: todas las hojas ven el mismo snapshot,
+        # el de la versión leída primero, aunque otros procesos confirmen cambios
+        conn.execute("BEGIN")
+        try:
+            version = version_datos(conn)
+            hojas, nombres, total = _hojas_exportacion(tipo, conn)
+            _escribir_progreso(ruta_progreso, 0, total)
+            
+            # El archivo solo aparece con su nombre final cuando está completo
+            with open(temporal, 'wb') as destino:
+                export_to_excel(hojas, nombres, destino=destino, progreso=progreso)
+        finally:
+            conn.rollback()
+    os.replace(temporal, ruta)
+    
+    return {'filas': filas, 'tamano': os.path.getsize(ruta), 'version': version}
+
+# ==================== COLA ====================
+
+class ColaExportaciones:
+    """
+    Cola de exportaciones del proceso de Streamlit. Las solicitudes idénticas
+    (mismo tipo sobre la misma versión de datos) comparten un solo trabajo,
+    y cada usuario tiene un tope de trabajos activos.
+    Varios procesos del servidor pueden compartir `directorio`: los archivos en
+    curso de cada uno van en su propio subdirectorio.
+    """
+    
+    def __init__(self, workers=EXPORT_WORKERS, directorio=EXPORT_PATH):
+        self.directorio = directorio
+        self.en_curso = os.path.join(directorio, f".en_curso_{socket.gethostname()}_{os.getpid()}")
+        os.makedirs(directorio, exist_ok=True)
+        # spawn: los procesos no heredan los hilos ni las conexiones del servidor
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+        )
+        self._lock = threading.Lock()
+        self._trabajos = {}
+        self._por_clave = {}
+        self.limpiar()
+    
+    def solicitar(self, tipo, usuario):
+        """
+        Encola una exportación o se une a una idéntica en curso o lista.
+        Retorna (trabajo, reutilizado).
+        """
+        if tipo not in TIPOS_EXPORTACION:
+            raise ValueError(f"Tipo de exportación desconocido: {tipo}")
+        with pooled_connection() as conn:
+            clave = (tipo, version_datos(conn))
+        
+        with self._lock:
+            existente = self._trabajos.get(self._por_clave.get(clave))
+            if existente is not None and existente['estado'] != 'ERROR' and (
+                existente['estado'] != 'LISTA' or os.path.exists(existente['ruta'])
+            ):
+                existente['usuarios'].add(usuario)
+                return existente, True
+            
+            activos = sum(
+                1 for t in self._trabajos.values()
+                if usuario in t['usuarios'] and t['estado'] in ESTADOS_ACTIVOS
+            )
+            if activos >= EXPORT_MAX_JOBS_POR_USUARIO:
+                raise ValueError(
+                    f"Ya tiene {activos} exportaciones en curso. Espere a que terminen para solicitar otra"
+                )
+            
+            trabajo_id = uuid.uuid4().hex[:12]
+            archivo = f"{tipo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{trabajo_id}.xlsx"
+            trabajo = {
+                'id': trabajo_id,
+                'tipo': tipo,
+                'clave': clave,
+                'usuarios': {usuario},
+                'estado': 'EN_COLA',
+                'archivo': archivo,
+                'ruta': os.path.join(self.directorio, archivo),
+                'ruta_parcial': os.path.join(self.en_curso, f"{archivo}.parcial"),
+                'ruta_progreso': os.path.join(self.en_curso, f"{trabajo_id}.progreso"),
+                'solicitado': time.time(),
+                'inicio': None,
+                'fin': None,
+                'filas': 0,
+                'total': None,
+                'tamano': None,
+                'error': None,
+            }
+            self._trabajos[trabajo_id] = trabajo
+            self._por_clave[clave] = trabajo_id
+            
+            # Un proceso inactivo por más de la retención pudo perderlo en la limpieza de otro
+            os.makedirs(self.en_curso, exist_ok=True)
+            futuro = self._executor.submit(
+                _generar_exportacion, tipo, trabajo['ruta'], trabajo['ruta_parcial'], trabajo['ruta_progreso']
+            )
+        
+        futuro.add_done_callback(lambda f: self._finalizar(trabajo_id, f))
+        return trabajo, False
+    
+    def _finalizar(self, trabajo_id, futuro):
+        """Callback del pool: registra el resultado del trabajo"""
+        with self._lock:
+            trabajo = self._trabajos[trabajo_id]
+            trabajo['fin'] = time.time()
+            try:
+                resultado = futuro.result()
+                trabajo.update(estado='LISTA', filas=resultado['filas'], tamano=resultado['tamano'])
+                # El snapshot puede ser posterior a la solicitud: el archivo también sirve a esa versión
+                clave = (trabajo['tipo'], resultado['version'])
+                if self._por_clave.get(clave) not in self._trabajos:
+                    self._por_clave[clave] = trabajo_id
+            except Exception as e:
+                trabajo.update(estado='ERROR', error=str(e))
+            
+            if os.path.exists(trabajo['ruta_progreso']):
+                os.remove(trabajo['ruta_progreso'])
+    
+    def _actualizar_progreso(self, trabajo):
+        """Lee el avance publicado por el proceso de trabajo"""
+        try:
+            with open(trabajo['ruta_progreso']) as f:
+                progreso = json.load(f)
+        except (OSError, ValueError):
+            return
+        
+        if trabajo['estado'] == 'EN_COLA':
+            trabajo['estado'] = 'EN_PROCESO'
+            trabajo['inicio'] = time.time()
+        trabajo['filas'] = progreso['filas']
+        trabajo['total'] = progreso['total']
+    
+    def trabajos_de(self, usuario):
+        """Trabajos del usuario (más recientes primero) con avance y tiempo restante estimado"""
+        with self._lock:
+            trabajos = [t for t in self._trabajos.values() if usuario in t['usuarios']]
+            for trabajo in trabajos:
+                if trabajo['estado'] in ESTADOS_ACTIVOS:
+                    self._actualizar_progreso(trabajo)
+            trabajos = [dict(t, usuarios=set(t['usuarios'])) for t in trabajos]
+        
+        for trabajo in trabajos:
+            trabajo['avance'] = (
+                min(trabajo['filas'] / trabajo['total'], 1.0) if trabajo['total'] else 0.0
+            )
+            trabajo['eta'] = None
+            if trabajo['estado'] == 'EN_PROCESO' and trabajo['filas']:
+                transcurrido = time.time() - trabajo['inicio']
+                trabajo['eta'] = transcurrido * (trabajo['total'] - trabajo['filas']) / trabajo['filas']
+        
+        return sorted(trabajos, key=lambda t: t['solicitado'], reverse=True)
+    
+    def hay_activos(self, usuario):
+        with self._lock:
+            return any(
+                usuario in t['usuarios'] and t['estado'] in ESTADOS_ACTIVOS
+                for t in self._trabajos.values()
+            )
+    
+    def descartar(self, trabajo_id, usuario):
+        """Quita el trabajo de la lista del usuario; el archivo se borra cuando nadie más lo usa"""
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+            if trabajo is None:
+                return
+            trabajo['usuarios'].discard(usuario)
+            if trabajo['usuarios'] or trabajo['estado'] in ESTADOS_ACTIVOS:
+                return
+            
+            del self._trabajos[trabajo_id]
+            for clave in [c for c, t in self._por_clave.items() if t == trabajo_id]:
+                del self._por_clave[clave]
+            if os.path.exists(trabajo['ruta']):
+                os.remove(trabajo['ruta'])
+    
+    def limpiar(self, retencion_dias=REPORT_RETENTION_DAYS):
+        """
+        Elimina los trabajos interrumpidos de este proceso (su subdirectorio en
+        curso) y los archivos vencidos. Los archivos en curso de otros procesos
+        solo se eliminan cuando vencen: pueden seguir escribiéndose.
+        """
+        shutil.rmtree(self.en_curso, ignore_errors=True)
+        os.makedirs(self.en_curso)
+        
+        limite = (datetime.now() - timedelta(days=retencion_dias)).timestamp()
+        for raiz, _, archivos in os.walk(self.directorio, topdown=False):
+            for nombre in archivos:
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    if os.path.getmtime(ruta) < limite:
+                        os.remove(ruta)
+                except FileNotFoundError:
+                    # Otro proceso lo publicó o lo eliminó mientras se recorría
+                    pass
+            # Subdirectorios vacíos y vencidos de procesos que ya no existen
+            if raiz not in (self.directorio, self.en_curso):
+                try:
+                    if not os.listdir(raiz) and os.path.getmtime(raiz) < limite:
+                        os.rmdir(raiz)
+                except OSError:
+                    pass
+
+@st.cache_resource
+def get_cola_exportaciones():
+    """Cola de exportaciones compartida por todas las sesiones del proceso"""
+    return ColaExportaciones()
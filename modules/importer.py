@@ -0,0 +1,463 @@
+"""
+Importación masiva de cartera desde los archivos de antigüedad del ERP y de OCs
+Lectura por bloques, validación vectorizada y escritura en transacciones grandes
+"""
+
+import csv
+import json
+import time
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+
+from config import IMPORT_CHUNK_SIZE, IMPORT_MAX_RECHAZOS, OC_MIN_VALUE, OC_MAX_VALUE
+from modules.database import pooled_connection, money_to_int, read_money_sql, crear_ocs_lote
+from modules.utils import validate_nit_series, validate_oc_number_series
+
+# Encabezados aceptados en el archivo del ERP (en minúsculas)
+ALIAS_COLUMNAS = {
+    'nit': 'nit',
+    'nit cliente': 'nit',
+    'identificacion': 'nit',
+    'nombre': 'nombre',
+    'cliente': 'nombre',
+    'razon social': 'nombre',
+    'total_cartera': 'total_cartera',
+    'total cartera': 'total_cartera',
+    'cartera': 'total_cartera',
+    'saldo': 'total_cartera',
+}
+
+UPSERT_CARTERA = """
+INSERT INTO clientes (nit, nombre, total_cartera)
+VALUES (?, ?, ?)
+ON CONFLICT(nit) DO UPDATE SET
+    total_cartera = excluded.total_cartera,
+    fecha_actualizacion = CURRENT_TIMESTAMP
+"""
+
+# Encabezados aceptados en el archivo de OCs (en minúsculas)
+ALIAS_COLUMNAS_OCS = {
+    'nit': 'nit',
+    'nit cliente': 'nit',
+    'cliente nit': 'nit',
+    'numero': 'numero',
+    'número': 'numero',
+    'numero oc': 'numero',
+    'número oc': 'numero',
+    'oc': 'numero',
+    'valor': 'valor_total',
+    'valor total': 'valor_total',
+    'valor oc': 'valor_total',
+    'fecha': 'fecha',
+    'fecha oc': 'fecha',
+    'tipo': 'tipo',
+    'tipo oc': 'tipo',
+    'cupo referencia': 'cupo_referencia',
+    'descripcion': 'descripcion',
+    'descripción': 'descripcion',
+    'comentarios': 'descripcion',
+    'observaciones': 'descripcion',
+}
+
+TIPOS_OC = ('SUELTA', 'CUPO_NUEVO')
+
+# ==================== LECTURA POR BLOQUES ====================
+
+def _detectar_separador(archivo):
+    """Detecta el separador del CSV (coma o punto y coma) sin consumir el archivo"""
+    muestra = archivo.read(64 * 1024)
+    archivo.seek(0)
+    if isinstance(muestra, bytes):
+        muestra = muestra.decode('utf-8', errors='ignore')
+    try:
+        return csv.Sniffer().sniff(muestra, delimiters=',;\t|').delimiter
+    except csv.Error:
+        return ','
+
+def _leer_csv(archivo, chunk_size):
+    """Itera el CSV en DataFrames de `chunk_size` filas"""
+    separador = _detectar_separador(archivo)
+    yield from pd.read_csv(
+        archivo,
+        sep=separador,
+        chunksize=chunk_size,
+        dtype=str,
+        keep_default_na=False,
+        encoding_errors='replace'
+    )
+
+def _leer_xlsx(archivo, chunk_size):
+    """Itera la primera hoja del XLSX en modo streaming (read_only)"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = workbook.worksheets[0].iter_rows(values_only=True)
+        encabezado = [str(c) if c is not None else '' for c in next(filas, [])]
+        
+        bloque = []
+        for fila in filas:
+            bloque.append(fila)
+            if len(bloque) >= chunk_size:
+                yield pd.DataFrame(bloque, columns=encabezado)
+                bloque = []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=encabezado)
+    finally:
+        workbook.close()
+
+def leer_por_bloques(archivo, nombre_archivo, chunk_size=IMPORT_CHUNK_SIZE):
+    """Lee un CSV o XLSX por bloques sin cargar todo el archivo en memoria"""
+    if nombre_archivo.lower().endswith(('.xlsx', '.xlsm')):
+        return _leer_xlsx(archivo, chunk_size)
+    return _leer_csv(archivo, chunk_size)
+
+def _normalizar_columnas(bloque, alias=ALIAS_COLUMNAS, obligatorias=('nit', 'total_cartera')):
+    """Renombra los encabezados del archivo a los nombres internos"""
+    renombres = {}
+    for columna in bloque.columns:
+        clave = str(columna).strip().lower().replace('_', ' ')
+        destino = alias.get(clave) or alias.get(clave.replace(' ', '_'))
+        if destino and destino not in renombres.values():
+            renombres[columna] = destino
+    
+    bloque = bloque.rename(columns=renombres)
+    faltantes = set(obligatorias) - set(bloque.columns)
+    if faltantes:
+        raise ValueError(f"Columnas obligatorias ausentes: {', '.join(sorted(faltantes))}")
+    return bloque
+
+def _montos_numericos(valores):
+    """Convierte montos del ERP ("1.234.567", "1234567,00", 1234567) a número"""
+    if pd.api.types.is_numeric_dtype(valores):
+        return pd.to_numeric(valores, errors='coerce')
+    
+    texto = valores.astype('string').str.strip().str.replace(r'[$\s]', '', regex=True)
+    # Formato colombiano: punto de miles y coma decimal
+    formato_local = texto.str.contains(',', regex=False).fillna(False)
+    texto = texto.where(
+        ~formato_local,
+        texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    )
+    texto = texto.where(formato_local, texto.str.replace(r'\.(?=\d{3}(\.|$))', '', regex=True))
+    return pd.to_numeric(texto, errors='coerce')
+
+def _nits_del_archivo(nits):
+    """NITs de un archivo (texto o números de Excel) sin dígito de verificación: (limpios, válidos)"""
+    if pd.api.types.is_float_dtype(nits):
+        # Excel entrega NITs como float: 900249425.0
+        nits = nits.astype('Int64')
+    # Descartar el dígito de verificación (900249425-1)
+    nits = nits.astype('string').str.split('-').str[0]
+    return validate_nit_series(nits)
+
+def _preparar_bloque(bloque):
+    """Valida un bloque en forma vectorizada: retorna (válidos, rechazados)"""
+    bloque = _normalizar_columnas(bloque)
+    
+    nit_limpio, nit_valido = _nits_del_archivo(bloque['nit'])
+    montos = _montos_numericos(bloque['total_cartera'])
+    monto_valido = montos.notna() & np.isfinite(montos.fillna(0))
+    
+    validos = nit_valido & monto_valido
+    
+    rechazados = bloque.loc[~validos, ['nit', 'total_cartera']].copy()
+    rechazados['motivo'] = np.where(
+        ~nit_valido[~validos], "NIT inválido", "Cartera no numérica"
+    )
+    
+    nombres = (
+        bloque['nombre'].astype('string').str.strip()
+        if 'nombre' in bloque.columns
+        else pd.Series(pd.NA, index=bloque.index, dtype='string')
+    )
+    aceptados = pd.DataFrame({
+        'nit': nit_limpio[validos],
+        'nombre': nombres[validos].fillna(nit_limpio[validos]),
+        'total_cartera': money_to_int(montos[validos].to_numpy())
+    })
+    
+    # Si un NIT se repite dentro del bloque, prevalece la última fila
+    aceptados = aceptados.drop_duplicates(subset='nit', keep='last')
+    return aceptados, rechazados
+
+# ==================== IMPORTACIÓN ====================
+
+def importar_cartera(archivo, nombre_archivo, chunk_size=IMPORT_CHUNK_SIZE, progreso=None):
+    """
+    Importa el archivo de cartera del ERP actualizando total_cartera por NIT.
+    Los clientes nuevos se crean con su nombre del archivo.
+    `progreso` es un callback opcional que recibe las filas leídas hasta el momento.
+    Retorna las estadísticas de la carga y una muestra de filas rechazadas.
+    """
+    inicio = time.perf_counter()
+    stats = {
+        'filas_leidas': 0,
+        'filas_importadas': 0,
+        'filas_rechazadas': 0,
+        'bloques': 0
+    }
+    rechazos = []
+    
+    with pooled_connection() as conn:
+        for bloque in leer_por_bloques(archivo, nombre_archivo, chunk_size):
+            aceptados, rechazados = _preparar_bloque(bloque)
+            
+            # Un bloque por transacción: el lock de escritura se libera entre bloques
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(UPSERT_CARTERA, aceptados.itertuples(index=False, name=None))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            
+            stats['bloques'] += 1
+            stats['filas_leidas'] += len(bloque)
+            stats['filas_importadas'] += len(aceptados)
+            stats['filas_rechazadas'] += len(rechazados)
+            
+            muestra_restante = IMPORT_MAX_RECHAZOS - sum(len(r) for r in rechazos)
+            if muestra_restante > 0 and not rechazados.empty:
+                rechazos.append(rechazados.head(muestra_restante))
+            
+            if progreso:
+                progreso(stats['filas_leidas'])
+    
+    stats['segundos'] = time.perf_counter() - inicio
+    stats['filas_por_segundo'] = (
+        stats['filas_leidas'] / stats['segundos'] if stats['segundos'] > 0 else 0
+    )
+    
+    rechazos_df = (
+        pd.concat(rechazos, ignore_index=True)
+        if rechazos
+        else pd.DataFrame(columns=['nit', 'total_cartera', 'motivo'])
+    )
+    return stats, rechazos_df
+
+# ==================== IMPORTACIÓN DE OCs ====================
+
+def _texto_opcional(bloque, columna):
+    """Columna opcional del archivo como texto sin espacios ('' si no viene)"""
+    if columna not in bloque.columns:
+        return pd.Series('', index=bloque.index, dtype='string')
+    return bloque[columna].astype('string').str.strip().fillna('')
+
+def _fechas_del_archivo(bloque):
+    """Fechas como AAAA-MM-DD: vacías = hoy, NaN = no interpretable"""
+    texto = _texto_opcional(bloque, 'fecha')
+    if 'fecha' in bloque.columns and pd.api.types.is_datetime64_any_dtype(bloque['fecha']):
+        fechas = bloque['fecha']
+    else:
+        fechas = pd.to_datetime(texto.where(texto != ''), errors='coerce', dayfirst=True, format='mixed')
+    
+    resultado = fechas.dt.strftime('%Y-%m-%d').astype('string')
+    return resultado.mask(texto == '', datetime.now().strftime('%Y-%m-%d'))
+
+def _nits_registrados(nits):
+    """NITs de la lista que existen en clientes (búsqueda por la clave única)"""
+    if not len(nits):
+        return set()
+    with pooled_connection() as conn:
+        filas = conn.execute(
+            "SELECT nit FROM clientes WHERE nit IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(nits)),)
+        ).fetchall()
+    return {fila[0] for fila in filas}
+
+def _preparar_bloque_ocs(bloque):
+    """Valida un bloque de OCs en forma vectorizada: retorna (válidas, rechazadas)"""
+    bloque = _normalizar_columnas(bloque, ALIAS_COLUMNAS_OCS, ('nit', 'valor_total'))
+    
+    nit_limpio, nit_valido = _nits_del_archivo(bloque['nit'])
+    # Solo se consultan los clientes de este bloque
+    nits_conocidos = _nits_registrados(nit_limpio[nit_valido].unique().tolist())
+    numeros = _texto_opcional(bloque, 'numero')
+    # Sin número: se asigna de la secuencia al importar
+    numero_valido = (numeros == '') | validate_oc_number_series(numeros)[1]
+    montos = _montos_numericos(bloque['valor_total'])
+    fechas = _fechas_del_archivo(bloque)
+    tipos = _texto_opcional(bloque, 'tipo').str.upper().replace('', 'SUELTA')
+    cupo_referencia = _texto_opcional(bloque, 'cupo_referencia')
+    
+    condiciones = [
+        ~nit_valido,
+        ~nit_limpio.isin(nits_conocidos),
+        ~numero_valido,
+        montos.isna(),
+        (montos < OC_MIN_VALUE) | (montos > OC_MAX_VALUE),
+        fechas.isna(),
+        ~tipos.isin(TIPOS_OC),
+        (tipos == 'CUPO_NUEVO') & (cupo_referencia == ''),
+    ]
+    # El primer motivo que aplica es el que se reporta
+    motivos = np.select(
+        [c.to_numpy(dtype=bool, na_value=False) for c in condiciones],
+        [
+            "NIT inválido",
+            "Cliente no registrado",
+            "Formato de número OC inválido (OC-AAAA-NNN)",
+            "Valor no numérico",
+            f"Valor fuera del rango permitido ({OC_MIN_VALUE:,} - {OC_MAX_VALUE:,})",
+            "Fecha inválida",
+            f"Tipo de OC inválido ({', '.join(TIPOS_OC)})",
+            "El cupo de referencia es obligatorio para tipo CUPO_NUEVO",
+        ],
+        default=''
+    )
+    validos = motivos == ''
+    
+    rechazados = pd.DataFrame({
+        'nit': bloque['nit'].astype('string'),
+        'numero': numeros,
+        'valor_total': bloque['valor_total'].astype('string'),
+        'motivo': motivos,
+    })[~validos]
+    
+    aceptados = pd.DataFrame({
+        'cliente_nit': nit_limpio,
+        'numero': numeros,
+        'valor_total': money_to_int(montos.fillna(0).to_numpy()),
+        'fecha': fechas,
+        'tipo': tipos,
+        'cupo_referencia': cupo_referencia,
+        'descripcion': _texto_opcional(bloque, 'descripcion'),
+    })[validos]
+    return aceptados, rechazados
+
+def _numeros_registrados(numeros):
+    """Números de la lista que ya existen en ocs (búsqueda por el índice único)"""
+    if not len(numeros):
+        return set()
+    with pooled_connection() as conn:
+        filas = conn.execute(
+            "SELECT numero FROM ocs WHERE numero IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(numeros)),)
+        ).fetchall()
+    return {fila[0] for fila in filas}
+
+def _validar_ocs_por_bloques(archivo, nombre_archivo, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Valida el archivo de OCs bloque a bloque: produce (filas leídas, válidas, rechazadas).
+    Entre bloques solo se conservan los números vistos, para rechazar los repetidos.
+    """
+    archivo.seek(0)
+    numeros_vistos = set()
+    for bloque in leer_por_bloques(archivo, nombre_archivo, chunk_size):
+        aceptados, rechazados = _preparar_bloque_ocs(bloque)
+        
+        # Números repetidos en el archivo (en este bloque o en uno anterior) o ya registrados
+        con_numero = aceptados['numero'] != ''
+        numeros = aceptados['numero']
+        repetidos = con_numero & (numeros.duplicated(keep='first') | numeros.isin(numeros_vistos))
+        registrados = con_numero & numeros.isin(
+            _numeros_registrados(numeros[con_numero].unique().tolist())
+        )
+        numeros_vistos.update(numeros[con_numero].tolist())
+        
+        duplicados = repetidos | registrados
+        if duplicados.any():
+            rechazados = pd.concat([rechazados, pd.DataFrame({
+                'nit': aceptados.loc[duplicados, 'cliente_nit'],
+                'numero': numeros[duplicados],
+                'valor_total': aceptados.loc[duplicados, 'valor_total'].astype('string'),
+                'motivo': np.where(registrados[duplicados], "Número ya registrado", "Número repetido en el archivo"),
+            })], ignore_index=True)
+            aceptados = aceptados[~duplicados]
+        
+        yield len(bloque), aceptados.reset_index(drop=True), rechazados
+
+def impacto_importacion_ocs(totales):
+    """
+    Impacto en cupo por cliente de todas las OCs de la importación a partir de
+    los totales por cliente (cliente_nit, ocs, total_importado)
+    """
+    with pooled_connection() as conn:
+        exposicion = read_money_sql("""
+        SELECT nit, nombre, disponible, total_pendiente, excluir_calculo
+        FROM cliente_exposicion
+        WHERE nit IN (SELECT value FROM json_each(?))
+        """, conn, params=(json.dumps(totales['cliente_nit'].tolist()),))
+    
+    impacto = totales.merge(
+        exposicion, left_on='cliente_nit', right_on='nit', how='left'
+    ).drop(columns='nit')
+    
+    # Igual que en la creación individual: las OCs pendientes ya comprometen cupo
+    impacto['disponible_comprometido'] = impacto['disponible'] - impacto['total_pendiente']
+    impacto['nuevo_disponible'] = impacto['disponible_comprometido'] - impacto['total_importado']
+    impacto['sobrepasa_cupo'] = (impacto['nuevo_disponible'] < 0) & ~impacto['excluir_calculo'].astype(bool)
+    return impacto.sort_values('nuevo_disponible', kind='stable').reset_index(drop=True)
+
+def preparar_importacion_ocs(archivo, nombre_archivo, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Lee y valida un archivo de OCs por bloques sin escribir en la base.
+    Solo acumula totales por cliente: retorna una muestra de rechazadas, el
+    impacto por cliente de toda la carga y las estadísticas de la validación.
+    """
+    inicio = time.perf_counter()
+    stats = {
+        'filas_leidas': 0,
+        'filas_validas': 0,
+        'filas_rechazadas': 0,
+        'valor_total': 0,
+        'bloques': 0
+    }
+    rechazos = []
+    totales = pd.DataFrame(columns=['ocs', 'total_importado'], dtype='int64')
+    
+    for leidas, aceptados, rechazados in _validar_ocs_por_bloques(archivo, nombre_archivo, chunk_size):
+        por_cliente = aceptados.groupby('cliente_nit').agg(
+            ocs=('valor_total', 'size'), total_importado=('valor_total', 'sum')
+        )
+        totales = totales.add(por_cliente, fill_value=0).astype('int64')
+        
+        stats['bloques'] += 1
+        stats['filas_leidas'] += leidas
+        stats['filas_validas'] += len(aceptados)
+        stats['filas_rechazadas'] += len(rechazados)
+        stats['valor_total'] += int(aceptados['valor_total'].sum())
+        
+        muestra_restante = IMPORT_MAX_RECHAZOS - sum(len(r) for r in rechazos)
+        if muestra_restante > 0 and not rechazados.empty:
+            rechazos.append(rechazados.head(muestra_restante))
+    
+    stats['segundos'] = time.perf_counter() - inicio
+    stats['filas_por_segundo'] = (
+        stats['filas_leidas'] / stats['segundos'] if stats['segundos'] > 0 else 0
+    )
+    
+    rechazos_df = (
+        pd.concat(rechazos, ignore_index=True)
+        if rechazos
+        else pd.DataFrame(columns=['nit', 'numero', 'valor_total', 'motivo'])
+    )
+    impacto = impacto_importacion_ocs(totales.rename_axis('cliente_nit').reset_index())
+    return rechazos_df, impacto, stats
+
+def importar_ocs(archivo, nombre_archivo, validas, usuario=None, progreso=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Registra las OCs del archivo validado por preparar_importacion_ocs: vuelve
+    a leerlo y validarlo por bloques y escribe cada bloque en sus transacciones.
+    `validas` son las filas válidas de la validación; `progreso` recibe las OCs
+    procesadas hasta el momento.
+    Retorna las estadísticas de la carga.
+    """
+    inicio = time.perf_counter()
+    creadas = procesadas = 0
+    for _, aceptados, _ in _validar_ocs_por_bloques(archivo, nombre_archivo, chunk_size):
+        avance = (lambda n, base=procesadas: progreso(base + n)) if progreso else None
+        creadas += crear_ocs_lote(aceptados, usuario=usuario, progreso=avance)[0]
+        procesadas += len(aceptados)
+    segundos = time.perf_counter() - inicio
+    
+    return {
+        'ocs_creadas': creadas,
+        # Números registrados por otra sesión entre la validación y la escritura
+        'ocs_omitidas': max(validas - creadas, 0),
+        'segundos': segundos,
+        'ocs_por_segundo': creadas / segundos if segundos > 0 else 0,
+    }
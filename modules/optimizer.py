@@ -0,0 +1,133 @@
+"""
+Sugerencia de autorizaciones de OCs dentro del cupo disponible de cada cliente
+Todas las OCs abiertas se asignan en una sola pasada ordenada por cliente
+"""
+
+import numpy as np
+import pandas as pd
+
+from modules.database import get_ocs_abiertas, get_disponibles_con_ocs_abiertas
+
+# Políticas de asignación: clave -> descripción para la interfaz
+POLITICAS_OPTIMIZADOR = {
+    'mayor_valor': "Maximizar valor autorizado",
+    'antiguas': "Más antiguas primero",
+    'pequenas': "Más pequeñas primero",
+}
+
+# Orden de prioridad dentro de cada cliente (columnas, ascendente)
+_ORDEN_POLITICA = {
+    'mayor_valor': (['cliente_nit', 'valor_pendiente', 'fecha', 'id'], [True, False, True, True]),
+    'antiguas': (['cliente_nit', 'fecha', 'id'], [True, True, True]),
+    'pequenas': (['cliente_nit', 'valor_pendiente', 'fecha', 'id'], [True, True, True, True]),
+}
+
+# ==================== ASIGNACIÓN ====================
+
+def _asignar_prefijo(valores, cupos, inicio_grupo, parciales):
+    """
+    Asigna en orden de prioridad hasta agotar el cupo de cada cliente.
+    Con parciales la OC del límite recibe el remanente; sin ellos la
+    asignación se detiene en la primera OC que no cabe completa.
+    """
+    acumulado = np.cumsum(valores)
+    # Acumulado del cliente antes de cada OC: se resta lo acumulado hasta el inicio de su grupo
+    base = np.repeat(acumulado[inicio_grupo] - valores[inicio_grupo], np.diff(np.append(inicio_grupo, len(valores))))
+    antes = acumulado - valores - base
+    
+    if parciales:
+        return np.clip(cupos - antes, 0, valores)
+    return np.where(antes + valores <= cupos, valores, 0)
+
+def _asignar_mejor_ajuste(valores, cupos, inicio_grupo):
+    """
+    Mayor valor sin parciales (subset-sum por cliente): recorre de mayor a menor
+    y toma cada OC que aún cabe. Garantiza al menos la mitad del óptimo y en la
+    práctica queda muy cerca.
+    Requiere los valores de cada cliente en orden descendente. En lugar de
+    recorrer OC por OC, cada ronda salta con searchsorted las OCs que ya no
+    caben y acepta de una vez el tramo contiguo más largo que sí cabe (cumsum +
+    searchsorted). Sigue siendo un ciclo de Python, pero de una vuelta por
+    tramo: con pocos saltos por cliente el costo lo dominan las búsquedas numpy.
+    """
+    asignado = np.zeros_like(valores)
+    acumulado = np.cumsum(valores)
+    negativos = -valores
+    fin_grupo = np.append(inicio_grupo[1:], len(valores))
+    
+    for inicio, fin in zip(inicio_grupo.tolist(), fin_grupo.tolist()):
+        restante = cupos[inicio]
+        i = inicio
+        while i < fin and restante > 0:
+            # Primera OC que cabe: en orden descendente, -valor es no decreciente
+            i += int(np.searchsorted(negativos[i:fin], -restante, side='left'))
+            if i >= fin:
+                break
+            # Tramo más largo desde i cuya suma no supera lo que queda del cupo
+            base = acumulado[i] - valores[i]
+            tomadas = int(np.searchsorted(acumulado[i:fin], base + restante, side='right'))
+            asignado[i:i + tomadas] = valores[i:i + tomadas]
+            restante -= acumulado[i + tomadas - 1] - base
+            i += tomadas
+    
+    return asignado
+
+def optimizar_autorizaciones(ocs, disponibles, politica='mayor_valor', parciales=True):
+    """
+    Calcula el valor sugerido a autorizar de cada OC abierta sin superar el
+    disponible de su cliente.
+    
+    `ocs` requiere id, cliente_nit, valor_pendiente y fecha; `disponibles` es una
+    Serie indexada por NIT (NaN = cliente sin tope de cupo).
+    Retorna las OCs en orden de prioridad con valor_sugerido y parcial.
+    """
+    if politica not in _ORDEN_POLITICA:
+        raise ValueError(f"Política de asignación desconocida: {politica}")
+    
+    columnas, ascendente = _ORDEN_POLITICA[politica]
+    resultado = ocs.sort_values(columnas, ascending=ascendente, kind='stable').reset_index(drop=True)
+    if resultado.empty:
+        return resultado.assign(valor_sugerido=pd.Series(dtype='int64'), parcial=pd.Series(dtype=bool))
+    
+    valores = resultado['valor_pendiente'].to_numpy(dtype=np.int64)
+    cupo = resultado['cliente_nit'].map(disponibles)
+    sin_tope = cupo.isna().to_numpy()
+    # Un disponible negativo (cliente ya sobrepasado) no admite autorizaciones
+    cupos = np.maximum(cupo.fillna(0).to_numpy(dtype=np.int64), 0)
+    
+    nits = resultado['cliente_nit'].to_numpy()
+    inicio_grupo = np.flatnonzero(np.r_[True, nits[1:] != nits[:-1]])
+    
+    if politica == 'mayor_valor' and not parciales:
+        asignado = _asignar_mejor_ajuste(valores, cupos, inicio_grupo)
+    else:
+        # Con parciales el mayor valor posible es min(pendiente, cupo): cualquier
+        # orden lo alcanza, y de mayor a menor toca la menor cantidad de OCs
+        asignado = _asignar_prefijo(valores, cupos, inicio_grupo, parciales)
+    
+    asignado = np.where(sin_tope, valores, asignado)
+    resultado['valor_sugerido'] = asignado
+    resultado['parcial'] = (asignado > 0) & (asignado < valores)
+    return resultado
+
+def sugerir_autorizaciones(politica='mayor_valor', parciales=True):
+    """Sugerencia sobre todas las OCs pendientes y parciales con el disponible actual"""
+    ocs = get_ocs_abiertas()
+    
+    clientes = get_disponibles_con_ocs_abiertas()
+    # Los clientes excluidos del cálculo no tienen tope
+    disponibles = clientes['disponible'].where(~clientes['excluir_calculo'].astype(bool)).set_axis(clientes['nit'])
+    
+    return optimizar_autorizaciones(ocs, disponibles, politica, parciales)
+
+def resumen_por_cliente(sugerencia):
+    """Totales pendientes y sugeridos por cliente de una sugerencia"""
+    return sugerencia.assign(
+        sugeridas=sugerencia['valor_sugerido'] > 0
+    ).groupby(['cliente_nit', 'cliente_nombre'], as_index=False).agg(
+        ocs=('id', 'count'),
+        sugeridas=('sugeridas', 'sum'),
+        parciales=('parcial', 'sum'),
+        pendiente=('valor_pendiente', 'sum'),
+        sugerido=('valor_sugerido', 'sum'),
+    )
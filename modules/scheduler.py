@@ -0,0 +1,250 @@
+"""
+Programador de respaldos en segundo plano
+Un hilo por proceso ejecuta las tareas; el programa diario lo corre solo el proceso con el lock
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import streamlit as st
+
+from config import (
+    SCHEDULER_TICK_SECONDS, SCHEDULER_LOCK_FILE, BACKUP_LOCK_FILE,
+    BACKUP_INCREMENTAL_MINUTES
+)
+from modules.database import (
+    backup_database, get_parametro, registrar_backup_job, get_ultimo_backup_job
+)
+from modules.backup import crear_backup_incremental, podar_backups, restaurar_a_fecha
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ==================== LOCK ENTRE PROCESOS ====================
+
+class FileLock:
+    """Lock exclusivo sobre un archivo, compartido entre procesos"""
+    
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._archivo = None
+    
+    @property
+    def adquirido(self):
+        return self._archivo is not None
+    
+    def adquirir(self, bloquear=True):
+        """Adquiere el lock; sin bloquear retorna False si otro proceso lo tiene"""
+        if self._archivo is not None:
+            return True
+        
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        archivo = open(self.ruta, "a+")
+        try:
+            if fcntl:
+                fcntl.flock(archivo, fcntl.LOCK_EX | (0 if bloquear else fcntl.LOCK_NB))
+            else:
+                archivo.seek(0)
+                msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK if bloquear else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            archivo.close()
+            return False
+        
+        self._archivo = archivo
+        return True
+    
+    def liberar(self):
+        if self._archivo is None:
+            return
+        if fcntl:
+            fcntl.flock(self._archivo, fcntl.LOCK_UN)
+        else:
+            self._archivo.seek(0)
+            msvcrt.locking(self._archivo.fileno(), msvcrt.LK_UNLCK, 1)
+        self._archivo.close()
+        self._archivo = None
+    
+    def __enter__(self):
+        if not self.adquirir():
+            # msvcrt.locking se rinde tras unos 10 segundos; sin el lock no se ejecuta nada
+            raise TimeoutError(f"No se pudo adquirir el lock {self.ruta}")
+        return self
+    
+    def __exit__(self, *exc):
+        self.liberar()
+
+# ==================== TAREAS ====================
+
+def _tarea_completo():
+    archivo = backup_database()
+    return {'archivo': os.path.basename(archivo), 'tamano': os.path.getsize(archivo)}
+
+def _tarea_incremental():
+    entrada = crear_backup_incremental()
+    if entrada is None:
+        return {'detalle': "Sin cambios"}
+    return {'archivo': entrada['archivo'], 'tamano': entrada['tamano']}
+
+def _tarea_poda():
+    resultado = podar_backups(int(get_parametro('retencion_backups_dias') or 0))
+    return {'tamano': resultado['bytes'], 'detalle': f"{resultado['archivos']} archivos eliminados"}
+
+def _tarea_restauracion(fecha_objetivo):
+    resultado = restaurar_a_fecha(fecha_objetivo)
+    return {
+        'archivo': resultado['nuevo_backup'],
+        'detalle': f"Restaurada a {resultado['objetivo']} ({resultado['cambios_aplicados']} cambios)",
+        'resultado': resultado
+    }
+
+TAREAS = {
+    'completo': _tarea_completo,
+    'incremental': _tarea_incremental,
+    'poda': _tarea_poda,
+    'restauracion': _tarea_restauracion,
+}
+
+def _ejecutar(tipo, origen, *args):
+    """
+    Ejecuta una tarea bajo el lock de respaldos y registra duración y tamaño
+    en backup_jobs, también cuando falla
+    """
+    inicio = datetime.now()
+    try:
+        with FileLock(BACKUP_LOCK_FILE):
+            resultado = TAREAS[tipo](*args)
+    except Exception as e:
+        registrar_backup_job(
+            tipo, origen, inicio.isoformat(sep=' ', timespec='seconds'),
+            (datetime.now() - inicio).total_seconds(), 'ERROR', detalle=str(e)
+        )
+        raise
+    
+    registrar_backup_job(
+        tipo, origen, inicio.isoformat(sep=' ', timespec='seconds'),
+        (datetime.now() - inicio).total_seconds(), 'OK',
+        tamano=resultado.get('tamano'),
+        archivo=resultado.get('archivo'),
+        detalle=resultado.get('detalle')
+    )
+    return resultado
+
+# ==================== PROGRAMADOR ====================
+
+def _proximo_backup(ahora):
+    """Fecha y hora del próximo backup completo programado (None si está desactivado)"""
+    if get_parametro('backup_auto') != '1':
+        return None
+    
+    hora = datetime.strptime(get_parametro('hora_backup'), '%H:%M').time()
+    programado = datetime.combine(ahora.date(), hora)
+    ultimo = get_ultimo_backup_job('completo', 'programado')
+    if ultimo and ultimo >= programado.isoformat(sep=' ', timespec='seconds'):
+        programado += timedelta(days=1)
+    return programado
+
+class BackupScheduler(threading.Thread):
+    """
+    Hilo que ejecuta las tareas de respaldo fuera de las sesiones de usuario.
+    Atiende las solicitudes manuales de su proceso y, si obtiene el lock del
+    programador, el backup diario, los incrementales y la poda por retención.
+    """
+    
+    def __init__(self, tick=SCHEDULER_TICK_SECONDS):
+        super().__init__(name="backup-scheduler", daemon=True)
+        self.tick = tick
+        self.ultima_revision = None
+        self.ultimo_error = None
+        self._pendientes = queue.Queue()
+        self._detener = threading.Event()
+        self._lider = FileLock(SCHEDULER_LOCK_FILE)
+    
+    @property
+    def es_lider(self):
+        return self._lider.adquirido
+    
+    def solicitar(self, tipo, *args):
+        """Encola una tarea manual; retorna un Future con su resultado"""
+        futuro = Future()
+        self._pendientes.put((tipo, args, futuro))
+        return futuro
+    
+    def detener(self):
+        self._detener.set()
+        self._pendientes.put(None)
+    
+    def estado(self):
+        """Resumen para mostrar en la página de configuración"""
+        try:
+            proximo = _proximo_backup(datetime.now())
+        except Exception:
+            proximo = None
+        return {
+            'activo': self.is_alive(),
+            'es_lider': self.es_lider,
+            'ultima_revision': self.ultima_revision,
+            'proximo_backup': proximo,
+            'pendientes': self._pendientes.qsize(),
+            'ultimo_error': self.ultimo_error,
+        }
+    
+    def run(self):
+        while not self._detener.is_set():
+            try:
+                tarea = self._pendientes.get(timeout=self.tick)
+            except queue.Empty:
+                tarea = None
+            
+            if tarea is not None:
+                tipo, args, futuro = tarea
+                if futuro.set_running_or_notify_cancel():
+                    try:
+                        futuro.set_result(_ejecutar(tipo, 'manual', *args))
+                    except Exception as e:
+                        futuro.set_exception(e)
+                continue
+            
+            # Solo un proceso ejecuta el programa; los demás reintentan por si el líder termina
+            if self._lider.adquirir(bloquear=False):
+                try:
+                    self._revisar_programa(datetime.now())
+                    self.ultimo_error = None
+                except Exception as e:
+                    self.ultimo_error = str(e)
+            self.ultima_revision = datetime.now()
+        
+        self._lider.liberar()
+    
+    def _revisar_programa(self, ahora):
+        """Ejecuta las tareas programadas que estén vencidas"""
+        proximo = _proximo_backup(ahora)
+        if proximo is None:
+            return
+        
+        if ahora >= proximo:
+            _ejecutar('completo', 'programado')
+            _ejecutar('poda', 'programado')
+            return
+        
+        if BACKUP_INCREMENTAL_MINUTES:
+            ultimos = [
+                get_ultimo_backup_job('incremental'),
+                get_ultimo_backup_job('completo')
+            ]
+            ultimo = max((u for u in ultimos if u), default=None)
+            intervalo = timedelta(minutes=BACKUP_INCREMENTAL_MINUTES)
+            if ultimo is None or ahora - datetime.fromisoformat(ultimo) >= intervalo:
+                _ejecutar('incremental', 'programado')
+
+@st.cache_resource
+def iniciar_scheduler():
+    """Inicia el programador una sola vez por proceso de Streamlit"""
+    scheduler = BackupScheduler()
+    scheduler.start()
+    return scheduler
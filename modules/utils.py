@@ -1,12 +1,25 @@
+import logging
+import re
+import threading
+import time
+import numpy as np
 import pandas as pd
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import wraps
+
+from config import LOG_LEVEL, LOG_FILE, EXPORT_CHUNK_SIZE
 
 def format_currency(value):
     """Formatea un valor numérico como moneda"""
     if pd.isna(value) or value is None:
         return "$0"
     
+    # Montos enteros (int64 de la base de datos): sin conversión a float
+    if isinstance(value, (int, np.integer)) and abs(value) < 1_000_000:
+        return f"${value:,}".replace(',', '.')
+    
     try:
         value = float(value)
         if value >= 1_000_000_000:
@@ -25,6 +38,199 @@ def format_number(value, decimals=0):
     except:
         return str(value)
 
+def calculate_percentage(parte, total):
+    """Calcula el porcentaje de `parte` sobre `total` (0 si el total es 0)"""
+    try:
+        return float(parte) / float(total) * 100 if total else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+# ==================== FORMATO VECTORIZADO ====================
+
+def _componer_texto(enteros, negativo, prefijo=b'', sufijo=b'', fraccion=None, digitos_fraccion=0, miles=True):
+    """
+    Construye textos ASCII en una matriz de bytes, una columna a la vez de
+    derecha a izquierda: prefijo, signo, parte entera (con punto de miles),
+    fracción y sufijo. Retorna un arreglo de str.
+    """
+    enteros = np.asarray(enteros, dtype=np.int64)
+    n = len(enteros)
+    
+    cantidad_digitos = np.ones(n, dtype=np.int64)
+    for potencia in range(1, 19):
+        cantidad_digitos += enteros >= 10 ** potencia
+    agrupados = cantidad_digitos + (cantidad_digitos - 1) // 3 if miles else cantidad_digitos
+    
+    derecha = len(sufijo) + (digitos_fraccion + 1 if fraccion is not None and digitos_fraccion else 0)
+    largo = len(prefijo) + negativo.astype(np.int64) + agrupados + derecha
+    ancho = int(largo.max()) if n else 1
+    
+    buffer = np.zeros((n, ancho), dtype=np.uint8)
+    filas = np.arange(n)
+    
+    def escribir(posicion, codigos, activos=None):
+        """Escribe en la posición `posicion` contada desde el final de cada texto"""
+        columnas = largo - 1 - posicion
+        if activos is None:
+            buffer[filas, columnas] = codigos
+        else:
+            buffer[filas[activos], columnas[activos]] = codigos[activos] if np.ndim(codigos) else codigos
+    
+    posicion = 0
+    for caracter in reversed(sufijo):
+        escribir(posicion, caracter)
+        posicion += 1
+    
+    if fraccion is not None and digitos_fraccion:
+        fraccion = np.asarray(fraccion, dtype=np.int64)
+        for _ in range(digitos_fraccion):
+            escribir(posicion, 48 + fraccion % 10)
+            fraccion = fraccion // 10
+            posicion += 1
+        escribir(posicion, ord('.'))
+        posicion += 1
+    
+    resto = enteros.copy()
+    for indice in range(int(agrupados.max()) if n else 0):
+        activos = indice < agrupados
+        if miles and indice % 4 == 3:
+            escribir(posicion + indice, ord('.'), activos)
+        else:
+            escribir(posicion + indice, 48 + resto % 10, activos)
+            resto //= 10
+    
+    buffer[negativo, len(prefijo)] = ord('-')
+    buffer[:, :len(prefijo)] = np.frombuffer(prefijo, dtype=np.uint8)
+    
+    # Los bytes nulos sobrantes a la derecha se descartan al ver la fila como texto
+    return buffer.view(f'S{ancho}').ravel().astype(f'U{ancho}')
+
+def _redondear(valores, decimales):
+    """
+    Redondea a `decimales` como el formato '%.Nf' y separa parte entera y
+    fracción. Los casos límite (mitades exactas) se resuelven con el formato.
+    """
+    factor = 10 ** decimales
+    escalados = valores * factor
+    redondeados = np.rint(escalados)
+    
+    # Cerca de una mitad el producto puede perder precisión: se usa '%.Nf' directamente
+    distancia = np.abs(escalados - np.floor(escalados) - 0.5)
+    dudosos = distancia < np.maximum(np.abs(escalados), 1.0) * 1e-12
+    if dudosos.any():
+        redondeados[dudosos] = [
+            float(f"{v:.{decimales}f}") * factor for v in valores[dudosos]
+        ]
+        redondeados[dudosos] = np.rint(redondeados[dudosos])
+    
+    # El signo se toma del valor redondeado: -0.04 se formatea como "-0.0"
+    negativo = np.signbit(redondeados)
+    absolutos = np.abs(redondeados).astype(np.int64)
+    return absolutos // factor, absolutos % factor, negativo
+
+def _formatear_montos(valores):
+    """Formatea un arreglo float de montos como format_currency"""
+    resultado = np.empty(valores.shape, dtype=object)
+    resultado[np.isnan(valores)] = '$0'
+    
+    finitos = np.isfinite(valores)
+    billones = finitos & (valores >= 1_000_000_000)
+    millones = finitos & (valores >= 1_000_000) & ~billones
+    simples = finitos & ~billones & ~millones
+    
+    for mascara, divisor, sufijo in ((billones, 1_000_000_000, b'B'), (millones, 1_000_000, b'M')):
+        if mascara.any():
+            enteros, decimas, _ = _redondear(valores[mascara] / divisor, 1)
+            resultado[mascara] = _componer_texto(
+                enteros, np.zeros(len(enteros), dtype=bool),
+                prefijo=b'$', sufijo=sufijo, fraccion=decimas, digitos_fraccion=1
+            )
+    
+    if simples.any():
+        enteros, _, negativo = _redondear(valores[simples], 0)
+        resultado[simples] = _componer_texto(enteros, negativo, prefijo=b'$')
+    
+    # ±inf: mismo texto que la versión escalar
+    infinitos = np.isinf(valores)
+    if infinitos.any():
+        resultado[infinitos] = [format_currency(v) for v in valores[infinitos]]
+    return resultado
+
+def _formatear_porcentajes(valores, decimales):
+    """Formatea un arreglo float de porcentajes como f"{x:.1f}%" """
+    resultado = np.empty(valores.shape, dtype=object)
+    
+    finitos = np.isfinite(valores)
+    if finitos.any():
+        enteros, fraccion, negativo = _redondear(valores[finitos], decimales)
+        resultado[finitos] = _componer_texto(
+            enteros, negativo, sufijo=b'%', fraccion=fraccion,
+            digitos_fraccion=decimales, miles=False
+        )
+    if not finitos.all():
+        resultado[~finitos] = [f"{v:.{decimales}f}%" for v in valores[~finitos]]
+    return resultado
+
+def _por_valores_unicos(serie, formatear):
+    """
+    Aplica `formatear` una sola vez por valor distinto (caché de repetidos)
+    y reconstruye la serie completa con el índice original
+    """
+    # Se comparan los bits: 0.0 y -0.0 son iguales para np.unique pero se formatean distinto
+    bits, inverso = np.unique(serie.to_numpy(dtype=np.float64).view(np.int64), return_inverse=True)
+    return pd.Series(formatear(bits.view(np.float64))[inverso.reshape(-1)], index=serie.index, dtype=object)
+
+def format_currency_series(valores):
+    """
+    Versión vectorizada de format_currency para Series o arreglos completos.
+    Produce el mismo texto ($1.234, $12.5M, $1.2B) formateando con NumPy
+    solo los valores distintos.
+    """
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores)
+    numeros = pd.to_numeric(serie, errors='coerce')
+    montos = pd.Series(numeros.to_numpy(dtype=float, na_value=np.nan), index=serie.index)
+    
+    resultado = _por_valores_unicos(montos, _formatear_montos)
+    
+    # Textos no numéricos: se conservan como en la versión escalar
+    no_numericos = montos.isna() & serie.notna()
+    if no_numericos.any():
+        resultado[no_numericos] = serie[no_numericos].map(format_currency)
+    return resultado
+
+def format_percentage_series(valores, decimales=1):
+    """Formatea porcentajes como f"{x:.1f}%" sobre la Series completa"""
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores)
+    numeros = pd.Series(
+        pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float, na_value=np.nan),
+        index=serie.index
+    )
+    return _por_valores_unicos(numeros, lambda unicos: _formatear_porcentajes(unicos, decimales))
+
+def _formateador_por_tabla(serie, formatear):
+    """Formatea los valores distintos de la columna y retorna una búsqueda por celda"""
+    unicos = pd.Series(pd.unique(serie.dropna()))
+    tabla = dict(zip(unicos, formatear(unicos)))
+    return lambda valor: tabla.get(valor, valor)
+
+def style_montos(df, monedas=(), porcentajes=(), decimales=1):
+    """
+    Styler para st.dataframe que formatea moneda y porcentajes al renderizar,
+    sin copiar el DataFrame ni convertir sus columnas a texto.
+    """
+    estilo = df.style
+    for columna in monedas:
+        estilo = estilo.format(
+            _formateador_por_tabla(df[columna], format_currency_series),
+            subset=[columna], na_rep="$0"
+        )
+    for columna in porcentajes:
+        estilo = estilo.format(
+            _formateador_por_tabla(df[columna], lambda s: format_percentage_series(s, decimales)),
+            subset=[columna]
+        )
+    return estilo
+
 def get_risk_level(usage_percentage):
     """Determina el nivel de riesgo basado en porcentaje de uso"""
     if usage_percentage >= 95:
@@ -66,31 +272,39 @@ def validate_nit(nit):
     
     return True
 
-def generate_oc_number():
-    """Genera número de OC automático"""
-    from modules.database import get_db_connection
+def validate_nit_series(nits):
+    """Versión vectorizada de validate_nit: retorna (NITs limpios, máscara de válidos)"""
+    texto = nits.astype('string')
     
-    conn = get_db_connection()
-    year = datetime.now().year
+    # Limpiar caracteres no numéricos
+    limpio = texto.str.replace(r'\D', '', regex=True)
     
-    # Obtener el último número de OC del año actual
-    query = f"SELECT MAX(numero) FROM ocs WHERE numero LIKE 'OC-{year}-%'"
-    result = pd.read_sql(query, conn)
-    conn.close()
+    # Validar longitud
+    validos = limpio.str.len().between(8, 15).fillna(False).astype(bool)
     
-    last_number = result.iloc[0, 0]
+    return limpio.fillna(''), validos
+
+# Formato OC-AAAA-NNN (el consecutivo puede superar los tres dígitos)
+OC_NUMERO_REGEX = r'^OC-\d{4}-\d{3,}$'
+
+def validate_oc_number(numero):
+    """Valida el formato de número de OC (OC-AAAA-NNN)"""
+    if not numero or not isinstance(numero, str):
+        return False
     
-    if last_number:
-        try:
-            # Extraer el número secuencial
-            seq = int(last_number.split('-')[-1])
-            new_seq = seq + 1
-        except:
-            new_seq = 1
-    else:
-        new_seq = 1
+    return re.fullmatch(OC_NUMERO_REGEX, numero.strip()) is not None
+
+def validate_oc_number_series(numeros):
+    """Versión vectorizada de validate_oc_number: retorna (números limpios, máscara de válidos)"""
+    limpio = numeros.astype('string').str.strip()
+    validos = limpio.str.match(OC_NUMERO_REGEX).fillna(False).astype(bool)
+    return limpio.fillna(''), validos
+
+def generate_oc_number():
+    """Reserva y retorna el siguiente número de OC del año actual"""
+    from modules.database import reservar_numeros_oc
     
-    return f"OC-{year}-{new_seq:03d}"
+    return reservar_numeros_oc(1)[0]
 
 def get_date_range(days=30):
     """Obtiene rango de fechas"""
@@ -98,17 +312,62 @@ def get_date_range(days=30):
     start_date = end_date - timedelta(days=days)
     return start_date, end_date
 
-def export_to_excel(dataframes, sheet_names, filename):
-    """Exporta múltiples DataFrames a un archivo Excel"""
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def _bloques_hoja(datos, chunk_size):
+    """Bloques de una hoja: un DataFrame se corta en `chunk_size` filas; un iterable se recorre tal cual"""
+    if isinstance(datos, pd.DataFrame):
+        for inicio in range(0, max(len(datos), 1), chunk_size):
+            yield datos.iloc[inicio:inicio + chunk_size]
+    else:
+        yield from datos
+
+def export_to_excel(dataframes, sheet_names, chunk_size=EXPORT_CHUNK_SIZE, destino=None, progreso=None):
+    """
+    Exporta varias hojas a un archivo Excel y retorna sus bytes (o escribe en
+    `destino`, un archivo binario abierto, y retorna None).
+    Cada hoja es un DataFrame o un iterable de DataFrames (p. ej. bloques de
+    un cursor). xlsxwriter en modo constant_memory escribe fila por fila y
+    solo retiene la fila en curso: la memoria no crece con el número de filas.
+    `progreso` recibe las filas de datos escritas después de cada bloque.
+    """
     import io
+    import xlsxwriter
     
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        for df, sheet_name in zip(dataframes, sheet_names):
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    output = destino if destino is not None else io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd',
+        'strings_to_urls': False,
+    })
+    encabezado = workbook.add_format({'bold': True})
+    escritas = 0
+    
+    try:
+        for datos, sheet_name in zip(dataframes, sheet_names):
+            worksheet = workbook.add_worksheet(sheet_name[:31])
+            fila = 0
+            for bloque in _bloques_hoja(datos, chunk_size):
+                if fila == 0:
+                    # constant_memory exige escribir en orden: encabezado y anchos antes de los datos
+                    for columna, nombre in enumerate(bloque.columns):
+                        worksheet.set_column(columna, columna, max(len(str(nombre)) + 2, 12))
+                    worksheet.write_row(0, 0, [str(c) for c in bloque.columns], encabezado)
+                    fila = 1
+                
+                # NaN/NaT no son válidos en Excel: se escriben como celdas vacías
+                valores = bloque.astype(object).where(bloque.notna(), None)
+                for registro in valores.itertuples(index=False, name=None):
+                    worksheet.write_row(fila, 0, registro)
+                    fila += 1
+                
+                escritas += len(bloque)
+                if progreso:
+                    progreso(escritas)
+    finally:
+        workbook.close()
     
-    output.seek(0)
-    return output
+    return output.getvalue() if destino is None else None
 
 def show_success_message(message):
     """Muestra mensaje de éxito"""
@@ -140,3 +399,121 @@ def create_download_button(data, filename, label="📥 Descargar"):
     b64 = base64.b64encode(csv).decode()
     href = f'<a href="data:file/csv;base64,{b64}" download="{filename}" style="text-decoration: none;">{label}</a>'
     st.markdown(href, unsafe_allow_html=True)
+
+# ==================== PESTAÑAS DIFERIDAS ====================
+
+# Un solo hilo: la precarga no compite con las sesiones por conexiones del pool
+_precarga_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="precarga")
+_precargas_en_curso = set()
+_precarga_lock = threading.Lock()
+
+def _clave_precarga(carga):
+    """Identifica una carga (función o functools.partial) para no repetirla en paralelo"""
+    func = getattr(carga, 'func', carga)
+    return (func.__module__, func.__name__, getattr(carga, 'args', ()),
+            tuple(sorted(getattr(carga, 'keywords', {}).items())))
+
+def _ejecutar_precarga(clave, carga):
+    try:
+        carga()
+    except Exception:
+        # La precarga es oportunista: si falla, la sección consulta al abrirse
+        pass
+    finally:
+        with _precarga_lock:
+            _precargas_en_curso.discard(clave)
+
+def precargar(*cargas):
+    """
+    Ejecuta en segundo plano funciones de carga cacheadas (cached_query) para
+    que la sección que las usa encuentre sus datos en memoria al abrirse
+    """
+    for carga in cargas:
+        try:
+            clave = _clave_precarga(carga)
+            hash(clave)
+        except (AttributeError, TypeError):
+            continue
+        with _precarga_lock:
+            if clave in _precargas_en_curso:
+                continue
+            _precargas_en_curso.add(clave)
+        _precarga_executor.submit(_ejecutar_precarga, clave, carga)
+
+def lazy_tabs(secciones, key, precargas=None):
+    """
+    Selector de pestañas que solo ejecuta la sección activa.
+    st.tabs ejecuta el código de todas las pestañas en cada rerun; aquí la
+    página compara la etiqueta retornada y renderiza únicamente esa sección.
+    `precargas` asocia etiquetas con sus funciones de carga: se precargan en
+    segundo plano las de la sección siguiente a la activa.
+    """
+    activa = st.radio(
+        "Sección",
+        secciones,
+        horizontal=True,
+        key=key,
+        label_visibility="collapsed"
+    )
+    
+    if precargas:
+        siguiente = secciones[(secciones.index(activa) + 1) % len(secciones)]
+        precargar(*precargas.get(siguiente, ()))
+    
+    return activa
+
+# ==================== TIEMPOS DE RENDER ====================
+
+def get_logger(nombre):
+    """
+    Logger del sistema: escribe en LOG_FILE con el nivel LOG_LEVEL.
+    El archivo se abre con el primer registro emitido, no al importar el módulo.
+    """
+    raiz = logging.getLogger("finanzas")
+    if not raiz.handlers:
+        handler = logging.FileHandler(LOG_FILE, encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        raiz.addHandler(handler)
+        raiz.setLevel(LOG_LEVEL)
+    return raiz.getChild(nombre)
+
+_logger_render = get_logger("render")
+_tiempos_render = {}
+_tiempos_lock = threading.Lock()
+
+def medir_tiempo(nombre):
+    """
+    Registra la duración de cada ejecución de una página o fragmento.
+    Con @st.fragment debe ir debajo del decorador del fragmento para medir
+    también sus reruns parciales.
+    """
+    def decorador(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # También mide las ejecuciones cortadas por st.rerun() o st.stop()
+                ms = (time.perf_counter() - inicio) * 1000
+                with _tiempos_lock:
+                    tiempos = _tiempos_render.setdefault(
+                        nombre, {'ejecuciones': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'ultimo_ms': 0.0}
+                    )
+                    tiempos['ejecuciones'] += 1
+                    tiempos['total_ms'] += ms
+                    tiempos['max_ms'] = max(tiempos['max_ms'], ms)
+                    tiempos['ultimo_ms'] = ms
+                # DEBUG: cada rerun pasa por aquí; con LOG_LEVEL INFO no se escribe nada
+                _logger_render.debug("%s %.1f ms", nombre, ms)
+        return wrapper
+    return decorador
+
+def get_tiempos_render():
+    """Tiempos acumulados por página o fragmento desde que inició el proceso"""
+    with _tiempos_lock:
+        filas = [{'seccion': nombre, **tiempos} for nombre, tiempos in _tiempos_render.items()]
+    
+    df = pd.DataFrame(filas, columns=['seccion', 'ejecuciones', 'total_ms', 'max_ms', 'ultimo_ms'])
+    df['promedio_ms'] = df['total_ms'] / df['ejecuciones']
+    return df.sort_values('seccion', ignore_index=True)
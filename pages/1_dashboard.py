@@ -19,8 +19,14 @@ st.set_page_config(
 
 # Importar módulos
 from modules.auth import check_authentication
-from modules.database import get_estadisticas_generales, get_estadisticas_por_cliente
-from modules.utils import format_currency, calculate_percentage
+from modules.database import (
+    get_estadisticas_generales, get_estadisticas_por_cliente, cached_query,
+    get_version_datos, get_ultima_actualizacion
+)
+from modules.utils import (
+    format_currency, calculate_percentage, format_currency_series, format_percentage_series
+)
+from config import DASHBOARD_REFRESH_SECONDS
 
 # Verificar autenticación
 user = check_authentication()
@@ -182,9 +188,9 @@ st.markdown("""
 
 # ==================== FUNCIONES AUXILIARES ====================
 
-def create_oracle_header():
+def create_oracle_header(actualizado):
     """Crea el header estilo Oracle Mining"""
-    current_time = datetime.now().strftime("%d/%m/%Y • %H:%M")
+    current_time = actualizado.strftime("%d/%m/%Y • %H:%M")
     
     return f'''
     <div class="oracle-header">
@@ -265,7 +271,7 @@ def create_client_usage_chart(clientes_df):
                                                      '#00B8A9' if x >= 50 else '#0066CC'),
             line=dict(color='white', width=1)
         ),
-        text=clientes_df['porcentaje_uso'].apply(lambda x: f'{x:.1f}%'),
+        text=format_percentage_series(clientes_df['porcentaje_uso']),
         textposition='inside',
         textfont=dict(color='white', size=12, weight='bold')
     ))
@@ -356,7 +362,7 @@ def create_availability_chart(clientes_df):
         x=top_clientes['nombre'],
         y=top_clientes['disponible'],
         marker_color='#00B8A9',
-        text=top_clientes['disponible'].apply(lambda x: format_currency(x)),
+        text=format_currency_series(top_clientes['disponible']),
         textposition='auto',
         textfont=dict(color='white', size=11, weight='bold')
     ))
@@ -385,18 +391,59 @@ def create_availability_chart(clientes_df):
     
     return fig
 
+# ==================== FIGURAS CACHEADAS ====================
+# Se reconstruyen solo cuando cambia la generación de datos (escrituras de
+# este proceso o commits de otros procesos detectados por data_version)
+
+@cached_query
+def figura_uso_clientes():
+    return create_client_usage_chart(get_estadisticas_por_cliente())
+
+@cached_query
+def figura_estados():
+    return create_status_distribution_chart(get_estadisticas_generales())
+
+@cached_query
+def figura_disponibilidad():
+    return create_availability_chart(get_estadisticas_por_cliente())
+
+# ==================== AUTO-ACTUALIZACIÓN ====================
+
+def vigilar_cambios():
+    """
+    Fragmento periódico y liviano: solo consulta la versión de los datos que
+    muestra el dashboard y lo relanza cuando cambió. Los commits en tablas
+    auxiliares (respaldos, parámetros) no lo relanzan, y sin cambios no se
+    vuelve a consultar ni a dibujar nada más.
+    """
+    if get_version_datos() != st.session_state.get('dashboard_version'):
+        st.rerun()
+    st.caption(f"🟢 En vivo • revisando cambios cada {DASHBOARD_REFRESH_SECONDS} s")
+
 # ==================== DASHBOARD PRINCIPAL ====================
 
 def show_dashboard():
     """Muestra el dashboard principal"""
     
+    # Versión leída antes de los datos: un cambio posterior relanza la página
+    st.session_state['dashboard_version'] = get_version_datos()
+    
     # Obtener datos
     with st.spinner("Cargando datos..."):
         stats = get_estadisticas_generales()
         clientes_df = get_estadisticas_por_cliente()
     
     # Header estilo Oracle Mining
-    st.markdown(create_oracle_header(), unsafe_allow_html=True)
+    st.markdown(create_oracle_header(get_ultima_actualizacion()), unsafe_allow_html=True)
+    
+    auto_actualizar = st.toggle(
+        "Auto-actualizar",
+        value=True,
+        key="dashboard_auto",
+        help="Refresca métricas y gráficos solo cuando se registran OCs, autorizaciones o cambios de cupo"
+    )
+    if auto_actualizar:
+        st.fragment(run_every=DASHBOARD_REFRESH_SECONDS)(vigilar_cambios)()
     
     # ========== SECCIÓN 1: MÉTRICAS PRINCIPALES ==========
     st.markdown("### 📈 MÉTRICAS CLAVE")
@@ -476,17 +523,17 @@ def show_dashboard():
     with col1:
         # Gráfico de uso por cliente
         if not clientes_df.empty:
-            fig_uso = create_client_usage_chart(clientes_df)
+            fig_uso = figura_uso_clientes()
             st.plotly_chart(fig_uso, use_container_width=True)
     
     with col2:
         # Gráfico de distribución de estados
-        fig_estados = create_status_distribution_chart(stats)
+        fig_estados = figura_estados()
         st.plotly_chart(fig_estados, use_container_width=True)
     
     # Gráfico de disponibilidad
     if not clientes_df.empty:
-        fig_disponible = create_availability_chart(clientes_df)
+        fig_disponible = figura_disponibilidad()
         st.plotly_chart(fig_disponible, use_container_width=True)
     
     st.markdown("---")
@@ -533,7 +580,7 @@ def show_dashboard():
         st.caption(f"🏢 Sistema: Tododrogas Gestión de Cupos")
     
     with col3:
-        st.caption(f"🕐 Última actualización: {datetime.now().strftime('%H:%M')}")
+        st.caption(f"🕐 Última actualización: {get_ultima_actualizacion().strftime('%H:%M:%S')}")
 
 # ==================== EJECUCIÓN ====================
 
@@ -15,8 +15,14 @@ st.set_page_config(
 
 # Importar módulos
 from modules.auth import check_authentication
-from modules.database import get_clientes, actualizar_cupo_cliente
-from modules.utils import format_currency, format_number, get_status_badge
+from modules.database import (
+    get_clientes, get_clientes_page, get_clientes_resumen, actualizar_cupo_cliente
+)
+from modules.utils import (
+    format_currency, format_number, get_status_badge, medir_tiempo, style_montos,
+    export_to_excel, EXCEL_MIME
+)
+from modules.importer import importar_cartera
 
 # Verificar autenticación
 user = check_authentication()
@@ -255,6 +261,16 @@ function viewOCs(nit) {
 
 # ==================== FUNCIONES AUXILIARES ====================
 
+# Opciones de orden: (columna, descendente)
+ORDENES_CLIENTES = {
+    "Nombre (A-Z)": ('nombre', False),
+    "Nombre (Z-A)": ('nombre', True),
+    "% Uso (↑)": ('porcentaje_uso', False),
+    "% Uso (↓)": ('porcentaje_uso', True),
+    "Cupo (↑)": ('cupo_sugerido', False),
+    "Cupo (↓)": ('cupo_sugerido', True),
+}
+
 def get_color_by_percentage(percentage):
     """Obtiene color basado en porcentaje de uso"""
     if percentage >= 100:
@@ -327,13 +343,13 @@ def create_client_card(cliente):
     </div>
     '''
 
-def create_stats_summary(clientes_df):
+def create_stats_summary(resumen):
     """Crea resumen estadístico"""
     
-    total_cupo = clientes_df['cupo_sugerido'].sum()
-    total_en_uso = clientes_df['saldo_actual'].sum()
-    total_disponible = clientes_df['disponible'].sum()
-    porcentaje_promedio = clientes_df['porcentaje_uso'].mean()
+    total_cupo = resumen['cupo_total']
+    total_en_uso = resumen['saldo_actual']
+    total_disponible = resumen['disponible_total']
+    porcentaje_promedio = resumen['porcentaje_promedio']
     
     return f'''
     <div class="stats-summary">
@@ -361,19 +377,10 @@ def create_stats_summary(clientes_df):
 
 # ==================== PÁGINA PRINCIPAL ====================
 
-def show_clients_page():
-    """Muestra la página de gestión de clientes"""
-    
-    st.title("👥 GESTIÓN DE CLIENTES")
-    st.markdown("Tabla completa de clientes con control de cupos")
-    
-    # Obtener datos
-    with st.spinner("Cargando clientes..."):
-        clientes_df = get_clientes()
-    
-    if clientes_df.empty:
-        st.warning("No hay clientes registrados en el sistema.")
-        return
+@st.fragment
+@medir_tiempo("clientes.listado")
+def listado_clientes():
+    """Filtros, resumen, paginación y tabla de clientes como fragmento aislado"""
     
     # ========== FILTROS Y BÚSQUEDA ==========
     st.markdown('<div class="filter-section">', unsafe_allow_html=True)
@@ -392,7 +399,7 @@ def show_clients_page():
     with col3:
         sort_by = st.selectbox(
             "Ordenar por",
-            ["Nombre (A-Z)", "Nombre (Z-A)", "% Uso (↑)", "% Uso (↓)", "Cupo (↑)", "Cupo (↓)"]
+            list(ORDENES_CLIENTES)
         )
     
     with col4:
@@ -404,65 +411,73 @@ def show_clients_page():
     
     st.markdown('</div>', unsafe_allow_html=True)
     
+    busqueda = search_term.strip() or None
+    estado = estado_filter if estado_filter != "TODOS" else None
+    orden, descendente = ORDENES_CLIENTES[sort_by]
+    
     # ========== RESUMEN ESTADÍSTICO ==========
-    st.markdown(create_stats_summary(clientes_df), unsafe_allow_html=True)
-    
-    # ========== APLICAR FILTROS ==========
-    filtered_df = clientes_df.copy()
-    
-    # Búsqueda por término
-    if search_term:
-        filtered_df = filtered_df[
-            filtered_df['nombre'].str.contains(search_term, case=False) |
-            filtered_df['nit'].str.contains(search_term, case=False)
-        ]
-    
-    # Filtro por estado
-    if estado_filter != "TODOS":
-        if estado_filter == "NORMAL":
-            filtered_df = filtered_df[filtered_df['porcentaje_uso'] < 90]
-        elif estado_filter == "ALERTA":
-            filtered_df = filtered_df[(filtered_df['porcentaje_uso'] >= 90) & (filtered_df['porcentaje_uso'] < 100)]
-        elif estado_filter == "SOBREPASADO":
-            filtered_df = filtered_df[filtered_df['porcentaje_uso'] >= 100]
-    
-    # Ordenar
-    if sort_by == "Nombre (A-Z)":
-        filtered_df = filtered_df.sort_values('nombre')
-    elif sort_by == "Nombre (Z-A)":
-        filtered_df = filtered_df.sort_values('nombre', ascending=False)
-    elif sort_by == "% Uso (↑)":
-        filtered_df = filtered_df.sort_values('porcentaje_uso')
-    elif sort_by == "% Uso (↓)":
-        filtered_df = filtered_df.sort_values('porcentaje_uso', ascending=False)
-    elif sort_by == "Cupo (↑)":
-        filtered_df = filtered_df.sort_values('cupo_sugerido')
-    elif sort_by == "Cupo (↓)":
-        filtered_df = filtered_df.sort_values('cupo_sugerido', ascending=False)
+    # Totales calculados en SQLite: la página no necesita traer todos los clientes
+    resumen = get_clientes_resumen(busqueda=busqueda, estado=estado)
+    
+    if resumen['total_clientes'] == 0 and not (busqueda or estado):
+        st.warning("No hay clientes registrados en el sistema.")
+        return
+    
+    st.markdown(create_stats_summary(resumen), unsafe_allow_html=True)
     
     # ========== PAGINACIÓN ==========
-    total_clientes = len(filtered_df)
-    total_pages = (total_clientes // items_per_page) + (1 if total_clientes % items_per_page > 0 else 0)
+    # Pila de cursores: el inicio de cada página visitada. Cambiar filtros u orden la reinicia.
+    consulta = (busqueda, estado, orden, descendente, items_per_page)
+    if st.session_state.get('clientes_consulta') != consulta:
+        st.session_state['clientes_consulta'] = consulta
+        st.session_state['clientes_cursores'] = [None]
+    cursores = st.session_state['clientes_cursores']
     
-    if total_pages > 1:
-        page_number = st.number_input(
-            "Página",
-            min_value=1,
-            max_value=total_pages,
-            value=1,
-            step=1
+    with st.spinner("Cargando clientes..."):
+        page_df, siguiente = get_clientes_page(
+            orden=orden,
+            descendente=descendente,
+            limite=items_per_page,
+            cursor=cursores[-1],
+            busqueda=busqueda,
+            estado=estado
         )
-        
+    
+    total_clientes = resumen['total_clientes']
+    total_pages = max(1, -(-total_clientes // items_per_page))
+    page_number = len(cursores)
+    
+    if total_pages > 1:
         start_idx = (page_number - 1) * items_per_page
-        end_idx = start_idx + items_per_page
-        page_df = filtered_df.iloc[start_idx:end_idx]
+        col_prev, col_info, col_next = st.columns([1, 3, 1])
         
-        st.caption(f"Mostrando clientes {start_idx + 1}-{min(end_idx, total_clientes)} de {total_clientes}")
-    else:
-        page_df = filtered_df
+        with col_prev:
+            st.button(
+                "⬅️ Anterior",
+                disabled=page_number == 1,
+                on_click=cursores.pop,
+                use_container_width=True,
+                key="clientes_anterior"
+            )
+        
+        with col_info:
+            st.caption(
+                f"Página {page_number} de {total_pages} • "
+                f"Mostrando clientes {start_idx + 1}-{start_idx + len(page_df)} de {total_clientes}"
+            )
+        
+        with col_next:
+            st.button(
+                "Siguiente ➡️",
+                disabled=siguiente is None,
+                on_click=cursores.append,
+                args=(siguiente,),
+                use_container_width=True,
+                key="clientes_siguiente"
+            )
     
     # ========== TABLA DE CLIENTES ==========
-    st.markdown(f"### 📋 CLIENTES ({len(filtered_df)})")
+    st.markdown(f"### 📋 CLIENTES ({total_clientes})")
     
     # Opción de vista: Tarjetas o Tabla
     view_mode = st.radio(
@@ -477,24 +492,22 @@ def show_clients_page():
         for _, cliente in page_df.iterrows():
             st.markdown(create_client_card(cliente), unsafe_allow_html=True)
     else:
-        # Mostrar como tabla usando st.dataframe (mejor para Streamlit)
-        display_df = page_df.copy()
-        display_df['Cupo Asignado'] = display_df['cupo_sugerido'].apply(format_currency)
-        display_df['En Uso'] = display_df['saldo_actual'].apply(format_currency)
-        display_df['Disponible'] = display_df['disponible'].apply(format_currency)
-        display_df['% Uso'] = display_df['porcentaje_uso'].apply(lambda x: f"{x:.1f}%")
-        
+        # Mostrar como tabla: el Styler formatea al renderizar, sin copiar la página
         st.dataframe(
-            display_df[['nombre', 'nit', 'Cupo Asignado', 'En Uso', 'Disponible', '% Uso']],
+            style_montos(
+                page_df[['nombre', 'nit', 'cupo_sugerido', 'saldo_actual', 'disponible', 'porcentaje_uso']],
+                monedas=['cupo_sugerido', 'saldo_actual', 'disponible'],
+                porcentajes=['porcentaje_uso']
+            ),
             use_container_width=True,
             hide_index=True,
             column_config={
                 "nombre": st.column_config.TextColumn("Cliente", width="large"),
                 "nit": st.column_config.TextColumn("NIT", width="medium"),
-                "Cupo Asignado": st.column_config.TextColumn("Cupo", width="medium"),
-                "En Uso": st.column_config.TextColumn("En Uso", width="medium"),
-                "Disponible": st.column_config.TextColumn("Disponible", width="medium"),
-                "% Uso": st.column_config.TextColumn("% Uso", width="small")
+                "cupo_sugerido": st.column_config.Column("Cupo", width="medium"),
+                "saldo_actual": st.column_config.Column("En Uso", width="medium"),
+                "disponible": st.column_config.Column("Disponible", width="medium"),
+                "porcentaje_uso": st.column_config.Column("% Uso", width="small")
             }
         )
     
@@ -507,18 +520,18 @@ def show_clients_page():
     with col1:
         if st.button("📤 Exportar a Excel", use_container_width=True):
             try:
-                # Crear archivo Excel
-                output = pd.ExcelWriter('clientes_export.xlsx', engine='xlsxwriter')
-                filtered_df.to_excel(output, index=False, sheet_name='Clientes')
-                output.close()
+                # La exportación sí necesita todos los clientes filtrados
+                export_df = get_clientes(busqueda=busqueda, estado=estado).sort_values(
+                    [orden, 'nit'], ascending=not descendente
+                )
                 
-                with open('clientes_export.xlsx', 'rb') as f:
-                    st.download_button(
-                        label="⬇️ Descargar Excel",
-                        data=f,
-                        file_name="clientes_tododrogas.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
+                # Excel en memoria: cada sesión descarga su propio archivo
+                st.download_button(
+                    label="⬇️ Descargar Excel",
+                    data=export_to_excel([export_df], ['Clientes']),
+                    file_name="clientes_tododrogas.xlsx",
+                    mime=EXCEL_MIME
+                )
             except Exception as e:
                 st.error(f"❌ Error al exportar: {str(e)}")
     
@@ -530,6 +543,64 @@ def show_clients_page():
         if st.button("📊 Ver análisis", use_container_width=True):
             st.switch_page("pages/4_reportes.py")
 
+@medir_tiempo("clientes.pagina")
+def show_clients_page():
+    """Muestra la página de gestión de clientes"""
+    
+    st.title("👥 GESTIÓN DE CLIENTES")
+    st.markdown("Tabla completa de clientes con control de cupos")
+    
+    # Filtros, paginación y tabla se vuelven a ejecutar sin recorrer el resto de la página
+    listado_clientes()
+    
+    # ========== IMPORTAR CARTERA DEL ERP ==========
+    st.markdown("---")
+    st.markdown("### 📥 IMPORTAR CARTERA ERP")
+    
+    with st.expander("Cargar archivo de antigüedad de cartera (CSV o XLSX)"):
+        st.caption("Columnas requeridas: NIT y total de cartera (Saldo). Opcional: nombre del cliente.")
+        
+        archivo_cartera = st.file_uploader(
+            "Archivo del ERP",
+            type=["csv", "xlsx"],
+            key="archivo_cartera"
+        )
+        
+        if archivo_cartera is not None and st.button("🚀 Importar cartera", type="primary", use_container_width=True):
+            barra = st.progress(0.0, text="Importando cartera...")
+            tamano = max(archivo_cartera.size, 1)
+            
+            def actualizar_progreso(filas_leidas):
+                # Avance aproximado por bytes consumidos del archivo
+                avance = min(archivo_cartera.tell() / tamano, 1.0)
+                barra.progress(avance, text=f"Importando cartera... {format_number(filas_leidas)} filas")
+            
+            try:
+                stats_import, rechazos = importar_cartera(
+                    archivo_cartera,
+                    archivo_cartera.name,
+                    progreso=actualizar_progreso
+                )
+                barra.progress(1.0, text="Importación finalizada")
+                
+                col_imp1, col_imp2, col_imp3, col_imp4 = st.columns(4)
+                with col_imp1:
+                    st.metric("Filas leídas", format_number(stats_import['filas_leidas']))
+                with col_imp2:
+                    st.metric("Importadas", format_number(stats_import['filas_importadas']))
+                with col_imp3:
+                    st.metric("Rechazadas", format_number(stats_import['filas_rechazadas']))
+                with col_imp4:
+                    st.metric("Filas/s", format_number(stats_import['filas_por_segundo']))
+                
+                st.success(f"✅ Cartera importada en {stats_import['segundos']:.1f} s")
+                
+                if not rechazos.empty:
+                    st.warning(f"⚠️ {format_number(stats_import['filas_rechazadas'])} filas rechazadas (muestra)")
+                    st.dataframe(rechazos, use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.error(f"❌ Error al importar cartera: {str(e)}")
+
 # ==================== EJECUCIÓN ====================
 
 if __name__ == "__main__":
@@ -7,7 +7,6 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime
-import time
 import numpy as np
 
 # Configuración de página
@@ -20,12 +19,16 @@ st.set_page_config(
 # Importar módulos
 from modules.auth import check_authentication
 from modules.database import (
-    get_ocs, crear_oc, autorizar_oc, 
-    get_autorizaciones_oc, get_clientes
+    get_ocs, get_ocs_abiertas, get_ocs_page, get_ocs_resumen, crear_oc, autorizar_oc, 
+    get_autorizaciones_oc, get_clientes_opciones, get_cliente_exposicion,
+    autorizar_ocs_batch, ConflictoConcurrencia
 )
+from modules.optimizer import POLITICAS_OPTIMIZADOR, sugerir_autorizaciones
+from modules.importer import preparar_importacion_ocs, importar_ocs
 from modules.utils import (
     format_currency, validate_oc_number,
-    get_oc_status_badge, format_number
+    get_oc_status_badge, format_number, lazy_tabs, medir_tiempo,
+    format_currency_series, style_montos
 )
 
 # Verificar autenticación
@@ -178,6 +181,8 @@ st.markdown("""
 
 # ==================== FUNCIONES AUXILIARES ====================
 
+OCS_POR_PAGINA = 50
+
 def create_oc_card(oc):
     """Crea una tarjeta de OC"""
     
@@ -230,28 +235,509 @@ def create_oc_card(oc):
     '''
 
 def calculate_impact(cliente_nit, valor_oc):
-    """Calcula el impacto de una OC en el cupo disponible"""
-    clientes_df = get_clientes()
-    cliente = clientes_df[clientes_df['nit'] == cliente_nit]
+    """
+    Calcula el impacto de una OC en el cupo disponible.
+    Descuenta también las OCs pendientes del cliente: ya son exposición comprometida.
+    """
+    cliente = get_cliente_exposicion(cliente_nit)
     
-    if cliente.empty:
+    if cliente is None:
         return None
     
-    cliente = cliente.iloc[0]
     disponible_actual = cliente['disponible']
-    nuevo_disponible = disponible_actual - valor_oc
+    nuevo_disponible = cliente['disponible_comprometido'] - valor_oc
     porcentaje_impacto = (valor_oc / cliente['cupo_sugerido'] * 100) if cliente['cupo_sugerido'] > 0 else 0
     
     return {
         'cliente': cliente['nombre'],
         'disponible_actual': disponible_actual,
+        'pendiente_ocs': cliente['total_pendiente'],
+        'ocs_pendientes': cliente['ocs_pendientes'],
         'nuevo_disponible': nuevo_disponible,
         'porcentaje_impacto': porcentaje_impacto,
         'sobrepasa_cupo': nuevo_disponible < 0
     }
 
+# ==================== AUTORIZACIÓN (FRAGMENTO) ====================
+
+PORCENTAJES_RAPIDOS = (25, 50, 75, 100)
+
+MODOS_AUTORIZACION = ["Individual", "Por lote"]
+
+def _aplicar_porcentaje(clave, valor_pendiente, porcentaje):
+    """Callback de los porcentajes rápidos: fija el valor antes del rerun del fragmento"""
+    st.session_state[clave] = float(valor_pendiente) * porcentaje / 100
+
+def _mostrar_reporte_lote(reporte):
+    """Resultado por OC de la última autorización por lote"""
+    aprobadas = reporte[reporte['resultado'] != 'RECHAZADA']
+    rechazadas = reporte[reporte['resultado'] == 'RECHAZADA']
+    
+    if not aprobadas.empty:
+        st.success(
+            f"✅ {len(aprobadas)} OCs autorizadas por {format_currency(aprobadas['valor_autorizado'].sum())}"
+        )
+    if not rechazadas.empty:
+        st.warning(f"⚠️ {len(rechazadas)} OCs rechazadas")
+    
+    st.dataframe(
+        style_montos(reporte, monedas=['valor_autorizado', 'valor_pendiente']),
+        column_config={
+            "oc_numero": st.column_config.Column("Número OC"),
+            "cliente_nit": st.column_config.Column("NIT"),
+            "valor_autorizado": st.column_config.Column("Autorizado"),
+            "valor_pendiente": st.column_config.Column("Pendiente"),
+            "resultado": st.column_config.Column("Resultado"),
+            "detalle": st.column_config.Column("Detalle"),
+        },
+        column_order=['oc_numero', 'cliente_nit', 'valor_autorizado', 'valor_pendiente', 'resultado', 'detalle'],
+        use_container_width=True,
+        hide_index=True
+    )
+
+def autorizacion_por_lote(ocs_pendientes):
+    """
+    Autorización de varias OCs en una sola operación. El cupo de cada cliente
+    se valida al escribir descontando lo aprobado en el mismo lote.
+    """
+    reporte = st.session_state.pop('autorizar_lote_reporte', None)
+    if reporte is not None:
+        _mostrar_reporte_lote(reporte)
+        st.markdown("---")
+    
+    col_pol, col_par = st.columns([2, 1])
+    with col_pol:
+        politica = st.selectbox(
+            "Selección",
+            ['manual'] + list(POLITICAS_OPTIMIZADOR),
+            format_func=lambda p: POLITICAS_OPTIMIZADOR.get(p, "Manual"),
+            help="Las políticas sugieren qué OCs autorizar dentro del cupo disponible de cada cliente",
+            key="autorizar_lote_politica"
+        )
+    with col_par:
+        parciales = st.checkbox(
+            "Permitir parciales",
+            value=True,
+            disabled=politica == 'manual',
+            key="autorizar_lote_parciales"
+        )
+    
+    columnas = ['id', 'version', 'numero_oc', 'cliente_nit', 'cliente_nombre', 'valor_pendiente']
+    if politica == 'manual':
+        todas = st.checkbox("Seleccionar todas", key="autorizar_lote_todas")
+        tabla = ocs_pendientes[columnas].copy()
+        tabla.insert(0, 'autorizar', todas)
+        tabla['valor_autorizar'] = tabla['valor_pendiente'].astype(float)
+    else:
+        # Sugerencia en orden de prioridad; el usuario puede ajustarla antes de confirmar
+        sugerencia = sugerir_autorizaciones(politica, parciales)
+        tabla = sugerencia[columnas].copy()
+        tabla.insert(0, 'autorizar', sugerencia['valor_sugerido'] > 0)
+        tabla['valor_autorizar'] = sugerencia['valor_sugerido'].astype(float)
+    
+    # La clave cambia tras cada lote para descartar la selección anterior
+    editado = st.data_editor(
+        tabla,
+        column_config={
+            "autorizar": st.column_config.CheckboxColumn("Autorizar"),
+            "numero_oc": st.column_config.Column("Número OC"),
+            "cliente_nombre": st.column_config.Column("Cliente"),
+            "valor_pendiente": st.column_config.NumberColumn("Pendiente", format="$%d"),
+            "valor_autorizar": st.column_config.NumberColumn("Valor a autorizar", min_value=0, format="$%d"),
+        },
+        column_order=['autorizar', 'numero_oc', 'cliente_nombre', 'valor_pendiente', 'valor_autorizar'],
+        disabled=['numero_oc', 'cliente_nombre', 'valor_pendiente'],
+        use_container_width=True,
+        hide_index=True,
+        key=f"autorizar_lote_{st.session_state.get('autorizar_lote_n', 0)}_{politica}_{parciales}"
+    )
+    seleccion = editado[editado['autorizar'] & (editado['valor_autorizar'] > 0)]
+    
+    if seleccion.empty:
+        st.info("Seleccione las OCs a autorizar")
+        return
+    
+    # Vista previa del cupo por cliente con los totales del lote
+    por_cliente = seleccion.groupby(['cliente_nit', 'cliente_nombre'], as_index=False).agg(
+        ocs=('id', 'count'), total_lote=('valor_autorizar', 'sum')
+    )
+    exposiciones = [get_cliente_exposicion(nit) for nit in por_cliente['cliente_nit']]
+    # Sin tope (cliente excluido del cálculo): el disponible queda vacío y nunca se excede
+    por_cliente['disponible'] = [
+        info['disponible'] if info is not None and not info['excluir_calculo'] else np.nan
+        for info in exposiciones
+    ]
+    excedidos = por_cliente[por_cliente['total_lote'] > por_cliente['disponible']]
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("OCs seleccionadas", format_number(len(seleccion)))
+    with col2:
+        st.metric("Total a autorizar", format_currency(seleccion['valor_autorizar'].sum()))
+    
+    with st.expander(f"Cupo por cliente ({len(por_cliente)})", expanded=not excedidos.empty):
+        st.dataframe(
+            style_montos(por_cliente, monedas=['total_lote', 'disponible']),
+            column_config={
+                "cliente_nombre": st.column_config.Column("Cliente"),
+                "ocs": st.column_config.Column("OCs"),
+                "total_lote": st.column_config.Column("Total del lote"),
+                "disponible": st.column_config.Column("Disponible"),
+            },
+            column_order=['cliente_nombre', 'ocs', 'total_lote', 'disponible'],
+            use_container_width=True,
+            hide_index=True
+        )
+    
+    permitir_sobrecupo = False
+    if not excedidos.empty:
+        st.warning(
+            f"⚠️ {len(excedidos)} clientes superan su cupo disponible con este lote. "
+            "Sus últimas OCs se rechazarán salvo que autorice por encima del cupo"
+        )
+        permitir_sobrecupo = st.checkbox(
+            "Autorizar por encima del cupo disponible",
+            key="autorizar_lote_sobrecupo"
+        )
+    
+    comentario = st.text_area(
+        "Comentario de autorización (opcional)",
+        placeholder="Ej: Cierre de mes...",
+        height=80,
+        key="autorizar_lote_comentario"
+    )
+    
+    if st.button(
+        f"✅ AUTORIZAR {len(seleccion)} OCs",
+        type="primary",
+        use_container_width=True,
+        key="autorizar_lote_confirmar"
+    ):
+        try:
+            reporte = autorizar_ocs_batch(
+                list(zip(seleccion['id'], seleccion['valor_autorizar'], seleccion['version'])),
+                comentario=comentario.strip(),
+                usuario=user['nombre'],
+                permitir_sobrecupo=permitir_sobrecupo
+            )
+        except Exception as e:
+            st.error(f"❌ Error al autorizar el lote: {str(e)}")
+            return
+        
+        st.session_state['autorizar_lote_reporte'] = reporte
+        st.session_state['autorizar_lote_n'] = st.session_state.get('autorizar_lote_n', 0) + 1
+        st.session_state.pop('autorizar_lote_todas', None)
+        # Solo se vuelve a ejecutar el fragmento: las demás secciones leen los datos al abrirse
+        st.rerun(scope="fragment")
+
+@st.fragment
+@medir_tiempo("ocs.autorizacion")
+def seccion_autorizacion():
+    """
+    Selección y autorización de OCs. Los porcentajes rápidos y el cambio de
+    OC o de tipo de autorización solo vuelven a ejecutar este fragmento.
+    """
+    # Solo las OCs pendientes o parciales, filtradas en la consulta
+    ocs_pendientes = get_ocs_abiertas()
+    
+    if ocs_pendientes.empty:
+        if 'autorizar_lote_reporte' in st.session_state:
+            _mostrar_reporte_lote(st.session_state.pop('autorizar_lote_reporte'))
+        st.info("🎉 ¡No hay OCs pendientes de autorización!")
+        return
+    
+    modo = st.radio(
+        "Modo de autorización",
+        MODOS_AUTORIZACION,
+        horizontal=True,
+        key="autorizar_modo"
+    )
+    if modo == "Por lote":
+        autorizacion_por_lote(ocs_pendientes)
+        return
+    
+    # Seleccionar OC para autorizar
+    etiquetas = (
+        ocs_pendientes['numero_oc'] + " - " + ocs_pendientes['cliente_nombre'].fillna('') + " - "
+        + format_currency_series(ocs_pendientes['valor_pendiente']) + " pendiente"
+    )
+    oc_options = dict(zip(ocs_pendientes['id'].tolist(), etiquetas.tolist()))
+    
+    selected_oc_id = st.selectbox(
+        "Seleccionar OC para autorizar",
+        options=list(oc_options),
+        format_func=oc_options.get
+    )
+    
+    if not selected_oc_id:
+        return
+    
+    oc_seleccionada = ocs_pendientes[ocs_pendientes['id'] == selected_oc_id].iloc[0]
+    valor_pendiente = oc_seleccionada['valor_pendiente']
+    clave_valor = f"autorizar_valor_{selected_oc_id}"
+    
+    st.markdown('<div class="form-section">', unsafe_allow_html=True)
+    
+    st.markdown(f"""
+    ### OC: {oc_seleccionada['numero_oc']}
+    **Cliente:** {oc_seleccionada['cliente_nombre']}
+    """)
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.metric(
+            "Valor Total",
+            format_currency(oc_seleccionada['valor_total'])
+        )
+        
+        st.metric(
+            "Ya Autorizado",
+            format_currency(oc_seleccionada['valor_autorizado'])
+        )
+    
+    with col2:
+        st.metric(
+            "Pendiente",
+            format_currency(valor_pendiente)
+        )
+        
+        porcentaje_autorizado = (oc_seleccionada['valor_autorizado'] / oc_seleccionada['valor_total'] * 100) if oc_seleccionada['valor_total'] > 0 else 0
+        st.metric(
+            "% Autorizado",
+            f"{porcentaje_autorizado:.1f}%"
+        )
+    
+    # Cupo del cliente: autorizar consume disponible (la validación final ocurre al escribir)
+    cliente_info = get_cliente_exposicion(oc_seleccionada['cliente_nit'])
+    controla_cupo = cliente_info is not None and not cliente_info['excluir_calculo']
+    if controla_cupo:
+        st.caption(f"Cupo disponible del cliente: {format_currency(cliente_info['disponible'])}")
+    
+    st.markdown("---")
+    
+    # Tipo de autorización
+    tipo_autorizacion = st.radio(
+        "Tipo de autorización",
+        ["AUTORIZACIÓN TOTAL", "AUTORIZACIÓN PARCIAL"],
+        horizontal=True
+    )
+    
+    # Valor a autorizar
+    if tipo_autorizacion == "AUTORIZACIÓN TOTAL":
+        valor_autorizar = valor_pendiente
+        st.info(f"Se autorizará el valor pendiente completo: {format_currency(valor_pendiente)}")
+    else:
+        st.session_state.setdefault(clave_valor, float(valor_pendiente))
+        valor_autorizar = st.number_input(
+            "Valor a autorizar",
+            min_value=0.0,
+            max_value=float(valor_pendiente),
+            step=1000000.0,
+            format="%.0f",
+            key=clave_valor
+        )
+        
+        # Botones de porcentaje rápido: el callback fija el valor sin st.rerun()
+        st.write("**Porcentajes rápidos:**")
+        for columna, porcentaje in zip(st.columns(len(PORCENTAJES_RAPIDOS)), PORCENTAJES_RAPIDOS):
+            with columna:
+                st.button(
+                    f"{porcentaje}%",
+                    use_container_width=True,
+                    key=f"autorizar_pct_{porcentaje}",
+                    on_click=_aplicar_porcentaje,
+                    args=(clave_valor, valor_pendiente, porcentaje)
+                )
+    
+    permitir_sobrecupo = False
+    if controla_cupo and valor_autorizar > cliente_info['disponible']:
+        st.warning(
+            f"⚠️ El valor supera el cupo disponible del cliente ({format_currency(cliente_info['disponible'])})"
+        )
+        permitir_sobrecupo = st.checkbox(
+            "Autorizar por encima del cupo disponible",
+            key=f"autorizar_sobrecupo_{selected_oc_id}"
+        )
+    
+    # Comentario de autorización
+    comentario_autorizacion = st.text_area(
+        "Comentario de autorización (opcional)",
+        placeholder="Ej: Autorización por aprobación de gerencia...",
+        height=80,
+        key=f"autorizar_comentario_{selected_oc_id}"
+    )
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    
+    # Botones de confirmación
+    col_conf1, col_conf2 = st.columns(2)
+    
+    with col_conf1:
+        confirmar = st.button(
+            "✅ CONFIRMAR AUTORIZACIÓN",
+            type="primary",
+            use_container_width=True
+        )
+    
+    with col_conf2:
+        cancelar = st.button(
+            "❌ CANCELAR",
+            use_container_width=True
+        )
+    
+    if confirmar:
+        if valor_autorizar <= 0:
+            st.error("❌ El valor a autorizar debe ser mayor a 0")
+        else:
+            try:
+                autorizar_oc(
+                    oc_id=selected_oc_id,
+                    valor_autorizado=valor_autorizar,
+                    comentario=comentario_autorizacion.strip(),
+                    usuario=user['nombre'],
+                    # La OC debe seguir como el usuario la vio: si otra sesión la autorizó, se rechaza
+                    version_esperada=int(oc_seleccionada['version']),
+                    permitir_sobrecupo=permitir_sobrecupo
+                )
+            except ConflictoConcurrencia as e:
+                # Los listados ya reflejan el cambio de la otra sesión en el siguiente rerun
+                st.warning(f"⚠️ {str(e)}")
+            
+            except Exception as e:
+                st.error(f"❌ Error al autorizar: {str(e)}")
+            
+            else:
+                # El toast sobrevive al rerun del fragmento, que recarga la lista de pendientes
+                st.toast(f"Autorizados {format_currency(valor_autorizar)} de la OC {oc_seleccionada['numero_oc']}", icon="✅")
+                st.session_state.pop(clave_valor, None)
+                st.rerun(scope="fragment")
+    
+    if cancelar:
+        st.session_state.pop(clave_valor, None)
+        st.rerun(scope="fragment")
+
+# ==================== IMPORTACIÓN (FRAGMENTO) ====================
+
+def _mostrar_validacion_importacion(rechazados, impacto, stats):
+    """Resultado de validar el archivo: totales, impacto por cliente y rechazos"""
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Filas leídas", format_number(stats['filas_leidas']))
+    with col2:
+        st.metric("OCs válidas", format_number(stats['filas_validas']))
+    with col3:
+        st.metric("Rechazadas", format_number(stats['filas_rechazadas']))
+    with col4:
+        st.metric("Valor a registrar", format_currency(stats['valor_total']))
+    st.caption(
+        f"Validación en {stats['segundos']:.2f} s ({format_number(stats['filas_por_segundo'])} filas/s)"
+    )
+    
+    if not impacto.empty:
+        sobrepasados = int(impacto['sobrepasa_cupo'].sum())
+        if sobrepasados:
+            st.warning(f"⚠️ {sobrepasados} clientes superarían su cupo disponible con esta carga")
+        
+        st.markdown("**Impacto en cupo por cliente:**")
+        st.dataframe(
+            style_montos(impacto, monedas=['total_importado', 'disponible_comprometido', 'nuevo_disponible']),
+            column_config={
+                "nombre": st.column_config.Column("Cliente"),
+                "ocs": st.column_config.Column("OCs"),
+                "total_importado": st.column_config.Column("Total importado"),
+                "disponible_comprometido": st.column_config.Column("Disponible (con OCs pendientes)"),
+                "nuevo_disponible": st.column_config.Column("Nuevo disponible"),
+                "sobrepasa_cupo": st.column_config.CheckboxColumn("Sobrepasa cupo"),
+            },
+            column_order=['nombre', 'ocs', 'total_importado', 'disponible_comprometido', 'nuevo_disponible', 'sobrepasa_cupo'],
+            use_container_width=True,
+            hide_index=True
+        )
+    
+    if not rechazados.empty:
+        st.markdown(f"**Filas rechazadas** (muestra de {format_number(len(rechazados))}):")
+        st.dataframe(rechazados, use_container_width=True, hide_index=True)
+
+@st.fragment
+@medir_tiempo("ocs.importacion")
+def importacion_ocs():
+    """
+    Importación masiva de OCs en dos pasos: validar (sin escribir) y confirmar.
+    Solo este fragmento se vuelve a ejecutar durante la carga.
+    """
+    st.caption(
+        "Columnas requeridas: NIT y valor. Opcionales: número (vacío = automático), "
+        "fecha, tipo, cupo de referencia y descripción."
+    )
+    
+    archivo = st.file_uploader("Archivo de OCs", type=["csv", "xlsx"], key="archivo_ocs")
+    if archivo is None:
+        st.session_state.pop('importacion_ocs', None)
+        return
+    
+    # La validación se conserva mientras no cambie el archivo
+    validacion = st.session_state.get('importacion_ocs')
+    if validacion is not None and validacion['archivo'] != archivo.file_id:
+        validacion = None
+    
+    if validacion is None and st.button("🔍 Validar archivo", use_container_width=True, key="importar_ocs_validar"):
+        try:
+            with st.spinner("Validando OCs..."):
+                rechazados, impacto, stats = preparar_importacion_ocs(archivo, archivo.name)
+        except Exception as e:
+            st.error(f"❌ Error al leer el archivo: {str(e)}")
+            return
+        validacion = {
+            'archivo': archivo.file_id, 'rechazados': rechazados, 'impacto': impacto, 'stats': stats,
+        }
+        st.session_state['importacion_ocs'] = validacion
+    
+    if validacion is None:
+        return
+    
+    _mostrar_validacion_importacion(validacion['rechazados'], validacion['impacto'], validacion['stats'])
+    
+    validas = validacion['stats']['filas_validas']
+    if not validas:
+        st.info("El archivo no tiene OCs válidas para registrar")
+        return
+    
+    if st.button(
+        f"🚀 Registrar {format_number(validas)} OCs",
+        type="primary",
+        use_container_width=True,
+        key="importar_ocs_confirmar"
+    ):
+        barra = st.progress(0.0, text="Registrando OCs...")
+        
+        def actualizar_progreso(procesadas):
+            barra.progress(min(procesadas / validas, 1.0), text=f"Registrando OCs... {format_number(procesadas)}")
+        
+        try:
+            stats = importar_ocs(
+                archivo, archivo.name, validas, usuario=user['nombre'], progreso=actualizar_progreso
+            )
+        except Exception as e:
+            st.error(f"❌ Error al registrar OCs: {str(e)}")
+            return
+        
+        barra.progress(1.0, text="Importación finalizada")
+        st.session_state.pop('importacion_ocs', None)
+        st.success(
+            f"✅ {format_number(stats['ocs_creadas'])} OCs registradas en {stats['segundos']:.1f} s "
+            f"({format_number(stats['ocs_por_segundo'])} OCs/s)"
+        )
+        if stats['ocs_omitidas']:
+            st.warning(
+                f"⚠️ {format_number(stats['ocs_omitidas'])} OCs omitidas: su número se registró "
+                "en otra sesión después de la validación"
+            )
+
 # ==================== PÁGINA PRINCIPAL ====================
 
+@medir_tiempo("ocs.pagina")
 def show_ocs_page():
     """Muestra la página de gestión de OCs"""
     
@@ -259,15 +745,21 @@ def show_ocs_page():
     st.markdown("Crea, edita y autoriza órdenes de compra")
     
     # Pestañas principales
-    tab1, tab2, tab3, tab4 = st.tabs([
+    secciones = [
         "📋 Ver OCs", 
         "➕ Crear Nueva OC", 
         "✅ Autorizar OCs", 
         "📊 Análisis"
-    ])
+    ]
+    seccion = lazy_tabs(secciones, key="ocs_seccion", precargas={
+        secciones[0]: [get_clientes_opciones],
+        secciones[1]: [get_clientes_opciones],
+        secciones[2]: [get_ocs_abiertas],
+        secciones[3]: [get_ocs],
+    })
     
     # ========== PESTAÑA 1: VER OCs ==========
-    with tab1:
+    if seccion == secciones[0]:
         st.subheader("📋 ÓRDENES DE COMPRA ACTIVAS")
         
         # Filtros
@@ -281,11 +773,13 @@ def show_ocs_page():
             )
         
         with col2:
-            clientes_df = get_clientes()
-            clientes_lista = ["TODOS"] + clientes_df['nombre'].tolist()
-            cliente_filter = st.selectbox(
+            # El valor de cada opción es el NIT: clientes homónimos no se confunden
+            opciones_clientes = get_clientes_opciones()
+            nombres_clientes = dict(zip(opciones_clientes['nit'], opciones_clientes['nombre']))
+            cliente_nit = st.selectbox(
                 "Filtrar por cliente",
-                clientes_lista,
+                [None] + list(nombres_clientes),
+                format_func=lambda nit: "TODOS" if nit is None else nombres_clientes.get(nit),
                 key="filter_cliente"
             )
         
@@ -293,35 +787,62 @@ def show_ocs_page():
             buscar_oc = st.text_input("🔍 Buscar OC", placeholder="Número de OC")
         
         # Obtener OCs con filtros
-        cliente_nit = None
-        if cliente_filter != "TODOS" and clientes_df is not None:
-            cliente_nit = clientes_df[clientes_df['nombre'] == cliente_filter]['nit'].iloc[0]
-        
-        ocs_df = get_ocs(
-            cliente_nit=cliente_nit if cliente_nit else None,
-            estado=estado_filter if estado_filter != "TODAS" else None
-        )
+        filtros_ocs = {
+            'cliente_nit': cliente_nit,
+            'estado': estado_filter if estado_filter != "TODAS" else None,
+            'busqueda': buscar_oc.strip() or None
+        }
         
-        # Aplicar búsqueda adicional
-        if buscar_oc:
-            ocs_df = ocs_df[ocs_df['numero_oc'].str.contains(buscar_oc, case=False)]
+        # Totales en SQLite; solo se traen las filas de la página visible
+        resumen_ocs = get_ocs_resumen(**filtros_ocs)
         
         # Mostrar resumen
-        if not ocs_df.empty:
-            total_ocs = len(ocs_df)
-            total_valor = ocs_df['valor_total'].sum()
-            total_autorizado = ocs_df['valor_autorizado'].sum()
-            total_pendiente = ocs_df['valor_pendiente'].sum()
-            
+        if resumen_ocs['total_ocs'] > 0:
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Total OCs", total_ocs)
+                st.metric("Total OCs", resumen_ocs['total_ocs'])
             with col2:
-                st.metric("Valor Total", format_currency(total_valor))
+                st.metric("Valor Total", format_currency(resumen_ocs['valor_total']))
             with col3:
-                st.metric("Autorizado", format_currency(total_autorizado))
+                st.metric("Autorizado", format_currency(resumen_ocs['valor_autorizado']))
             with col4:
-                st.metric("Pendiente", format_currency(total_pendiente))
+                st.metric("Pendiente", format_currency(resumen_ocs['valor_pendiente']))
+            
+            # Pila de cursores de las páginas visitadas; se reinicia al cambiar los filtros
+            consulta_ocs = tuple(filtros_ocs.values())
+            if st.session_state.get('ocs_consulta') != consulta_ocs:
+                st.session_state['ocs_consulta'] = consulta_ocs
+                st.session_state['ocs_cursores'] = [None]
+            cursores_ocs = st.session_state['ocs_cursores']
+            
+            ocs_df, siguiente_ocs = get_ocs_page(
+                limite=OCS_POR_PAGINA,
+                cursor=cursores_ocs[-1],
+                **filtros_ocs
+            )
+            
+            total_paginas_ocs = max(1, -(-resumen_ocs['total_ocs'] // OCS_POR_PAGINA))
+            if total_paginas_ocs > 1:
+                col_prev, col_info, col_next = st.columns([1, 3, 1])
+                with col_prev:
+                    st.button(
+                        "⬅️ Anterior",
+                        disabled=len(cursores_ocs) == 1,
+                        on_click=cursores_ocs.pop,
+                        use_container_width=True,
+                        key="ocs_anterior"
+                    )
+                with col_info:
+                    st.caption(f"Página {len(cursores_ocs)} de {total_paginas_ocs}")
+                with col_next:
+                    st.button(
+                        "Siguiente ➡️",
+                        disabled=siguiente_ocs is None,
+                        on_click=cursores_ocs.append,
+                        args=(siguiente_ocs,),
+                        use_container_width=True,
+                        key="ocs_siguiente"
+                    )
             
             st.markdown("---")
             
@@ -334,32 +855,38 @@ def show_ocs_page():
             )
             
             if view_mode == "Tarjetas":
-                # Mostrar como tarjetas
-                ocs_ordenadas = ocs_df.sort_values('fecha_registro', ascending=False)
-                
-                for _, oc in ocs_ordenadas.iterrows():
+                # Mostrar como tarjetas (la página ya viene ordenada por fecha)
+                for _, oc in ocs_df.iterrows():
                     st.markdown(create_oc_card(oc), unsafe_allow_html=True)
             else:
-                # Mostrar como tabla
-                display_df = ocs_df.copy()
-                display_df['Valor Total'] = display_df['valor_total'].apply(format_currency)
-                display_df['Autorizado'] = display_df['valor_autorizado'].apply(format_currency)
-                display_df['Pendiente'] = display_df['valor_pendiente'].apply(format_currency)
-                display_df['% Autorizado'] = display_df.apply(
-                    lambda x: f"{(x['valor_autorizado']/x['valor_total']*100):.1f}%" if x['valor_total'] > 0 else "0%",
-                    axis=1
+                # Mostrar como tabla (formato al renderizar con Styler)
+                display_df = ocs_df[['numero_oc', 'cliente_nombre', 'valor_total', 'valor_autorizado', 'valor_pendiente', 'estado', 'fecha_registro']]
+                total = display_df['valor_total'].where(display_df['valor_total'] > 0)
+                display_df = display_df.assign(
+                    porcentaje_autorizado=(display_df['valor_autorizado'] / total * 100).fillna(0)
                 )
                 
                 st.dataframe(
-                    display_df[['numero_oc', 'cliente_nombre', 'Valor Total', 'Autorizado', 'Pendiente', '% Autorizado', 'estado', 'fecha_registro']],
+                    style_montos(
+                        display_df,
+                        monedas=['valor_total', 'valor_autorizado', 'valor_pendiente'],
+                        porcentajes=['porcentaje_autorizado']
+                    ),
                     use_container_width=True,
-                    hide_index=True
+                    hide_index=True,
+                    column_order=['numero_oc', 'cliente_nombre', 'valor_total', 'valor_autorizado', 'valor_pendiente', 'porcentaje_autorizado', 'estado', 'fecha_registro'],
+                    column_config={
+                        "valor_total": st.column_config.Column("Valor Total"),
+                        "valor_autorizado": st.column_config.Column("Autorizado"),
+                        "valor_pendiente": st.column_config.Column("Pendiente"),
+                        "porcentaje_autorizado": st.column_config.Column("% Autorizado")
+                    }
                 )
         else:
             st.info("📭 No hay OCs que coincidan con los filtros seleccionados")
     
     # ========== PESTAÑA 2: CREAR NUEVA OC ==========
-    with tab2:
+    if seccion == secciones[1]:
         st.subheader("➕ CREAR NUEVA ORDEN DE COMPRA")
         
         with st.form("nueva_oc_form"):
@@ -368,32 +895,34 @@ def show_ocs_page():
             col1, col2 = st.columns(2)
             
             with col1:
-                # Seleccionar cliente
-                clientes_df = get_clientes()
-                cliente_nombre = st.selectbox(
+                # Seleccionar cliente (solo NIT y nombre; los agregados se leen por NIT)
+                opciones_clientes = get_clientes_opciones()
+                nombres_clientes = dict(zip(opciones_clientes['nit'], opciones_clientes['nombre']))
+                cliente_nit = st.selectbox(
                     "Cliente *",
-                    clientes_df['nombre'].tolist(),
+                    list(nombres_clientes),
+                    format_func=nombres_clientes.get,
                     help="Seleccione el cliente para la OC"
                 )
                 
-                # Obtener NIT del cliente seleccionado
-                cliente_nit = clientes_df[clientes_df['nombre'] == cliente_nombre]['nit'].iloc[0]
-                cliente_info = clientes_df[clientes_df['nit'] == cliente_nit].iloc[0]
+                cliente_info = get_cliente_exposicion(cliente_nit) if cliente_nit else None
                 
                 # Mostrar información del cliente
-                st.info(f"""
-                **Información del cliente:**
-                - NIT: {cliente_nit}
-                - Cupo asignado: {format_currency(cliente_info['cupo_sugerido'])}
-                - En uso: {format_currency(cliente_info['saldo_actual'])} ({cliente_info['porcentaje_uso']}%)
-                - Disponible: {format_currency(cliente_info['disponible'])}
-                """)
+                if cliente_info:
+                    st.info(f"""
+                    **Información del cliente:**
+                    - NIT: {cliente_nit}
+                    - Cupo asignado: {format_currency(cliente_info['cupo_sugerido'])}
+                    - En uso: {format_currency(cliente_info['saldo_actual'])} ({cliente_info['porcentaje_uso']}%)
+                    - Disponible: {format_currency(cliente_info['disponible'])}
+                    - OCs pendientes: {cliente_info['ocs_pendientes']} por {format_currency(cliente_info['total_pendiente'])}
+                    """)
                 
                 # Número de OC
                 numero_oc = st.text_input(
                     "Número de OC *",
-                    placeholder="OC-2024-001",
-                    help="Formato: OC-AAAA-NNN"
+                    placeholder="Automático",
+                    help="Formato: OC-AAAA-NNN. Déjelo vacío para asignar el siguiente número del año"
                 )
                 
                 # Tipo de OC
@@ -443,6 +972,7 @@ def show_ocs_page():
                         <div class="impact-warning">
                             <strong>⚠️ ADVERTENCIA - SOBREPASA CUPO DISPONIBLE</strong><br>
                             • Disponible actual: {format_currency(impacto['disponible_actual'])}<br>
+                            • OCs pendientes: {format_currency(impacto['pendiente_ocs'])}<br>
                             • Esta OC consumiría: {format_currency(valor_total)}<br>
                             • Nuevo disponible: {format_currency(impacto['nuevo_disponible'])}<br>
                             • Impacto: {impacto['porcentaje_impacto']:.1f}% del cupo total
@@ -453,9 +983,10 @@ def show_ocs_page():
                         <div class="impact-success">
                             <strong>✅ IMPACTO EN CUPO DISPONIBLE</strong><br>
                             • Disponible actual: {format_currency(impacto['disponible_actual'])}<br>
+                            • OCs pendientes: {format_currency(impacto['pendiente_ocs'])}<br>
                             • Esta OC consumiría: {format_currency(valor_total)}<br>
                             • Nuevo disponible: {format_currency(impacto['nuevo_disponible'])}<br>
-                            • Quedaría disponible: {(impacto['nuevo_disponible']/impacto['disponible_actual']*100):.1f}%
+                            • Quedaría disponible: {(impacto['nuevo_disponible']/impacto['disponible_actual']*100 if impacto['disponible_actual'] > 0 else 0):.1f}%
                         </div>
                         ''', unsafe_allow_html=True)
             
@@ -485,10 +1016,7 @@ def show_ocs_page():
                 # Validaciones
                 errors = []
                 
-                if not numero_oc.strip():
-                    errors.append("❌ El número de OC es obligatorio")
-                
-                if not validate_oc_number(numero_oc):
+                if numero_oc.strip() and not validate_oc_number(numero_oc.strip()):
                     errors.append("❌ Formato de número OC inválido. Use: OC-AAAA-NNN")
                 
                 if valor_total <= 0:
@@ -502,9 +1030,9 @@ def show_ocs_page():
                         st.error(error)
                 else:
                     try:
-                        crear_oc(
+                        _, numero_oc = crear_oc(
                             cliente_nit=cliente_nit,
-                            numero_oc=numero_oc.strip(),
+                            numero_oc=numero_oc.strip() or None,
                             valor_total=valor_total,
                             tipo=tipo_oc,
                             cupo_referencia=cupo_referencia.strip(),
@@ -512,187 +1040,30 @@ def show_ocs_page():
                             usuario=user['nombre']
                         )
                         
+                        # Sin rerun: las demás secciones leen la OC nueva al abrirse
                         st.success(f"✅ OC '{numero_oc}' creada exitosamente por {format_currency(valor_total)}")
                         
-                        if submitted_another:
-                            st.rerun()
-                        else:
-                            time.sleep(1)
-                            st.rerun()
-                            
+                    
                     except Exception as e:
                         st.error(f"❌ Error al crear OC: {str(e)}")
             
             if cancel:
                 st.rerun()
+        
+        # ========== IMPORTACIÓN MASIVA ==========
+        st.markdown("---")
+        st.markdown("### 📥 IMPORTAR OCs")
+        
+        with st.expander("Cargar archivo de OCs (CSV o XLSX)"):
+            importacion_ocs()
     
     # ========== PESTAÑA 3: AUTORIZAR OCs ==========
-    with tab3:
+    if seccion == secciones[2]:
         st.subheader("✅ AUTORIZAR ÓRDENES DE COMPRA")
-        
-        # Obtener OCs pendientes o parciales
-        ocs_pendientes = get_ocs(estado=None)  # Traer todas
-        ocs_pendientes = ocs_pendientes[
-            ocs_pendientes['estado'].isin(['PENDIENTE', 'PARCIAL'])
-        ]
-        
-        if ocs_pendientes.empty:
-            st.info("🎉 ¡No hay OCs pendientes de autorización!")
-        else:
-            # Seleccionar OC para autorizar
-            oc_options = []
-            for _, oc in ocs_pendientes.iterrows():
-                label = f"{oc['numero_oc']} - {oc['cliente_nombre']} - {format_currency(oc['valor_pendiente'])} pendiente"
-                oc_options.append((oc['id'], label))
-            
-            selected_oc_id = st.selectbox(
-                "Seleccionar OC para autorizar",
-                options=[oc[0] for oc in oc_options],
-                format_func=lambda x: dict(oc_options)[x]
-            )
-            
-            if selected_oc_id:
-                oc_seleccionada = ocs_pendientes[ocs_pendientes['id'] == selected_oc_id].iloc[0]
-                
-                with st.form("autorizar_oc_form"):
-                    st.markdown('<div class="form-section">', unsafe_allow_html=True)
-                    
-                    st.markdown(f"""
-                    ### OC: {oc_seleccionada['numero_oc']}
-                    **Cliente:** {oc_seleccionada['cliente_nombre']}
-                    """)
-                    
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.metric(
-                            "Valor Total",
-                            format_currency(oc_seleccionada['valor_total'])
-                        )
-                        
-                        st.metric(
-                            "Ya Autorizado",
-                            format_currency(oc_seleccionada['valor_autorizado'])
-                        )
-                    
-                    with col2:
-                        valor_pendiente = oc_seleccionada['valor_pendiente']
-                        st.metric(
-                            "Pendiente",
-                            format_currency(valor_pendiente)
-                        )
-                        
-                        porcentaje_autorizado = (oc_seleccionada['valor_autorizado'] / oc_seleccionada['valor_total'] * 100) if oc_seleccionada['valor_total'] > 0 else 0
-                        st.metric(
-                            "% Autorizado",
-                            f"{porcentaje_autorizado:.1f}%"
-                        )
-                    
-                    st.markdown("---")
-                    
-                    # Tipo de autorización
-                    tipo_autorizacion = st.radio(
-                        "Tipo de autorización",
-                        ["AUTORIZACIÓN TOTAL", "AUTORIZACIÓN PARCIAL"],
-                        horizontal=True
-                    )
-                    
-                    # Valor a autorizar
-                    if tipo_autorizacion == "AUTORIZACIÓN TOTAL":
-                        valor_autorizar = valor_pendiente
-                        st.info(f"Se autorizará el valor pendiente completo: {format_currency(valor_pendiente)}")
-                    else:
-                        valor_autorizar = st.number_input(
-                            "Valor a autorizar",
-                            min_value=0.0,
-                            max_value=float(valor_pendiente),
-                            value=float(valor_pendiente),
-                            step=1000000.0,
-                            format="%.0f"
-                        )
-                    
-                    # Botones de porcentaje rápido
-                    st.write("**Porcentajes rápidos:**")
-                    col_perc1, col_perc2, col_perc3, col_perc4 = st.columns(4)
-                    
-                    with col_perc1:
-                        if st.button("25%", use_container_width=True):
-                            st.session_state.autorizar_percent = 25
-                            st.rerun()
-                    
-                    with col_perc2:
-                        if st.button("50%", use_container_width=True):
-                            st.session_state.autorizar_percent = 50
-                            st.rerun()
-                    
-                    with col_perc3:
-                        if st.button("75%", use_container_width=True):
-                            st.session_state.autorizar_percent = 75
-                            st.rerun()
-                    
-                    with col_perc4:
-                        if st.button("100%", use_container_width=True):
-                            st.session_state.autorizar_percent = 100
-                            st.rerun()
-                    
-                    # Aplicar porcentaje si existe
-                    if 'autorizar_percent' in st.session_state:
-                        valor_autorizar = valor_pendiente * (st.session_state.autorizar_percent / 100)
-                    
-                    # Comentario de autorización
-                    comentario_autorizacion = st.text_area(
-                        "Comentario de autorización (opcional)",
-                        placeholder="Ej: Autorización por aprobación de gerencia...",
-                        height=80
-                    )
-                    
-                    st.markdown('</div>', unsafe_allow_html=True)
-                    
-                    
-                    # Botones de confirmación
-                    col_conf1, col_conf2 = st.columns(2)
-                    
-                    with col_conf1:
-                        confirmar = st.form_submit_button(
-                            "✅ CONFIRMAR AUTORIZACIÓN",
-                            type="primary",
-                            use_container_width=True,
-                            disabled=impacto['sobrepasa_cupo'] if impacto and 'sobrepasa_cupo' in impacto else False
-                        )
-                    
-                    with col_conf2:
-                        cancelar = st.form_submit_button(
-                            "❌ CANCELAR",
-                            use_container_width=True
-                        )
-                    
-                    if confirmar:
-                        if valor_autorizar <= 0:
-                            st.error("❌ El valor a autorizar debe ser mayor a 0")
-                        else:
-                            try:
-                                autorizar_oc(
-                                    oc_id=selected_oc_id,
-                                    valor_autorizado=valor_autorizar,
-                                    comentario=comentario_autorizacion.strip(),
-                                    usuario=user['nombre']
-                                )
-                                
-                                st.success(f"✅ Autorizados {format_currency(valor_autorizar)} de la OC {oc_seleccionada['numero_oc']}")
-                                st.balloons()
-                                time.sleep(2)
-                                st.rerun()
-                                
-                            except Exception as e:
-                                st.error(f"❌ Error al autorizar: {str(e)}")
-                    
-                    if cancelar:
-                        if 'autorizar_percent' in st.session_state:
-                            del st.session_state.autorizar_percent
-                        st.rerun()
+        seccion_autorizacion()
     
     # ========== PESTAÑA 4: ANÁLISIS ==========
-    with tab4:
+    if seccion == secciones[3]:
         st.subheader("📊 ANÁLISIS DE OCs")
         
         # Obtener todas las OCs
@@ -731,7 +1102,7 @@ def show_ocs_page():
                     y=valor_por_cliente.index,
                     orientation='h',
                     marker_color='#0066CC',
-                    text=valor_por_cliente.values.apply(format_currency),
+                    text=format_currency_series(valor_por_cliente.values),
                     textposition='inside'
                 )])
                 
@@ -798,13 +1169,8 @@ def show_ocs_page():
                 'id': 'Cantidad OCs'
             })
             
-            # Formatear valores
-            resumen_cliente['Total OCs'] = resumen_cliente['Total OCs'].apply(format_currency)
-            resumen_cliente['Autorizado'] = resumen_cliente['Autorizado'].apply(format_currency)
-            resumen_cliente['Pendiente'] = resumen_cliente['Pendiente'].apply(format_currency)
-            
             st.dataframe(
-                resumen_cliente,
+                style_montos(resumen_cliente, monedas=['Total OCs', 'Autorizado', 'Pendiente']),
                 use_container_width=True
             )
 
@@ -3,8 +3,10 @@ PÁGINA 4 - REPORTES Y ANÁLISIS
 Reportes avanzados y análisis de datos
 """
 
+import os
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
@@ -18,136 +20,139 @@ st.set_page_config(
 
 # Importar módulos
 from modules.auth import check_authentication
-from modules.database import get_estadisticas_generales, get_estadisticas_por_cliente, get_ocs
-from modules.utils import format_currency, format_number, calculate_percentage
+from modules.database import get_estadisticas_generales, get_estadisticas_por_cliente, get_ocs, get_ocs_summary
+from modules.utils import (
+    format_currency, format_number, calculate_percentage, lazy_tabs,
+    format_currency_series, format_percentage_series, EXCEL_MIME
+)
+from modules.exports import (
+    create_availability_report, create_ocs_analysis_report,
+    get_cola_exportaciones, TIPOS_EXPORTACION, ESTADOS_ACTIVOS
+)
+from config import EXPORT_REFRESH_SECONDS
 
 # Verificar autenticación
 user = check_authentication()
 
 # ==================== FUNCIONES DE REPORTES ====================
 
-def create_availability_report(clientes_df):
-    """Crea reporte de disponibilidad por cliente"""
-    
-    reporte = clientes_df.copy()
-    reporte = reporte[['nombre', 'nit', 'cupo_sugerido', 'saldo_actual', 'disponible', 'porcentaje_uso', 'estado']]
-    
-    # Ordenar por disponibilidad (ascendente)
-    reporte = reporte.sort_values('disponible')
-    
-    # Agregar columna de riesgo
-    def get_risk_level(porcentaje):
-        if porcentaje >= 100:
-            return "🔴 CRÍTICO"
-        elif porcentaje >= 90:
-            return "🟠 ALTO"
-        elif porcentaje >= 80:
-            return "🟡 MEDIO"
-        else:
-            return "🟢 BAJO"
-    
-    reporte['Nivel de Riesgo'] = reporte['porcentaje_uso'].apply(get_risk_level)
-    
-    # Formatear valores
-    reporte['cupo_sugerido'] = reporte['cupo_sugerido'].apply(format_currency)
-    reporte['saldo_actual'] = reporte['saldo_actual'].apply(format_currency)
-    reporte['disponible'] = reporte['disponible'].apply(format_currency)
-    reporte['porcentaje_uso'] = reporte['porcentaje_uso'].apply(lambda x: f"{x:.1f}%")
-    
-    return reporte.rename(columns={
-        'nombre': 'Cliente',
-        'nit': 'NIT',
-        'cupo_sugerido': 'Cupo Asignado',
-        'saldo_actual': 'En Uso',
-        'disponible': 'Disponible',
-        'porcentaje_uso': '% Uso',
-        'estado': 'Estado'
-    })
+NIVELES_RIESGO = ["🔴 SOBREPASARÍA CUPO", "🟠 RIESGO ALTO", "🟡 RIESGO MEDIO", "🟢 RIESGO BAJO"]
 
-def create_ocs_analysis_report(ocs_df):
-    """Crea reporte de análisis de OCs"""
-    
-    if ocs_df.empty:
-        return pd.DataFrame()
+def create_risk_analysis(clientes_df, ocs_df=None):
+    """
+    Crea análisis de riesgo combinado en forma vectorizada.
+    El pendiente de cada cliente viene de cliente_exposicion (total_pendiente,
+    mantenido por triggers); sin esa columna se agrega ocs_df con un solo groupby.
+    """
+    if 'total_pendiente' in clientes_df.columns:
+        pendiente_total = clientes_df['total_pendiente']
+    else:
+        ocs_pendientes = ocs_df[ocs_df['estado'].isin(['PENDIENTE', 'PARCIAL'])]
+        pendiente_total = clientes_df['nit'].map(
+            ocs_pendientes.groupby('cliente_nit')['valor_pendiente'].sum()
+        ).fillna(0)
     
-    # Agrupar por cliente
-    reporte = ocs_df.groupby('cliente_nombre').agg({
-        'valor_total': 'sum',
-        'valor_autorizado': 'sum',
-        'valor_pendiente': 'sum',
-        'id': 'count'
-    }).reset_index()
+    # Nuevo disponible si se autorizan todas las OCs pendientes
+    disponible = clientes_df['disponible']
+    nuevo_disponible = disponible - pendiente_total
+    cupo = clientes_df['cupo_sugerido']
     
-    # Calcular porcentajes
-    reporte['% Autorizado'] = reporte.apply(
-        lambda x: (x['valor_autorizado'] / x['valor_total'] * 100) if x['valor_total'] > 0 else 0,
-        axis=1
+    # Menos del 10% / 20% del cupo disponible: riesgo alto / medio
+    nivel_riesgo = np.select(
+        [nuevo_disponible < 0, nuevo_disponible < cupo * 0.1, nuevo_disponible < cupo * 0.2],
+        NIVELES_RIESGO[:3],
+        NIVELES_RIESGO[3]
     )
     
-    reporte['% Pendiente'] = reporte.apply(
-        lambda x: (x['valor_pendiente'] / x['valor_total'] * 100) if x['valor_total'] > 0 else 0,
-        axis=1
-    )
-    
-    # Ordenar por valor pendiente descendente
-    reporte = reporte.sort_values('valor_pendiente', ascending=False)
-    
-    # Formatear valores
-    reporte['valor_total'] = reporte['valor_total'].apply(format_currency)
-    reporte['valor_autorizado'] = reporte['valor_autorizado'].apply(format_currency)
-    reporte['valor_pendiente'] = reporte['valor_pendiente'].apply(format_currency)
-    reporte['% Autorizado'] = reporte['% Autorizado'].apply(lambda x: f"{x:.1f}%")
-    reporte['% Pendiente'] = reporte['% Pendiente'].apply(lambda x: f"{x:.1f}%")
-    
-    return reporte.rename(columns={
-        'cliente_nombre': 'Cliente',
-        'valor_total': 'Total OCs',
-        'valor_autorizado': 'Autorizado',
-        'valor_pendiente': 'Pendiente',
-        'id': 'Cantidad OCs'
-    })
+    return pd.DataFrame({
+        'Cliente': clientes_df['nombre'],
+        'NIT': clientes_df['nit'],
+        'Cupo Asignado': format_currency_series(cupo),
+        'Disponible Actual': format_currency_series(disponible),
+        'OCs Pendientes': format_currency_series(pendiente_total),
+        'Nuevo Disponible': format_currency_series(nuevo_disponible),
+        'Nivel de Riesgo': nivel_riesgo,
+        'Acción Recomendada': np.where(nuevo_disponible < 0, "Revisar cupo", "Monitorear")
+    }).reset_index(drop=True)
 
-def create_risk_analysis(clientes_df, ocs_df):
-    """Crea análisis de riesgo combinado"""
-    
-    riesgo_data = []
+# ==================== PÁGINA PRINCIPAL ====================
+
+def _formatear_duracion(segundos):
+    """Duración legible para el tiempo restante de una exportación"""
+    minutos, segundos = divmod(int(round(segundos)), 60)
+    return f"{minutos} min {segundos:02d} s" if minutos else f"{segundos} s"
+
+def _lector_archivo(ruta):
+    """
+    Contenido diferido para st.download_button: el archivo se lee solo al hacer
+    clic (data como callable requiere Streamlit 1.52)
+    """
+    def leer():
+        with open(ruta, 'rb') as f:
+            return f.read()
+    return leer
+
+def mis_exportaciones(cola):
+    """
+    Panel de exportaciones del usuario. El fragmento se refresca solo mientras
+    hay trabajos activos; cuando el último termina, una recarga completa lo
+    registra de nuevo sin run_every.
+    """
+    activos = cola.hay_activos(user['nombre'])
     
-    for _, cliente in clientes_df.iterrows():
-        # OCs pendientes del cliente
-        ocs_cliente = ocs_df[ocs_df['cliente_nit'] == cliente['nit']]
-        ocs_pendientes = ocs_cliente[ocs_cliente['estado'].isin(['PENDIENTE', 'PARCIAL'])]
+    @st.fragment(run_every=EXPORT_REFRESH_SECONDS if activos else None)
+    def panel():
+        trabajos = cola.trabajos_de(user['nombre'])
+        if activos and not any(t['estado'] in ESTADOS_ACTIVOS for t in trabajos):
+            st.rerun()
         
-        # Calcular riesgo
-        disponible = cliente['disponible']
-        pendiente_total = ocs_pendientes['valor_pendiente'].sum()
+        st.markdown("#### 📂 Mis exportaciones")
+        if not trabajos:
+            st.caption("No tiene exportaciones recientes.")
+            return
         
-        # Nuevo disponible si se autorizan todas las OCs pendientes
-        nuevo_disponible = disponible - pendiente_total
-        
-        # Determinar nivel de riesgo
-        if nuevo_disponible < 0:
-            nivel_riesgo = "🔴 SOBREPASARÍA CUPO"
-        elif nuevo_disponible < (cliente['cupo_sugerido'] * 0.1):  # Menos del 10% disponible
-            nivel_riesgo = "🟠 RIESGO ALTO"
-        elif nuevo_disponible < (cliente['cupo_sugerido'] * 0.2):  # Menos del 20% disponible
-            nivel_riesgo = "🟡 RIESGO MEDIO"
-        else:
-            nivel_riesgo = "🟢 RIESGO BAJO"
-        
-        riesgo_data.append({
-            'Cliente': cliente['nombre'],
-            'NIT': cliente['nit'],
-            'Cupo Asignado': format_currency(cliente['cupo_sugerido']),
-            'Disponible Actual': format_currency(disponible),
-            'OCs Pendientes': format_currency(pendiente_total),
-            'Nuevo Disponible': format_currency(nuevo_disponible),
-            'Nivel de Riesgo': nivel_riesgo,
-            'Acción Recomendada': "Revisar cupo" if nuevo_disponible < 0 else "Monitorear" if "RIESGO" in nivel_riesgo else "Normal"
-        })
+        for trabajo in trabajos:
+            nombre = TIPOS_EXPORTACION[trabajo['tipo']]
+            hora = datetime.fromtimestamp(trabajo['solicitado']).strftime('%H:%M:%S')
+            col1, col2 = st.columns([3, 1])
+            
+            with col1:
+                if trabajo['estado'] == 'EN_COLA':
+                    st.progress(0.0, text=f"{nombre} ({hora}): en cola")
+                elif trabajo['estado'] == 'EN_PROCESO':
+                    texto = f"{nombre} ({hora}): {format_number(trabajo['filas'])} de {format_number(trabajo['total'])} filas"
+                    if trabajo['eta'] is not None:
+                        texto += f", faltan {_formatear_duracion(trabajo['eta'])}"
+                    st.progress(trabajo['avance'], text=texto)
+                elif trabajo['estado'] == 'LISTA':
+                    st.write(
+                        f"✅ **{nombre}** ({hora}): {format_number(trabajo['filas'])} filas, "
+                        f"{trabajo['tamano'] / 1024 / 1024:.1f} MB"
+                    )
+                else:
+                    st.write(f"❌ **{nombre}** ({hora}): {trabajo['error']}")
+            
+            with col2:
+                if trabajo['estado'] == 'LISTA':
+                    if not os.path.exists(trabajo['ruta']):
+                        st.caption("Archivo no disponible")
+                    else:
+                        # Los refrescos no leen el archivo: se sirve una vez, al descargarlo
+                        st.download_button(
+                            label="⬇️ Descargar",
+                            data=_lector_archivo(trabajo['ruta']),
+                            file_name=trabajo['archivo'],
+                            mime=EXCEL_MIME,
+                            on_click="ignore",
+                            use_container_width=True,
+                            key=f"descargar_{trabajo['id']}"
+                        )
+                if trabajo['estado'] in ('LISTA', 'ERROR'):
+                    if st.button("🗑️ Quitar", use_container_width=True, key=f"quitar_{trabajo['id']}"):
+                        cola.descartar(trabajo['id'], user['nombre'])
+                        st.rerun()
     
-    return pd.DataFrame(riesgo_data)
-
-# ==================== PÁGINA PRINCIPAL ====================
+    panel()
 
 def show_reports_page():
     """Muestra la página de reportes"""
@@ -155,25 +160,28 @@ def show_reports_page():
     st.title("📊 REPORTES Y ANÁLISIS")
     st.markdown("Reportes avanzados y análisis de datos del sistema")
     
-    # Obtener datos
-    with st.spinner("Cargando datos para reportes..."):
-        stats = get_estadisticas_generales()
-        clientes_df = get_estadisticas_por_cliente()
-        ocs_df = get_ocs()
-    
-    # Pestañas de reportes
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    # Pestañas de reportes: cada sección carga solo los datos que muestra
+    secciones = [
         "📈 Resumen Ejecutivo",
         "👥 Disponibilidad por Cliente", 
         "📋 Análisis de OCs",
         "⚠️ Análisis de Riesgo",
         "📤 Exportar Reportes"
-    ])
+    ]
+    seccion = lazy_tabs(secciones, key="reportes_seccion", precargas={
+        secciones[0]: [get_estadisticas_generales, get_estadisticas_por_cliente],
+        secciones[1]: [get_estadisticas_por_cliente],
+        secciones[2]: [get_ocs],
+        secciones[3]: [get_estadisticas_por_cliente, get_ocs_summary],
+    })
     
     # ========== PESTAÑA 1: RESUMEN EJECUTIVO ==========
-    with tab1:
+    if seccion == secciones[0]:
         st.subheader("📈 RESUMEN EJECUTIVO DEL SISTEMA")
         
+        stats = get_estadisticas_generales()
+        clientes_df = get_estadisticas_por_cliente()
+        
         # Métricas principales
         col1, col2, col3, col4 = st.columns(4)
         
@@ -281,7 +289,7 @@ def show_reports_page():
                              '#FFCC00' if x >= 80 else
                              '#00B8A9' if x >= 50 else '#0066CC'
                 ),
-                text=top_clientes['porcentaje_uso'].apply(lambda x: f"{x:.1f}%"),
+                text=format_percentage_series(top_clientes['porcentaje_uso']),
                 textposition='outside'
             ))
             
@@ -296,10 +304,9 @@ def show_reports_page():
             
             # Mostrar tabla detallada
             display_df = top_clientes[['nombre', 'nit', 'porcentaje_uso', 'cupo_sugerido', 'saldo_actual', 'disponible']].copy()
-            display_df['cupo_sugerido'] = display_df['cupo_sugerido'].apply(format_currency)
-            display_df['saldo_actual'] = display_df['saldo_actual'].apply(format_currency)
-            display_df['disponible'] = display_df['disponible'].apply(format_currency)
-            display_df['porcentaje_uso'] = display_df['porcentaje_uso'].apply(lambda x: f"{x:.1f}%")
+            for columna in ['cupo_sugerido', 'saldo_actual', 'disponible']:
+                display_df[columna] = format_currency_series(display_df[columna])
+            display_df['porcentaje_uso'] = format_percentage_series(display_df['porcentaje_uso'])
             
             st.dataframe(
                 display_df.rename(columns={
@@ -315,9 +322,10 @@ def show_reports_page():
             )
     
     # ========== PESTAÑA 2: DISPONIBILIDAD POR CLIENTE ==========
-    with tab2:
+    if seccion == secciones[1]:
         st.subheader("👥 REPORTE DE DISPONIBILIDAD POR CLIENTE")
         
+        clientes_df = get_estadisticas_por_cliente()
         if not clientes_df.empty:
             # Crear reporte
             disponibilidad_report = create_availability_report(clientes_df)
@@ -383,7 +391,7 @@ def show_reports_page():
                 x=top_disponible['disponible'],
                 orientation='h',
                 marker_color='#00B8A9',
-                text=top_disponible['disponible'].apply(format_currency),
+                text=format_currency_series(top_disponible['disponible']),
                 textposition='inside'
             )])
             
@@ -399,9 +407,10 @@ def show_reports_page():
             st.info("No hay datos de clientes para mostrar.")
     
     # ========== PESTAÑA 3: ANÁLISIS DE OCs ==========
-    with tab3:
+    if seccion == secciones[2]:
         st.subheader("📋 ANÁLISIS DE ÓRDENES DE COMPRA")
         
+        ocs_df = get_ocs()
         if not ocs_df.empty:
             # Crear reporte
             ocs_report = create_ocs_analysis_report(ocs_df)
@@ -441,7 +450,7 @@ def show_reports_page():
                     x=valor_por_estado.index,
                     y=valor_por_estado.values,
                     marker_color=['#FFCC00', '#FF9500', '#00B8A9'],
-                    text=valor_por_estado.values.apply(format_currency),
+                    text=format_currency_series(valor_por_estado.values),
                     textposition='outside'
                 )])
                 
@@ -510,12 +519,14 @@ def show_reports_page():
             st.info("No hay OCs registradas en el sistema.")
     
     # ========== PESTAÑA 4: ANÁLISIS DE RIESGO ==========
-    with tab4:
+    if seccion == secciones[3]:
         st.subheader("⚠️ ANÁLISIS DE RIESGO COMBINADO")
         
-        if not clientes_df.empty and not ocs_df.empty:
+        # El pendiente por cliente ya viene en la exposición: no hace falta leer las OCs
+        clientes_df = get_estadisticas_por_cliente()
+        if not clientes_df.empty and get_ocs_summary()['total_ocs'] > 0:
             # Crear análisis de riesgo
-            riesgo_report = create_risk_analysis(clientes_df, ocs_df)
+            riesgo_report = create_risk_analysis(clientes_df)
             
             st.dataframe(
                 riesgo_report,
@@ -590,7 +601,7 @@ def show_reports_page():
             st.info("No hay suficientes datos para el análisis de riesgo.")
     
     # ========== PESTAÑA 5: EXPORTAR REPORTES ==========
-    with tab5:
+    if seccion == secciones[4]:
         st.subheader("📤 EXPORTAR REPORTES")
         
         st.info("""
@@ -598,88 +609,33 @@ def show_reports_page():
         Los archivos incluyen todas las tablas y datos mostrados en esta sección.
         """)
         
-        col1, col2, col3 = st.columns(3)
+        st.caption(
+            "Los archivos se generan en segundo plano: puede seguir usando el sistema "
+            "y descargarlos desde **Mis exportaciones** cuando estén listos."
+        )
         
-        with col1:
-            if st.button("📥 Exportar Reporte Completo", use_container_width=True):
-                try:
-                    from modules.database import exportar_datos_a_excel
-                    ruta = exportar_datos_a_excel()
-                    
-                    with open(ruta, "rb") as file:
-                        st.download_button(
-                            label="⬇️ Descargar Reporte Completo",
-                            data=file,
-                            file_name=f"reporte_tododrogas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
-                    
-                    st.success("✅ Reporte generado exitosamente")
-                except Exception as e:
-                    st.error(f"❌ Error al exportar: {str(e)}")
+        cola = get_cola_exportaciones()
+        botones = {
+            'reporte_completo': "📥 Exportar Reporte Completo",
+            'clientes': "📊 Exportar Datos Clientes",
+            'ocs': "📋 Exportar Datos OCs",
+        }
         
-        with col2:
-            if st.button("📊 Exportar Datos Clientes", use_container_width=True):
-                try:
-                    # Crear Excel con datos de clientes
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    ruta_clientes = f'data/backups/clientes_{timestamp}.xlsx'
-                    
-                    with pd.ExcelWriter(ruta_clientes, engine='openpyxl') as writer:
-                        # Hoja 1: Datos completos
-                        clientes_df.to_excel(writer, sheet_name='Datos Completos', index=False)
-                        
-                        # Hoja 2: Reporte de disponibilidad
-                        if not clientes_df.empty:
-                            disponibilidad_report = create_availability_report(clientes_df)
-                            disponibilidad_report.to_excel(writer, sheet_name='Disponibilidad', index=False)
-                        
-                        # Hoja 3: Estadísticas
-                        stats_df = pd.DataFrame([stats])
-                        stats_df.to_excel(writer, sheet_name='Estadísticas', index=False)
-                    
-                    with open(ruta_clientes, "rb") as file:
-                        st.download_button(
-                            label="⬇️ Descargar Datos Clientes",
-                            data=file,
-                            file_name=f"clientes_tododrogas_{timestamp}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
-                    
-                    st.success("✅ Datos de clientes exportados")
-                except Exception as e:
-                    st.error(f"❌ Error al exportar: {str(e)}")
+        for columna, (tipo, etiqueta) in zip(st.columns(3), botones.items()):
+            with columna:
+                if st.button(etiqueta, use_container_width=True, key=f"exportar_{tipo}"):
+                    try:
+                        trabajo, reutilizado = cola.solicitar(tipo, user['nombre'])
+                        if reutilizado:
+                            st.info(f"ℹ️ Ya hay una exportación idéntica ({trabajo['estado'].lower().replace('_', ' ')}); se agregó a sus exportaciones")
+                        else:
+                            st.success("✅ Exportación en cola")
+                    except ValueError as e:
+                        st.warning(f"⚠️ {str(e)}")
+                    except Exception as e:
+                        st.error(f"❌ Error al exportar: {str(e)}")
         
-        with col3:
-            if st.button("📋 Exportar Datos OCs", use_container_width=True):
-                try:
-                    # Crear Excel con datos de OCs
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    ruta_ocs = f'data/backups/ocs_{timestamp}.xlsx'
-                    
-                    with pd.ExcelWriter(ruta_ocs, engine='openpyxl') as writer:
-                        # Hoja 1: Datos completos
-                        ocs_df.to_excel(writer, sheet_name='OCs Completas', index=False)
-                        
-                        # Hoja 2: Análisis
-                        if not ocs_df.empty:
-                            ocs_report = create_ocs_analysis_report(ocs_df)
-                            ocs_report.to_excel(writer, sheet_name='Análisis', index=False)
-                    
-                    with open(ruta_ocs, "rb") as file:
-                        st.download_button(
-                            label="⬇️ Descargar Datos OCs",
-                            data=file,
-                            file_name=f"ocs_tododrogas_{timestamp}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
-                    
-                    st.success("✅ Datos de OCs exportados")
-                except Exception as e:
-                    st.error(f"❌ Error al exportar: {str(e)}")
+        mis_exportaciones(cola)
         
         # Opciones adicionales
         st.markdown("---")
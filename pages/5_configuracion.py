@@ -16,13 +16,28 @@ st.set_page_config(
 
 # Importar módulos
 from modules.auth import require_admin
-from modules.database import get_usuarios, crear_usuario
+from modules.database import (
+    get_usuarios, crear_usuario, get_parametro, set_parametro, get_backup_jobs
+)
+from modules.backup import get_historial_backups
+from modules.scheduler import iniciar_scheduler
+from modules.utils import lazy_tabs, get_tiempos_render
 
 # Verificar que sea administrador
 user = require_admin()
 
 # ==================== FUNCIONES AUXILIARES ====================
 
+# Opciones de retención de backups en días (0 = indefinido)
+RETENCION_BACKUPS = {
+    "7 días": 7,
+    "15 días": 15,
+    "30 días": 30,
+    "60 días": 60,
+    "90 días": 90,
+    "Indefinido": 0
+}
+
 def hash_password(password):
     """Encripta una contraseña"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -36,15 +51,16 @@ def show_config_page():
     st.markdown("Gestión de usuarios y configuración del sistema")
     
     # Pestañas de configuración
-    tab1, tab2, tab3, tab4 = st.tabs([
+    secciones = [
         "👥 Usuarios",
         "🏢 Empresa", 
         "📊 Sistema",
         "🔐 Seguridad"
-    ])
+    ]
+    seccion = lazy_tabs(secciones, key="configuracion_seccion")
     
     # ========== PESTAÑA 1: USUARIOS ==========
-    with tab1:
+    if seccion == secciones[0]:
         st.subheader("👥 GESTIÓN DE USUARIOS")
         
         # Obtener usuarios
@@ -188,7 +204,7 @@ def show_config_page():
                         st.error(f"❌ Error al actualizar: {str(e)}")
     
     # ========== PESTAÑA 2: EMPRESA ==========
-    with tab2:
+    if seccion == secciones[1]:
         st.subheader("🏢 CONFIGURACIÓN EMPRESARIAL")
         
         col1, col2 = st.columns(2)
@@ -280,7 +296,7 @@ def show_config_page():
             """)
     
     # ========== PESTAÑA 3: SISTEMA ==========
-    with tab3:
+    if seccion == secciones[2]:
         st.subheader("📊 CONFIGURACIÓN DEL SISTEMA")
         
         col1, col2 = st.columns(2)
@@ -322,18 +338,30 @@ def show_config_page():
         with col2:
             st.markdown("### 📁 CONFIGURACIÓN DE DATOS")
             
-            # Backup automático
+            # Backup automático (lo ejecuta el programador en segundo plano)
             backup_auto = st.checkbox(
                 "Backup automático diario",
-                value=True
+                value=get_parametro('backup_auto') == '1'
             )
             
+            hora_backup = datetime.strptime(get_parametro('hora_backup'), "%H:%M").time()
             if backup_auto:
                 hora_backup = st.time_input(
                     "Hora del backup",
-                    value=datetime.strptime("02:00", "%H:%M").time()
+                    value=hora_backup
                 )
             
+            opciones_retencion = list(RETENCION_BACKUPS)
+            dias_retencion = int(get_parametro('retencion_backups_dias') or 0)
+            retencion_backups = st.selectbox(
+                "Retención de backups",
+                opciones_retencion,
+                index=next(
+                    (i for i, op in enumerate(opciones_retencion) if RETENCION_BACKUPS[op] == dias_retencion),
+                    opciones_retencion.index("30 días")
+                )
+            )
+            
             # Retención de datos
             retencion_ocs = st.selectbox(
                 "Retención de OCs antiguas",
@@ -372,12 +400,95 @@ def show_config_page():
                 st.info("📈 Reindexando datos...")
                 st.success("✅ Datos reindexados correctamente")
         
+        # Respaldos completos, incrementales y restauración a un punto en el tiempo
+        st.markdown("### 💾 RESPALDOS")
+        
+        # Las tareas corren en el hilo del programador, nunca en el de la sesión
+        scheduler = iniciar_scheduler()
+        
+        col_bk1, col_bk2 = st.columns(2)
+        
+        with col_bk1:
+            if st.button("📦 BACKUP COMPLETO", use_container_width=True):
+                try:
+                    with st.spinner("Creando backup completo..."):
+                        respaldo = scheduler.solicitar('completo').result()
+                    st.success(f"✅ Backup completo creado: {respaldo['archivo']}")
+                except Exception as e:
+                    st.error(f"❌ Error en el backup: {e}")
+        
+        with col_bk2:
+            if st.button("➕ BACKUP INCREMENTAL", use_container_width=True):
+                try:
+                    with st.spinner("Exportando cambios..."):
+                        respaldo = scheduler.solicitar('incremental').result()
+                    if respaldo.get('archivo'):
+                        st.success(f"✅ Backup creado: {respaldo['archivo']}")
+                    else:
+                        st.info("ℹ️ No hay cambios desde el último backup")
+                except Exception as e:
+                    st.error(f"❌ Error en el backup: {e}")
+        
+        estado_scheduler = scheduler.estado()
+        proximo = estado_scheduler['proximo_backup']
+        st.caption(
+            f"Programador {'activo' if estado_scheduler['activo'] else 'detenido'}"
+            f"{' (este proceso ejecuta el programa diario)' if estado_scheduler['es_lider'] else ''} • "
+            f"Próximo backup: {proximo.strftime('%d/%m/%Y %H:%M') if proximo else 'desactivado'}"
+        )
+        if estado_scheduler['ultimo_error']:
+            st.warning(f"⚠️ Última revisión con error: {estado_scheduler['ultimo_error']}")
+        
+        tab_historial, tab_tareas = st.tabs(["Historial de backups", "Tareas ejecutadas"])
+        with tab_historial:
+            historial = get_historial_backups()
+            if historial.empty:
+                st.info("ℹ️ Aún no hay backups registrados")
+            else:
+                st.dataframe(historial.head(20), use_container_width=True, hide_index=True)
+        with tab_tareas:
+            st.dataframe(get_backup_jobs(), use_container_width=True, hide_index=True)
+        
+        with st.expander("⏪ Restaurar a un punto en el tiempo"):
+            col_pitr1, col_pitr2 = st.columns(2)
+            with col_pitr1:
+                fecha_pitr = st.date_input("Fecha", value=datetime.now().date(), key="fecha_pitr")
+            with col_pitr2:
+                hora_pitr = st.time_input("Hora", value=datetime.now().time().replace(second=0, microsecond=0), key="hora_pitr")
+            
+            confirmar_pitr = st.checkbox(
+                "Entiendo que los cambios posteriores a ese momento se descartan",
+                key="confirmar_pitr"
+            )
+            
+            if st.button("⏪ RESTAURAR", disabled=not confirmar_pitr):
+                try:
+                    with st.spinner("Restaurando base de datos..."):
+                        tarea = scheduler.solicitar('restauracion', datetime.combine(fecha_pitr, hora_pitr))
+                        resultado = tarea.result()['resultado']
+                    st.success(
+                        f"✅ Base restaurada a {resultado['objetivo']} "
+                        f"({resultado['cambios_aplicados']} cambios reaplicados sobre {resultado['base']})"
+                    )
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+        
+        with st.expander("⏱️ Tiempos de render por página y fragmento"):
+            tiempos = get_tiempos_render()
+            if tiempos.empty:
+                st.caption("Aún no hay ejecuciones registradas en este proceso.")
+            else:
+                st.dataframe(tiempos.round(1), use_container_width=True, hide_index=True)
+        
         # Botón de guardar
         if st.button("💾 GUARDAR CONFIGURACIÓN SISTEMA", use_container_width=True, type="primary"):
+            set_parametro('backup_auto', '1' if backup_auto else '0')
+            set_parametro('hora_backup', hora_backup.strftime("%H:%M"))
+            set_parametro('retencion_backups_dias', RETENCION_BACKUPS[retencion_backups])
             st.success("✅ Configuración del sistema guardada")
     
     # ========== PESTAÑA 4: SEGURIDAD ==========
-    with tab4:
+    if seccion == secciones[3]:
         st.subheader("🔐 CONFIGURACIÓN DE SEGURIDAD")
         
         col1, col2 = st.columns(2)
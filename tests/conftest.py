@@ -0,0 +1,61 @@
+"""
+Fixtures compartidas: cada prueba usa una base SQLite temporal con el esquema
+completo (init_db + migraciones) y un pool y una caché propios.
+"""
+
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from modules import database
+
+def usar_base(ruta):
+    """Apunta el módulo a `ruta` y descarta el pool, la caché y el watcher de la base anterior"""
+    database.DB_PATH = ruta
+    database.get_pool.clear()
+    database._data_watcher._cerrar()
+    database.invalidar_cache()
+
+def sembrar_clientes(conn, cantidad, cupo=1_000_000_000, prefijo="7"):
+    """Inserta `cantidad` clientes con el mismo cupo y retorna sus NITs"""
+    nits = [f"{prefijo}{i:08d}" for i in range(cantidad)]
+    conn.executemany(
+        "INSERT INTO clientes (nit, nombre, cupo_sugerido) VALUES (?, ?, ?)",
+        [(nit, f"Cliente {nit}", cupo) for nit in nits]
+    )
+    conn.commit()
+    return nits
+
+def sembrar_ocs(conn, nits, por_cliente, valor=10_000_000, estado='PENDIENTE'):
+    """Inserta `por_cliente` OCs por NIT y retorna sus ids"""
+    filas = [
+        (f"T-{nit}-{i}", nit, valor, f"2026-01-{1 + i % 28:02d}", estado)
+        for nit in nits for i in range(por_cliente)
+    ]
+    conn.executemany(
+        "INSERT INTO ocs (numero, cliente_nit, valor_total, fecha, estado) VALUES (?, ?, ?, ?, ?)",
+        filas
+    )
+    conn.commit()
+    numeros = [f[0] for f in filas]
+    return [
+        fila[0] for fila in conn.execute(
+            "SELECT id FROM ocs WHERE numero IN (SELECT value FROM json_each(?)) ORDER BY id",
+            (database.json.dumps(numeros),)
+        )
+    ]
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Base temporal inicializada; retorna su ruta"""
+    monkeypatch.chdir(tmp_path)
+    ruta = str(tmp_path / "finanzas.db")
+    usar_base(ruta)
+    database.init_db()
+    yield ruta
+    database.get_pool.clear()
+    database._data_watcher._cerrar()
@@ -0,0 +1,179 @@
+"""
+Prueba de carga de autorizaciones: muchos aprobadores (hilos y procesos) sobre
+las mismas OCs y el mismo cupo no deben autorizar dos veces ni sobrepasar el cupo.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules import database
+from modules.database import ConflictoConcurrencia, autorizar_oc, autorizar_ocs_batch
+from conftest import usar_base, sembrar_clientes, sembrar_ocs
+
+VALOR_OC = 10_000_000
+
+def _leer_ocs(ids):
+    """Versión y valor total de cada OC, como los vería un usuario antes de aprobar"""
+    with database.pooled_connection() as conn:
+        return {
+            fila['id']: (fila['version'], fila['valor_total']) for fila in conn.execute(
+                "SELECT id, version, valor_total FROM ocs WHERE id IN (SELECT value FROM json_each(?))",
+                (database.json.dumps(ids),)
+            )
+        }
+
+def _aprobar(ids, vistas, modo, usuario, barrera=None):
+    """
+    Un aprobador: intenta autorizar el total de cada OC con la versión que leyó.
+    Retorna contadores por resultado.
+    """
+    conteo = {'autorizadas': 0, 'conflictos': 0, 'rechazadas': 0}
+    if barrera is not None:
+        barrera.wait()
+    
+    if modo == 'lote':
+        reporte = autorizar_ocs_batch(
+            [(oc_id, None, vistas[oc_id][0]) for oc_id in ids], usuario=usuario
+        )
+        conteo['autorizadas'] += int((reporte['resultado'] == 'AUTORIZADA').sum())
+        rechazos = reporte.loc[reporte['resultado'] == 'RECHAZADA', 'detalle']
+        conteo['conflictos'] += int(rechazos.str.contains('modificada').sum())
+        conteo['rechazadas'] += int((~rechazos.str.contains('modificada')).sum())
+        return conteo
+    
+    for oc_id in ids:
+        version, valor = vistas[oc_id]
+        try:
+            autorizar_oc(oc_id, valor, usuario=usuario, version_esperada=version)
+            conteo['autorizadas'] += 1
+        except ConflictoConcurrencia:
+            conteo['conflictos'] += 1
+        except ValueError:
+            conteo['rechazadas'] += 1
+    return conteo
+
+def _proceso_aprobador(ruta, ids, vistas, modo, usuario, hilos, resultados):
+    """Proceso con varios hilos aprobadores (pool y caché propios, misma base)"""
+    usar_base(ruta)
+    with ThreadPoolExecutor(hilos) as executor:
+        conteos = list(executor.map(
+            lambda n: _aprobar(ids, vistas, modo, f"{usuario}-{n}"), range(hilos)
+        ))
+    resultados.put(conteos)
+
+def _sumar(conteos):
+    total = {'autorizadas': 0, 'conflictos': 0, 'rechazadas': 0}
+    for conteo in conteos:
+        for clave, valor in conteo.items():
+            total[clave] += valor
+    return total
+
+def _verificar_sin_doble_autorizacion(ids):
+    with database.pooled_connection() as conn:
+        filas = conn.execute("""
+        SELECT o.id, o.valor_total, o.valor_autorizado, o.estado,
+               COUNT(a.id) AS autorizaciones, COALESCE(SUM(a.valor_autorizado), 0) AS suma
+        FROM ocs o LEFT JOIN autorizaciones_parciales a ON a.oc_numero = o.numero
+        WHERE o.id IN (SELECT value FROM json_each(?))
+        GROUP BY o.id
+        """, (database.json.dumps(ids),)).fetchall()
+    
+    for fila in filas:
+        assert fila['suma'] == fila['valor_autorizado'], dict(fila)
+        assert fila['valor_autorizado'] <= fila['valor_total'], dict(fila)
+        # Cada OC se autorizó por su total una sola vez
+        assert fila['autorizaciones'] <= 1, dict(fila)
+    return sum(fila['autorizaciones'] for fila in filas)
+
+@pytest.fixture
+def ocs_en_disputa(db):
+    """Clientes con cupo amplio y OCs que todos los aprobadores intentan autorizar"""
+    conn = database.get_db_connection()
+    nits = sembrar_clientes(conn, 5, cupo=100 * VALOR_OC)
+    ids = sembrar_ocs(conn, nits, 8, valor=VALOR_OC)
+    conn.close()
+    return ids
+
+@pytest.mark.parametrize("modo", ['individual', 'lote'])
+def test_hilos_no_autorizan_dos_veces(ocs_en_disputa, modo):
+    ids = ocs_en_disputa
+    vistas = _leer_ocs(ids)
+    aprobadores = 8
+    barrera = threading.Barrier(aprobadores)
+    
+    with ThreadPoolExecutor(aprobadores) as executor:
+        conteos = list(executor.map(
+            lambda n: _aprobar(ids, vistas, modo, f"hilo-{n}", barrera), range(aprobadores)
+        ))
+    total = _sumar(conteos)
+    
+    assert _verificar_sin_doble_autorizacion(ids) == len(ids)
+    assert total['autorizadas'] == len(ids)
+    # Todos los demás intentos leyeron una versión vieja y se reportan como conflicto
+    assert total['conflictos'] == len(ids) * (aprobadores - 1)
+    assert total['rechazadas'] == 0
+    assert database.verificar_exposicion().empty
+
+def test_procesos_no_autorizan_dos_veces(ocs_en_disputa, db):
+    ids = ocs_en_disputa
+    vistas = _leer_ocs(ids)
+    contexto = multiprocessing.get_context('spawn')
+    resultados = contexto.Queue()
+    procesos = [
+        contexto.Process(
+            target=_proceso_aprobador,
+            args=(db, ids, vistas, modo, f"proc-{n}", 3, resultados)
+        )
+        for n, modo in enumerate(['individual', 'lote', 'individual', 'lote'])
+    ]
+    for proceso in procesos:
+        proceso.start()
+    conteos = [c for _ in procesos for c in resultados.get(timeout=120)]
+    for proceso in procesos:
+        proceso.join(timeout=30)
+        assert proceso.exitcode == 0
+    total = _sumar(conteos)
+    
+    # Los escritores de otros procesos invalidan la caché vía data_version
+    database.invalidar_cache()
+    assert _verificar_sin_doble_autorizacion(ids) == len(ids)
+    assert total['autorizadas'] == len(ids)
+    assert total['conflictos'] == len(ids) * (len(conteos) - 1)
+    assert database.verificar_exposicion().empty
+
+def test_cupo_no_se_sobrepasa_con_aprobadores_concurrentes(db):
+    conn = database.get_db_connection()
+    cupo = 25 * VALOR_OC
+    nit, = sembrar_clientes(conn, 1, cupo=cupo, prefijo="6")
+    ids = sembrar_ocs(conn, [nit], 60, valor=VALOR_OC)
+    conn.close()
+    
+    # Sin versión esperada: cada aprobador toma OCs distintas y compite solo por el cupo
+    grupos = [ids[n::6] for n in range(6)]
+    barrera = threading.Barrier(len(grupos))
+    
+    def aprobar_grupo(n):
+        barrera.wait()
+        if n % 2:
+            reporte = autorizar_ocs_batch([(oc_id, None) for oc_id in grupos[n]], usuario=f"lote-{n}")
+            return int((reporte['resultado'] == 'AUTORIZADA').sum())
+        autorizadas = 0
+        for oc_id in grupos[n]:
+            try:
+                autorizar_oc(oc_id, VALOR_OC, usuario=f"hilo-{n}")
+                autorizadas += 1
+            except ValueError:
+                pass
+        return autorizadas
+    
+    with ThreadPoolExecutor(len(grupos)) as executor:
+        autorizadas = sum(executor.map(aprobar_grupo, range(len(grupos))))
+    
+    assert autorizadas == 25
+    assert _verificar_sin_doble_autorizacion(ids) == 25
+    exposicion = database.get_cliente_exposicion(nit)
+    assert exposicion['disponible'] == 0
+    assert database.verificar_exposicion().empty
@@ -0,0 +1,102 @@
+"""Respaldos: snapshot y restauración, restauración a una fecha y rechazo de archivos alterados"""
+
+import os
+import time
+
+import pytest
+
+from config import BACKUP_PATH
+from modules import database
+from modules.backup import (
+    CHECKSUM_SUFFIX, crear_backup_completo, crear_backup_incremental, restaurar_a_fecha
+)
+from conftest import sembrar_clientes, sembrar_ocs
+
+def _contar(tabla):
+    with database.pooled_connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+
+def _alterar_checksum(ruta):
+    with open(ruta + CHECKSUM_SUFFIX, "w", encoding="utf-8") as archivo:
+        archivo.write(f"{'0' * 64}  {os.path.basename(ruta)}\n")
+
+def _ultima_fecha_journal():
+    with database.pooled_connection() as conn:
+        return conn.execute("SELECT MAX(fecha) FROM cambios_journal").fetchone()[0]
+
+def test_snapshot_cambio_y_restauracion(db):
+    clientes_antes, ocs_antes = _contar("clientes"), _contar("ocs")
+    respaldo = database.backup_database()
+    
+    conn = database.get_db_connection()
+    nits = sembrar_clientes(conn, 2)
+    sembrar_ocs(conn, nits, 3)
+    conn.close()
+    assert _contar("ocs") == ocs_antes + 6
+    
+    assert database.restore_database(respaldo)
+    
+    assert _contar("clientes") == clientes_antes
+    assert _contar("ocs") == ocs_antes
+    assert database.get_clientes_opciones()['nit'].isin(nits).sum() == 0
+    assert database.verificar_exposicion().empty
+
+def test_snapshot_con_checksum_alterado_se_rechaza(db):
+    respaldo = database.backup_database()
+    conn = database.get_db_connection()
+    sembrar_clientes(conn, 1)
+    conn.close()
+    clientes = _contar("clientes")
+    
+    _alterar_checksum(respaldo)
+    with pytest.raises(ValueError, match="checksum del respaldo no coincide"):
+        database.restore_database(respaldo)
+    # La base en uso no se tocó
+    assert _contar("clientes") == clientes
+
+def test_restauracion_a_fecha_entre_dos_cambios(db):
+    crear_backup_completo(BACKUP_PATH)
+    clientes_antes, ocs_antes = _contar("clientes"), _contar("ocs")
+    
+    conn = database.get_db_connection()
+    nits = sembrar_clientes(conn, 2, cupo=100_000_000)
+    ids = sembrar_ocs(conn, nits, 2)
+    conn.close()
+    objetivo = _ultima_fecha_journal()
+    crear_backup_incremental(BACKUP_PATH)
+    # La siguiente escritura queda con una marca de tiempo posterior
+    time.sleep(0.01)
+    
+    conn = database.get_db_connection()
+    conn.execute(
+        "INSERT INTO ocs (numero, cliente_nit, valor_total, fecha) VALUES ('OC-2026-900', ?, 50000000, '2026-02-01')",
+        (nits[0],)
+    )
+    conn.execute("UPDATE ocs SET valor_total = 1 WHERE id = ?", (ids[0],))
+    conn.commit()
+    conn.close()
+    assert crear_backup_incremental(BACKUP_PATH)['desde_fecha'] > objetivo
+    
+    resultado = restaurar_a_fecha(objetivo, BACKUP_PATH)
+    
+    # El segundo incremental empieza después del objetivo
+    assert resultado['incrementales'] == 1
+    assert _contar("clientes") == clientes_antes + 2
+    assert _contar("ocs") == ocs_antes + 4
+    with database.pooled_connection() as conn:
+        valor = conn.execute("SELECT valor_total FROM ocs WHERE id = ?", (ids[0],)).fetchone()[0]
+    assert valor == 10_000_000
+    assert database.verificar_exposicion().empty
+
+def test_incremental_con_checksum_alterado_se_rechaza(db):
+    crear_backup_completo(BACKUP_PATH)
+    conn = database.get_db_connection()
+    sembrar_clientes(conn, 1)
+    conn.close()
+    incremental = crear_backup_incremental(BACKUP_PATH)
+    clientes = _contar("clientes")
+    
+    _alterar_checksum(os.path.join(BACKUP_PATH, incremental['archivo']))
+    with pytest.raises(ValueError, match="checksum del incremental"):
+        restaurar_a_fecha(incremental['hasta_fecha'], BACKUP_PATH)
+    assert _contar("clientes") == clientes
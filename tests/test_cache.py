@@ -0,0 +1,42 @@
+"""Invalidación de la caché de consultas: solo los cambios de datos de negocio la descartan"""
+
+from modules import database
+from modules.backup import _podar_journal
+from conftest import sembrar_clientes
+
+def test_registro_de_respaldos_no_invalida(db, monkeypatch):
+    monkeypatch.setattr(database._data_watcher, 'intervalo', 0)
+    database.get_clientes()
+    generacion = database.get_generacion_datos()
+    
+    # Escrituras de este proceso en tablas auxiliares
+    database.registrar_backup_job('incremental', 'programado', '2026-01-01 00:00:00', 0.1, 'OK', detalle="Sin cambios")
+    with database.pooled_connection() as conn:
+        ultimo = conn.execute("SELECT MAX(id) FROM cambios_journal").fetchone()[0]
+    _podar_journal(ultimo)
+    assert database.get_generacion_datos() == generacion
+    
+    # Las mismas escrituras desde otra conexión (otro proceso) cambian data_version
+    otra = database.get_db_connection()
+    otra.execute(
+        "INSERT INTO backup_jobs (tipo, origen, inicio, segundos, estado) VALUES ('completo', 'manual', '2026-01-01', 1, 'OK')"
+    )
+    otra.commit()
+    assert database.get_generacion_datos() == generacion
+    assert database._data_watcher.cambios_detectados == 0
+    
+    # Un cambio de negocio de otro proceso sí invalida
+    sembrar_clientes(otra, 1, prefijo="3")
+    otra.close()
+    assert database.get_generacion_datos() != generacion
+    assert database._data_watcher.cambios_detectados == 1
+
+def test_version_datos_ignora_tablas_auxiliares(db):
+    version = database.get_version_datos()
+    database.registrar_backup_job('completo', 'manual', '2026-01-01 00:00:00', 1.0, 'OK')
+    assert database.get_version_datos() == version
+    
+    conn = database.get_db_connection()
+    sembrar_clientes(conn, 1, prefijo="3")
+    conn.close()
+    assert database.get_version_datos() != version
@@ -0,0 +1,113 @@
+"""Cola de exportaciones: archivos en curso por proceso y generación de los reportes"""
+
+import os
+import time
+
+import pytest
+from openpyxl import load_workbook
+
+from modules import database, exports
+from modules.exports import ColaExportaciones, _generar_exportacion
+from conftest import sembrar_clientes, sembrar_ocs
+
+@pytest.fixture
+def cola(tmp_path):
+    colas = []
+    
+    def crear():
+        colas.append(ColaExportaciones(workers=1, directorio=str(tmp_path / "exports")))
+        return colas[-1]
+    
+    yield crear
+    for c in colas:
+        c._executor.shutdown(wait=True)
+
+def _crear_archivo(ruta, antiguedad_dias=0):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'w') as f:
+        f.write("x")
+    marca = time.time() - antiguedad_dias * 86400
+    os.utime(ruta, (marca, marca))
+
+def test_limpieza_respeta_trabajos_de_otros_procesos(tmp_path, cola):
+    directorio = tmp_path / "exports"
+    otro = directorio / ".en_curso_otro-servidor_4242"
+    abandonado = directorio / ".en_curso_otro-servidor_1"
+    _crear_archivo(str(otro / "reporte.xlsx.parcial"))
+    _crear_archivo(str(otro / "abc.progreso"))
+    _crear_archivo(str(directorio / "reciente.xlsx"))
+    _crear_archivo(str(directorio / "vencido.xlsx"), antiguedad_dias=365)
+    os.makedirs(abandonado)
+    marca = time.time() - 365 * 86400
+    os.utime(abandonado, (marca, marca))
+    
+    primera = cola()
+    _crear_archivo(os.path.join(primera.en_curso, "propio.xlsx.parcial"))
+    # Reinicio: un proceso nuevo con el mismo subdirectorio descarta sus trabajos interrumpidos
+    segunda = cola()
+    
+    assert segunda.en_curso == primera.en_curso
+    assert os.listdir(segunda.en_curso) == []
+    # Los archivos en curso de otro proceso siguen ahí mientras no venzan
+    assert sorted(os.listdir(otro)) == ["abc.progreso", "reporte.xlsx.parcial"]
+    assert (directorio / "reciente.xlsx").exists()
+    assert not (directorio / "vencido.xlsx").exists()
+    assert not abandonado.exists()
+
+def test_exportacion_lee_un_solo_snapshot(db, tmp_path, monkeypatch):
+    conn = database.get_db_connection()
+    nits = sembrar_clientes(conn, 4)
+    sembrar_ocs(conn, nits, 30)
+    total_ocs = conn.execute("SELECT COUNT(*) FROM ocs").fetchone()[0]
+    version_inicial = database.version_datos(conn)
+    
+    iterar_ocs = exports.iterar_ocs
+    
+    def iterar_con_escritura(**kwargs):
+        # Otro proceso confirma una OC después de leer clientes y estadísticas,
+        # antes de que empiece la consulta de la hoja de OCs
+        conn.execute(
+            "INSERT INTO ocs (numero, cliente_nit, valor_total, fecha) VALUES ('OC-2026-999', ?, 1, '2026-05-01')",
+            (nits[0],)
+        )
+        conn.commit()
+        yield from iterar_ocs(chunk_size=25, **kwargs)
+    
+    monkeypatch.setattr(exports, 'iterar_ocs', iterar_con_escritura)
+    ruta = str(tmp_path / "reporte.xlsx")
+    resultado = _generar_exportacion(
+        'reporte_completo', ruta, str(tmp_path / "reporte.parcial"), str(tmp_path / "reporte.progreso")
+    )
+    
+    assert resultado['version'] == version_inicial < database.version_datos(conn)
+    conn.close()
+    
+    libro = load_workbook(ruta, read_only=True)
+    numeros = [fila[1] for fila in libro['OCs'].iter_rows(min_row=2, values_only=True)]
+    ocs_analizadas = sum(fila[4] for fila in libro['Análisis OCs'].iter_rows(min_row=2, values_only=True))
+    libro.close()
+    # Ninguna hoja ve la OC confirmada durante la exportación
+    assert len(numeros) == ocs_analizadas == total_ocs
+    assert 'OC-2026-999' not in numeros
+
+def _version():
+    with database.pooled_connection() as conn:
+        return database.version_datos(conn)
+
+def test_version_no_se_repite_despues_de_restaurar(db):
+    respaldo = database.backup_database()
+    conn = database.get_db_connection()
+    sembrar_clientes(conn, 1, prefijo="5")
+    conn.close()
+    antes_de_restaurar = _version()
+    
+    database.restore_database(respaldo)
+    restaurada = _version()
+    conn = database.get_db_connection()
+    sembrar_clientes(conn, 1, prefijo="4")
+    conn.close()
+    
+    # La secuencia del journal retrocede, pero la época nueva distingue las versiones
+    assert restaurada[1] < antes_de_restaurar[1]
+    assert _version()[1] == antes_de_restaurar[1]
+    assert _version() != antes_de_restaurar
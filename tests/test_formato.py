@@ -0,0 +1,64 @@
+"""Los formateadores vectorizados producen el mismo texto que los escalares"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.utils import format_currency, format_currency_series, format_percentage_series
+
+MONTOS_LIMITE = [
+    0, -0.0, 1, -1, 999_999, -999_999, 1_000_000, -1_000_000, 999_999.5,
+    1_049_999, 1_050_000, 1_250_000, 999_949_999, 999_950_000, 1_000_000_000,
+    1_250_000_000, 49_999_999_999, 12_345.5, 0.5, 1.5, 2.5, -0.4, -12_345.678,
+]
+
+PORCENTAJES_LIMITE = [
+    0, -0.0, 0.05, 0.15, 0.25, -0.04, -0.05, -12.34, 79.95, 80, 99.99, 100, 149.96, 1e6,
+]
+
+def _montos_aleatorios(filas=20_000, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return np.concatenate([
+        rng.integers(-1_000_000, 1_000_000, filas // 4),
+        rng.integers(1_000_000, 1_000_000_000, filas // 4),
+        rng.integers(1_000_000_000, 50_000_000_000, filas // 4),
+        rng.uniform(-1e10, 1e10, filas - 3 * (filas // 4)).round(2),
+    ])
+
+@pytest.mark.parametrize("valores", [
+    pd.Series(MONTOS_LIMITE, dtype=float),
+    pd.Series(_montos_aleatorios()),
+    pd.Series(_montos_aleatorios().astype(float)),
+])
+def test_moneda_igual_al_escalar(valores):
+    esperado = valores.apply(format_currency)
+    pd.testing.assert_series_equal(format_currency_series(valores), esperado, check_dtype=False)
+
+def test_moneda_nulos_y_enteros_nullable():
+    valores = pd.Series([np.nan, None, 0, -5, 1_500_000, 2_000_000_000], dtype=object)
+    esperado = valores.apply(format_currency)
+    pd.testing.assert_series_equal(format_currency_series(valores), esperado, check_dtype=False)
+    
+    # Int64 de la base de datos con nulos (pd.NA)
+    enteros = pd.Series([0, None, -250, 999_999, 3_000_000], dtype='Int64')
+    assert format_currency_series(enteros).tolist() == [format_currency(v) for v in enteros]
+    assert format_currency_series(enteros)[1] == "$0"
+
+def test_moneda_conserva_indice():
+    valores = pd.Series([1_000, np.nan, -3], index=[10, 5, 7])
+    resultado = format_currency_series(valores)
+    assert resultado.index.tolist() == [10, 5, 7]
+    assert resultado.tolist() == ["$1.000", "$0", "$-3"]
+
+@pytest.mark.parametrize("decimales", [0, 1, 2])
+@pytest.mark.parametrize("valores", [
+    pd.Series(PORCENTAJES_LIMITE, dtype=float),
+    pd.Series(np.random.default_rng(1).uniform(-200, 200, 20_000)),
+])
+def test_porcentaje_igual_al_escalar(valores, decimales):
+    esperado = valores.map(lambda x: f"{x:.{decimales}f}%")
+    pd.testing.assert_series_equal(format_percentage_series(valores, decimales), esperado, check_dtype=False)
+
+def test_porcentaje_no_finitos():
+    valores = pd.Series([np.nan, np.inf, -np.inf, 0.0])
+    assert format_percentage_series(valores).tolist() == [f"{x:.1f}%" for x in valores]
@@ -0,0 +1,78 @@
+"""Importación de OCs por bloques: validación sin escribir y registro por bloques"""
+
+import io
+
+import pytest
+
+from modules import database
+from modules.importer import preparar_importacion_ocs, importar_ocs
+from conftest import sembrar_clientes
+
+def _archivo_ocs(filas):
+    texto = "nit;numero;valor;fecha\n" + "\n".join(";".join(map(str, fila)) for fila in filas)
+    return io.BytesIO(texto.encode('utf-8'))
+
+@pytest.fixture
+def clientes(db):
+    conn = database.get_db_connection()
+    nits = sembrar_clientes(conn, 3, cupo=50_000_000)
+    conn.execute(
+        "INSERT INTO ocs (numero, cliente_nit, valor_total, fecha) VALUES ('OC-2026-050', ?, 5000000, '2026-01-10')",
+        (nits[0],)
+    )
+    conn.commit()
+    conn.close()
+    return nits
+
+def test_validacion_por_bloques_acumula_totales(clientes):
+    a, b, c = clientes
+    archivo = _archivo_ocs([
+        (a, "OC-2026-101", "10.000.000", "2026-02-01"),
+        (b, "OC-2026-102", "20.000.000", "2026-02-01"),
+        (b, "", "30.000.000", "2026-02-02"),
+        # Repetido en un bloque posterior
+        (c, "OC-2026-101", "1.000.000", "2026-02-03"),
+        # Ya registrado antes de la importación
+        (a, "OC-2026-050", "1.000.000", "2026-02-03"),
+        ("123456789", "", "1.000.000", "2026-02-03"),
+        (c, "", "abc", "2026-02-03"),
+    ])
+    
+    ocs_antes = database.get_ocs_summary()['total_ocs']
+    rechazados, impacto, stats = preparar_importacion_ocs(archivo, "ocs.csv", chunk_size=2)
+    
+    assert stats['bloques'] == 4
+    assert stats['filas_leidas'] == 7
+    assert stats['filas_validas'] == 3
+    assert stats['filas_rechazadas'] == 4
+    assert stats['valor_total'] == 60_000_000
+    assert sorted(rechazados['motivo']) == sorted([
+        "Número repetido en el archivo", "Número ya registrado", "Cliente no registrado", "Valor no numérico"
+    ])
+    
+    por_cliente = impacto.set_index('cliente_nit')
+    assert por_cliente.loc[b, ['ocs', 'total_importado']].tolist() == [2, 50_000_000]
+    assert por_cliente.loc[a, 'disponible_comprometido'] == 45_000_000
+    assert por_cliente.loc[b, 'nuevo_disponible'] == 0
+    assert not impacto['sobrepasa_cupo'].any()
+    # Nada se escribe durante la validación
+    assert database.get_ocs_summary()['total_ocs'] == ocs_antes
+
+def test_registro_por_bloques(clientes):
+    a, b, _ = clientes
+    archivo = _archivo_ocs(
+        [(b, f"OC-2026-{200 + i}", "1.000.000", "2026-03-01") for i in range(5)]
+        + [(a, "", "2.000.000", "2026-03-02"), (a, "OC-2026-200", "1.000.000", "2026-03-02")]
+    )
+    ocs_antes = database.get_ocs_summary()['total_ocs']
+    _, _, validacion = preparar_importacion_ocs(archivo, "ocs.csv", chunk_size=3)
+    avance = []
+    
+    stats = importar_ocs(archivo, "ocs.csv", validacion['filas_validas'], usuario="tester",
+                         progreso=avance.append, chunk_size=3)
+    
+    assert stats['ocs_creadas'] == validacion['filas_validas'] == 6
+    assert stats['ocs_omitidas'] == 0
+    assert avance[-1] == 6 and avance == sorted(avance)
+    assert database.get_ocs_summary()['total_ocs'] == ocs_antes + 6
+    assert database.verificar_exposicion().empty
@@ -0,0 +1,66 @@
+"""Las consultas frecuentes deben resolverse con los índices de las migraciones"""
+
+import re
+
+import pytest
+
+from modules import database
+from conftest import sembrar_clientes, sembrar_ocs
+
+def _sin_scan_completo(plan, tabla):
+    """Ningún paso recorre `tabla` sin índice (SCAN sin USING ... INDEX)"""
+    return not any(
+        re.match(rf"SCAN {tabla}\b", paso) and 'INDEX' not in paso for paso in plan
+    )
+
+def _usa_indice(plan, tabla, indice):
+    return any(
+        re.match(rf"(SEARCH|SCAN) {tabla}\b", paso) and f"INDEX {indice}" in paso for paso in plan
+    )
+
+@pytest.fixture
+def datos(db):
+    conn = database.get_db_connection()
+    nits = sembrar_clientes(conn, 50)
+    sembrar_ocs(conn, nits, 20)
+    # Estadísticas reales para que el planificador elija como en producción
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return nits
+
+@pytest.mark.parametrize("filtros, indice", [
+    ({}, 'idx_ocs_fecha'),
+    ({'cliente_nit': '700000001'}, 'idx_ocs_cliente_fecha'),
+    ({'estado': 'PENDIENTE'}, 'idx_ocs_estado_fecha'),
+    ({'estado': database.ESTADOS_OC_ABIERTOS}, 'idx_ocs_abiertas_fecha'),
+    ({'cliente_nit': '700000001', 'estado': 'PENDIENTE'}, 'idx_ocs_cliente'),
+])
+def test_get_ocs_usa_indices(datos, filtros, indice):
+    plan = database.explain_query_plan(*database.consulta_ocs(**filtros))
+    
+    assert _usa_indice(plan, 'o', indice), plan
+    assert _sin_scan_completo(plan, 'o'), plan
+    # El nombre del cliente se busca por la clave única de clientes
+    assert any('SEARCH c USING' in paso and 'INDEX' in paso for paso in plan), plan
+
+@pytest.mark.parametrize("orden, indice", [
+    ('nombre', 'idx_exposicion_nombre'),
+    ('porcentaje_uso', 'idx_exposicion_uso'),
+    ('cupo_sugerido', 'idx_exposicion_cupo'),
+])
+@pytest.mark.parametrize("descendente", [False, True])
+def test_get_clientes_page_usa_indices(datos, orden, indice, descendente):
+    primera = database.explain_query_plan(*database.consulta_clientes_page(orden, descendente))
+    _, cursor = database.get_clientes_page(orden, descendente, limite=10)
+    siguiente = database.explain_query_plan(
+        *database.consulta_clientes_page(orden, descendente, limite=10, cursor=cursor)
+    )
+    
+    for plan in (primera, siguiente):
+        assert _usa_indice(plan, 'cliente_exposicion', indice), plan
+        assert _sin_scan_completo(plan, 'cliente_exposicion'), plan
+        # El índice ya entrega el orden: no hay ordenamiento temporal
+        assert not any('TEMP B-TREE' in paso for paso in plan), plan
+    # La página siguiente arranca en la clave del cursor, no al inicio del índice
+    assert any(paso.startswith('SEARCH cliente_exposicion') for paso in siguiente), siguiente
@@ -0,0 +1,113 @@
+"""Asignación del optimizador de autorizaciones sobre datos fijos"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.optimizer import (
+    _asignar_mejor_ajuste, _asignar_prefijo, optimizar_autorizaciones, resumen_por_cliente
+)
+
+def _mejor_ajuste_referencia(valores, cupos, inicio_grupo):
+    """Greedy OC por OC: la definición directa de la política"""
+    asignado = np.zeros_like(valores)
+    fin_grupo = np.append(inicio_grupo[1:], len(valores))
+    for inicio, fin in zip(inicio_grupo, fin_grupo):
+        restante = cupos[inicio]
+        for i in range(inicio, fin):
+            if valores[i] <= restante:
+                asignado[i] = valores[i]
+                restante -= valores[i]
+    return asignado
+
+def _ocs_fijas(clientes=40, por_cliente=60, semilla=7):
+    rng = np.random.default_rng(semilla)
+    n = clientes * por_cliente
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'cliente_nit': np.repeat([f"9{i:08d}" for i in range(clientes)], por_cliente),
+        'cliente_nombre': np.repeat([f"Cliente {i}" for i in range(clientes)], por_cliente),
+        # Valores repetidos a propósito: los empates deben resolverse igual
+        'valor_pendiente': rng.choice([1, 2, 3, 5, 8, 13, 21], n) * 1_000_000,
+        'fecha': pd.to_datetime('2026-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D'),
+    })
+
+def _disponibles(ocs, semilla=7):
+    rng = np.random.default_rng(semilla + 1)
+    nits = ocs['cliente_nit'].unique()
+    # Incluye clientes sin cupo, sobrepasados (negativo) y con cupo de sobra
+    cupos = rng.integers(-5, 400, len(nits)) * 1_000_000
+    cupos[:3] = [0, -10_000_000, 10**12]
+    return pd.Series(cupos, index=nits)
+
+def _grupos(ordenadas, disponibles):
+    valores = ordenadas['valor_pendiente'].to_numpy(dtype=np.int64)
+    cupos = np.maximum(ordenadas['cliente_nit'].map(disponibles).to_numpy(dtype=np.int64), 0)
+    nits = ordenadas['cliente_nit'].to_numpy()
+    inicio_grupo = np.flatnonzero(np.r_[True, nits[1:] != nits[:-1]])
+    return valores, cupos, inicio_grupo
+
+@pytest.mark.parametrize("semilla", [0, 7, 42])
+def test_mejor_ajuste_igual_al_greedy_de_referencia(semilla):
+    ocs = _ocs_fijas(semilla=semilla)
+    disponibles = _disponibles(ocs, semilla)
+    ordenadas = ocs.sort_values(
+        ['cliente_nit', 'valor_pendiente', 'fecha', 'id'], ascending=[True, False, True, True]
+    ).reset_index(drop=True)
+    valores, cupos, inicio_grupo = _grupos(ordenadas, disponibles)
+    
+    np.testing.assert_array_equal(
+        _asignar_mejor_ajuste(valores, cupos, inicio_grupo),
+        _mejor_ajuste_referencia(valores, cupos, inicio_grupo)
+    )
+
+def test_mejor_ajuste_frente_a_prefijo():
+    ocs = _ocs_fijas()
+    disponibles = _disponibles(ocs)
+    
+    mejor = optimizar_autorizaciones(ocs, disponibles, 'mayor_valor', parciales=False)
+    prefijo = optimizar_autorizaciones(ocs, disponibles, 'pequenas', parciales=False)
+    # Mismo orden de prioridad que mayor_valor, pero con la política de prefijo
+    valores, cupos, inicio_grupo = _grupos(mejor, disponibles)
+    prefijo_mismo_orden = _asignar_prefijo(valores, cupos, inicio_grupo, parciales=False)
+    
+    por_cliente = resumen_por_cliente(mejor).set_index('cliente_nit')
+    cupo = disponibles.clip(lower=0).reindex(por_cliente.index)
+    # Ninguna política sobrepasa el disponible ni autoriza parciales
+    assert (por_cliente['sugerido'] <= cupo).all()
+    assert not mejor['parcial'].any() and not prefijo['parcial'].any()
+    assert set(mejor['valor_sugerido'].unique()) <= set(mejor['valor_pendiente']) | {0}
+    
+    # El greedy continúa donde el prefijo se detiene: coincide en el tramo inicial y nunca autoriza menos
+    tomado_prefijo = prefijo_mismo_orden > 0
+    np.testing.assert_array_equal(mejor['valor_sugerido'].to_numpy()[tomado_prefijo], valores[tomado_prefijo])
+    sugerido_prefijo = pd.Series(prefijo_mismo_orden, index=mejor['cliente_nit']).groupby(level=0).sum()
+    assert (por_cliente['sugerido'] >= sugerido_prefijo.reindex(por_cliente.index)).all()
+    assert por_cliente['sugerido'].sum() > sugerido_prefijo.sum()
+    
+    # Con cupo de sobra todas las OCs del cliente se autorizan; sin cupo, ninguna
+    nit_amplio, nit_sin_cupo, nit_sobrepasado = disponibles.index[[2, 0, 1]]
+    assert por_cliente.loc[nit_amplio, 'sugerido'] == por_cliente.loc[nit_amplio, 'pendiente']
+    assert por_cliente.loc[[nit_sin_cupo, nit_sobrepasado], 'sugerido'].eq(0).all()
+
+def test_mejor_ajuste_caso_conocido():
+    ocs = pd.DataFrame({
+        'id': [1, 2, 3, 4, 5],
+        'cliente_nit': ['A'] * 5,
+        'cliente_nombre': ['A'] * 5,
+        'valor_pendiente': [70, 50, 30, 20, 10],
+        'fecha': pd.to_datetime(['2026-01-01'] * 5),
+    })
+    disponibles = pd.Series({'A': 100})
+    
+    mejor = optimizar_autorizaciones(ocs, disponibles, 'mayor_valor', parciales=False)
+    # 70 cabe; 50 no; 30 completa 100; 20 y 10 ya no caben
+    assert mejor.set_index('id')['valor_sugerido'].to_dict() == {1: 70, 2: 0, 3: 30, 4: 0, 5: 0}
+    
+    pequenas = optimizar_autorizaciones(ocs, disponibles, 'pequenas', parciales=False)
+    # Prefijo de menor a mayor: 10 + 20 + 30 = 60, y 50 ya no cabe
+    assert pequenas.set_index('id')['valor_sugerido'].to_dict() == {1: 0, 2: 0, 3: 30, 4: 20, 5: 10}
+    
+    parciales = optimizar_autorizaciones(ocs, disponibles, 'mayor_valor', parciales=True)
+    assert parciales.set_index('id')['valor_sugerido'].to_dict() == {1: 70, 2: 30, 3: 0, 4: 0, 5: 0}
+    assert parciales.set_index('id')['parcial'].to_dict()[2]